@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+__doc__ = '''Replays a trace recorded with ``wm --trace FILE`` against a simulated
+desktop, and reports the wall time and Accessibility calls it took as JSON, in
+the same format as ``run.py``.
+
+The desktop starts out with the applications, windows and screens seen in the
+trace, and each application answers with the latencies it was recorded with.
+Workspace and Accessibility notifications are then delivered at the times they
+were recorded (divided by ``--speed``, or as fast as possible with
+``--speed 0``), and changes that the window manager only found out about by
+reading them, such as windows moved by the user, are applied to the desktop
+just before the notification that preceded them. For example::
+
+    python benchmarks/replay.py slow-session.trace --speed 10 -o new.json
+    python benchmarks/run.py --compare old.json new.json
+
+Windows are told apart by their element numbers in the trace, which only
+approximately follow windows across window list refreshes. Space switches are
+replayed with every window following the user to the new Space.
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+from collections import OrderedDict, defaultdict
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import simdesktop
+
+
+# The window attributes that are applied to the desktop when the trace shows
+# that they changed behind the window manager's back
+WINDOW_ATTRIBUTES = ('AXPosition', 'AXSize', 'AXMinimized', 'AXTitle')
+
+# The events that drive the window manager, as opposed to its own requests
+DRIVERS = ('workspace', 'notification', 'space', 'screens')
+
+# The operation the simulated desktop counts each recorded request as
+OPERATIONS = {'__contains__': 'contains', 'can_set': 'can_set', '__setitem__': 'write'}
+
+# Changes found by reading an application are applied with the last event about
+# it that came at most this many seconds earlier, and otherwise with the last
+# event about any application
+FOLLOW_UP = 1.0
+
+
+def read_trace(filename):
+    """
+    Reads the events of a trace, skipping a last line that was cut short.
+    """
+    events = []
+    with open(filename) as f:
+        for number, line in enumerate(f, 1):
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                logging.warning('Skipping line %d of %s, which is not valid JSON.', number, filename)
+
+    return events
+
+
+def _values(event):
+    # The attribute values that an Accessibility request read or wrote
+    args, value = event.get('a') or [], event.get('v')
+    if event['f'] == '__setitem__':
+        return {args[0]: args[1]}
+    elif event['f'] == '__getitem__' and 'x' not in event:
+        return {args[0]: value}
+    elif event['f'] == 'get' and 'x' not in event:
+        return {args[0]: value} if len(args) == 1 else dict(zip(args, value))
+
+    return {}
+
+
+def _frame(value):
+    return tuple(value) if isinstance(value, list) else value
+
+
+class Notification(object):
+    """
+    A stand-in for the ``NSNotification`` of a workspace notification.
+    """
+    def __init__(self, info):
+        self.info = info
+
+    def userInfo(self):
+        return self.info
+
+
+class Trace(object):
+    """
+    A recorded session, along with what is needed to replay it: the initial
+    state of every application, their latencies, and the changes to apply to
+    the desktop along with each event that drives the window manager.
+    """
+    def __init__(self, events):
+        self.events = events
+        self.apps = OrderedDict()  # pid -> dict of bundle, running, windows, latencies
+        self.windows = dict()  # element -> dict of initial attribute values
+        self.screens = None
+        self.drivers = []  # (event, [changes])
+        self._analyze()
+
+    def _app(self, pid, bundle, running):
+        app = self.apps.get(pid)
+        if app is None:
+            app = self.apps[pid] = {'bundle': bundle, 'running': running, 'windows': None, 'latencies': []}
+        if app['bundle'] is None:
+            app['bundle'] = bundle
+
+        return app
+
+    def _analyze(self):
+        known = dict()  # (element, attribute) -> last value read or written
+        last_driver = dict()  # pid -> (time, changes) of the last event that drove the window manager about it
+        changes = []  # Changes of the last driving event, whichever application it was about
+
+        for event in self.events:
+            kind = event['k']
+            if kind == 'screens':
+                if self.screens is None:
+                    self.screens = event['s']
+                    continue
+            elif kind == 'workspace':
+                self._app(event['p'], event.get('b'), event['n'] != 'launched')
+
+            if kind in DRIVERS:
+                changes = []
+                self.drivers.append((event, changes))
+                if 'p' in event:
+                    last_driver[event['p']] = (event['t'], changes)
+                continue
+            elif kind != 'ax' or event['p'] is None:
+                continue
+
+            app = self._app(event['p'], event['b'], True)
+            app['latencies'].append(event['s'])
+            driven, pending = last_driver.get(event['p'], (None, changes))
+            if driven is None or event['t'] - driven > FOLLOW_UP:
+                pending = changes
+            element = event['e']
+            values = _values(event)
+
+            if 'AXWindows' in values and values['AXWindows'] is not None:
+                count = len(values['AXWindows'])
+                if app['windows'] is None:
+                    app['windows'] = [ref['e'] for ref in values['AXWindows']]
+                else:
+                    pending.append((event['p'], None, 'count', count))
+
+            if event.get('x') in ('InvalidUIElementError', 'ValueError') and event['op'] == 'write':
+                pending.append((event['p'], element, 'closed', None))
+
+            for attribute, value in values.items():
+                if attribute not in WINDOW_ATTRIBUTES:
+                    continue
+                value = _frame(value)
+                if element not in self.windows:
+                    self.windows[element] = dict()
+                self.windows[element].setdefault(attribute, value)
+                key = (element, attribute)
+                if event['f'] != '__setitem__' and key in known and known[key] != value:
+                    pending.append((event['p'], element, attribute, value))
+                known[key] = value
+
+    def duration(self):
+        return self.events[-1]['t'] if self.events else 0.0
+
+    def recorded_calls(self):
+        calls = defaultdict(int)
+        for event in self.events:
+            if event['k'] == 'ax':
+                # Traces from before get_many read attributes one by one hold
+                # calls of get(), which asked for each attribute in turn
+                calls[OPERATIONS.get(event['f'], 'read')] += len(event['a']) if event['f'] == 'get' else 1
+
+        return calls
+
+
+class Replay(object):
+    """
+    Drives a window manager, running against a simulated desktop, through the
+    events of a trace.
+    """
+    def __init__(self, trace):
+        self.trace = trace
+        self.desktop = simdesktop.SimulatedDesktop()
+        self.sim_apps = dict()  # pid -> SimApp
+        self.sim_windows = dict()  # element -> SimWindow
+        self._build()
+
+    def _build(self):
+        desktop = self.desktop
+        if self.trace.screens:
+            self._set_screens(self.trace.screens)
+
+        for pid, info in self.trace.apps.items():
+            app = desktop.add_app(info['bundle'] or 'pid.%d' % pid, windows = 0,
+                latency = simdesktop.replayed(info['latencies']), pid = pid)
+            self.sim_apps[pid] = app
+            for element in info['windows'] or []:
+                self._add_window(app, element)
+            if not info['running']:
+                desktop.apps.remove(app)
+
+        del desktop.pending_notifications[:]
+
+    def _add_window(self, app, element = None):
+        attributes = self.trace.windows.get(element, {})
+        position, size = attributes.get('AXPosition'), attributes.get('AXSize')
+        frame = position + size if position and size else None
+        window = self.desktop.add_window(app, frame)
+        window.attributes['AXMinimized'] = bool(attributes.get('AXMinimized'))
+        if attributes.get('AXTitle') is not None:
+            window.attributes['AXTitle'] = attributes['AXTitle']
+        if element is not None:
+            self.sim_windows[element] = window
+
+        return window
+
+    def _window(self, app, element):
+        # Elements first seen after startup are taken to be the newest windows
+        window = self.sim_windows.get(element)
+        if window is None:
+            mapped = set(id(w) for w in self.sim_windows.values())
+            unmapped = [w for w in app.windows if id(w) not in mapped]
+            window = unmapped[-1] if unmapped else self._add_window(app)
+            self.sim_windows[element] = window
+
+        return window
+
+    def apply(self, changes):
+        """
+        Applies the changes the trace shows happened to applications.
+        """
+        for pid, element, attribute, value in changes:
+            app = self.sim_apps.get(pid)
+            if app is None:
+                continue
+            elif attribute == 'count':
+                while len(app.windows) < value:
+                    self._add_window(app)
+                while len(app.windows) > value:
+                    self.desktop.close_window(app.windows[-1], notify = False)
+            elif attribute == 'closed':
+                window = self.sim_windows.pop(element, None)
+                if window is not None and window in app.windows:
+                    self.desktop.close_window(window, notify = False)
+            elif app.windows:
+                self._window(app, element).attributes[attribute] = value
+
+        del self.desktop.pending_notifications[:]
+
+    def dispatch(self, event, manager, helper):
+        """
+        Delivers an event that drives the window manager.
+        """
+        desktop = self.desktop
+        kind = event['k']
+        app = self.sim_apps.get(event.get('p'))
+        if kind == 'workspace':
+            if event['n'] == 'launched':
+                if app not in desktop.apps:
+                    desktop.apps.append(app)
+                    app.alive = True
+                helper.appLaunched_(Notification({'NSApplicationBundleIdentifier': app.bundle,
+                    'NSApplicationProcessIdentifier': app.pid}))
+            elif event['n'] == 'terminated':
+                if app in desktop.apps:
+                    desktop.terminate(app)
+                helper.appTerminated_(Notification({'NSApplicationProcessIdentifier': event['p']}))
+            elif event['n'] in ('hidden', 'unhidden'):
+                app.attributes['AXHidden'] = event['n'] == 'hidden'
+                notification = Notification({'NSWorkspaceApplicationKey': app})
+                (helper.appHidden_ if event['n'] == 'hidden' else helper.appUnhidden_)(notification)
+        elif kind == 'notification' and app is not None:
+            # The recorded notifications include the echoes of the window
+            # manager's own writes, so the desktop's are dropped
+            del desktop.pending_notifications[:]
+            desktop.post(app, event['n'])
+            desktop.pump()
+        elif kind == 'space':
+            for sim_app in desktop.apps:
+                for window in sim_app.windows:
+                    window.space = event['s']
+            desktop.switch_space(event['s'])
+        elif kind == 'screens':
+            self._set_screens(event['s'])
+            manager._screens_changed()
+
+    def _set_screens(self, screens):
+        # Screens are recorded with a top-left origin, and NSScreen's is at the bottom-left
+        main_height = screens[0][1][1] + screens[0][1][3]
+        flip = lambda rect: ((rect[0], main_height - rect[1] - rect[3]), (rect[2], rect[3]))
+        self.desktop.screens = [simdesktop.SimScreen(number, flip(frame), flip(visible))
+            for number, frame, visible in screens]
+
+    def run(self, manager, helper, speed = 1.0, reflow_delay = 0.05):
+        """
+        Delivers every driving event at its recorded time, divided by
+        ``speed``, or as fast as possible if ``speed`` is 0, and waits for the
+        window manager to settle.
+        """
+        run_loop = self.desktop.run_loop
+        start = time.time()
+        drivers = self.trace.drivers
+        for i, (event, changes) in enumerate(drivers):
+            if speed > 0:
+                deadline = start + event['t'] / speed
+                while True:
+                    run_loop.run_timers()
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    time.sleep(min(remaining, 0.001))
+
+            self.apply(changes)
+            self.dispatch(event, manager, helper)
+
+            # Let reflows happen where there was time for them in the session
+            if speed == 0 and (i + 1 == len(drivers) or drivers[i + 1][0]['t'] - event['t'] > reflow_delay):
+                run_loop.run_timers(wait = True)
+
+        run_loop.run_timers(wait = True)
+        manager._scheduler.flush()
+
+
+def replay(args):
+    trace = Trace(read_trace(args.trace))
+    session = Replay(trace)
+    desktop = session.desktop
+    simdesktop.install(desktop)
+
+    import wm
+    import wm.config
+    import wm.manager
+
+    config_file = '/tmp/wm-replay.rc'
+    shutil.copy(args.config or os.path.join(os.path.dirname(wm.__file__), 'config', 'wm.rc'), config_file)
+
+    manager = wm.manager.WindowManager('/tmp/wm-replay.pid')
+    desktop.reset_counts()
+    start = time.time()
+    manager.prepare(config_file)
+    helper = wm.manager._NotificationHelper.new()
+    manager.reflow()
+    session.run(manager, helper, args.speed, wm.config.REFLOW_DELAY)
+    wall = time.time() - start
+
+    recorded = trace.recorded_calls()
+    return {
+        'replay': {
+            'wall': wall,
+            'ax_calls': float(desktop.total_calls()),
+            'ax_calls_by_op': dict((op, float(n)) for op, n in desktop.calls.items()),
+        },
+        'recorded': {
+            'wall': trace.duration(),
+            'ax_calls': float(sum(recorded.values())),
+            'ax_calls_by_op': dict((op, float(n)) for op, n in recorded.items()),
+        },
+    }, wm.metrics.snapshot()
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Replay a recorded wm session against a simulated desktop.')
+    parser.add_argument('trace', help = 'a trace recorded with wm --trace FILE')
+    parser.add_argument('--speed', type = float, default = 1.0,
+        help = 'how many times faster than recorded to replay, or 0 for as fast as possible')
+    parser.add_argument('--config', help = 'the configuration file to run with (the default one otherwise)')
+    parser.add_argument('-o', '--output', help = 'write results to this file instead of stdout')
+    args = parser.parse_args()
+
+    logging.basicConfig(level = logging.WARNING)
+    results, metrics = replay(args)
+
+    import wm
+    report = {
+        'version': wm.__version__,
+        'python': platform.python_version(),
+        'timestamp': time.time(),
+        'params': {'trace': args.trace, 'speed': args.speed, 'config': args.config},
+        'results': results,
+        'metrics': metrics,
+    }
+
+    output = json.dumps(report, indent = 2, sort_keys = True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print output
+
+    # Worker threads of applications that were hung would keep the process alive
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,818 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+__doc__ = '''Runs wm's benchmarks against a simulated desktop and reports wall times
+and Accessibility call counts as JSON.
+
+Every benchmark runs headless: the Accessibility API, AppKit and Quartz are
+replaced by the stand-ins in :py:mod:`simdesktop`, which count every request.
+Along the way, the run checks what the window manager does (e.g. that a warm
+reflow makes no requests, or that a hung application is left alone), and exits
+with an error if it does not. For example::
+
+    python benchmarks/run.py --apps 20 --windows 3 --latency 0.0005 -o new.json
+    python benchmarks/run.py --compare old.json new.json
+'''
+
+import gc
+import os
+import re
+import sys
+import imp
+import json
+import time
+import cPickle
+import shutil
+import itertools
+import select
+import socket
+import tempfile
+import subprocess
+import threading
+import logging
+import argparse
+import platform
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import simdesktop
+
+
+# Modules that only the commands running the window manager may load
+HEAVY_MODULES = ('objc', 'Foundation', 'AppKit', 'Quartz', 'CoreFoundation', 'accessibility',
+    'wm.manager', 'wm.elements')
+
+# Commands that must start without loading any of them
+LIGHT_COMMANDS = [['--version'], ['--help'], ['copy-config'], ['check-config'], ['stats'], ['list-windows']]
+
+_IMPORT_CHECK = '''
+import sys, json, atexit
+sys.path.insert(0, %(root)r)
+atexit.register(lambda: sys.stderr.write('\\nLOADED ' + json.dumps([m for m in %(heavy)r if sys.modules.get(m)])))
+import wm.cli
+if %(argv)r is not None:
+    wm.cli.main(%(argv)r)
+'''
+
+# A daemon that ignores both SIGTERM and SIGHUP (which reloads the config)
+_STUBBORN_DAEMON = '''
+import sys, time, signal
+signal.signal(signal.SIGTERM, signal.SIG_IGN)
+signal.signal(signal.SIGHUP, signal.SIG_IGN)
+sys.stdout.write('ready\\n')
+sys.stdout.flush()
+time.sleep(60)
+'''
+
+
+def measure(desktop, func, repeat = 1):
+    """
+    Calls ``func`` ``repeat`` times, returning the mean wall time and number of
+    Accessibility calls per call.
+    """
+    desktop.reset_counts()
+    start = time.time()
+    for i in range(repeat):
+        func()
+    wall = time.time() - start
+
+    return {
+        'wall': wall / repeat,
+        'ax_calls': float(desktop.total_calls()) / repeat,
+        'ax_calls_by_op': dict((op, float(n) / repeat) for op, n in desktop.calls.items()),
+    }
+
+
+def check_imports():
+    """
+    Runs the command line in fresh interpreters, and fails if a command that
+    does not run the window manager loads PyObjC or the Accessibility API.
+    """
+    try:
+        imp.find_module('docopt')
+        commands = [None] + LIGHT_COMMANDS
+    except ImportError:
+        logging.warning('docopt is not installed, so only importing wm.cli is checked.')
+        commands = [None]
+
+    results = dict()
+    env = dict(os.environ, HOME = tempfile.mkdtemp())
+    env.pop('XDG_CONFIG_HOME', None)
+    for argv in commands:
+        name = 'import.%s' % ('wm.cli' if argv is None else ' '.join(['wm'] + argv))
+        script = _IMPORT_CHECK % {'root': ROOT, 'heavy': HEAVY_MODULES, 'argv': argv}
+        start = time.time()
+        process = subprocess.Popen([sys.executable, '-c', script], env = env,
+            stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+        _, err = process.communicate()
+        wall = time.time() - start
+
+        loaded = None
+        for line in err.splitlines():
+            if line.startswith('LOADED '):
+                loaded = json.loads(line[7:])
+        if loaded is None:
+            raise SystemExit('%s did not run:\n%s' % (name, err))
+        if loaded:
+            raise SystemExit('%s loaded %s.' % (name, ', '.join(loaded)))
+
+        results[name] = {'wall': wall, 'ax_calls': 0.0, 'ax_calls_by_op': {}}
+
+    return results
+
+
+def check_stop():
+    """
+    Stops a daemon that ignores the signals asking it to exit, and fails if
+    the fallback of ``wm stop`` does not kill it.
+    """
+    import wm.daemon
+
+    process = subprocess.Popen([sys.executable, '-c', _STUBBORN_DAEMON], stdout = subprocess.PIPE)
+    process.stdout.readline()
+    reaper = threading.Thread(target = process.wait)
+    reaper.daemon = True
+    reaper.start()
+    pidfile = os.path.join(tempfile.mkdtemp(), 'wm.pid')
+    with open(pidfile, 'w') as f:
+        f.write('%d\n' % process.pid)
+
+    stopper = threading.Thread(target = wm.daemon.Daemon(pidfile, verbose = 0).stop)
+    stopper.daemon = True
+    start = time.time()
+    stopper.start()
+    stopper.join(10.0)
+    wall = time.time() - start
+    if stopper.is_alive():
+        process.kill()
+        raise SystemExit('Stopping a daemon that ignores SIGTERM did not kill it.')
+
+    return {'daemon.stop.unresponsive': {'wall': wall, 'ax_calls': 0.0, 'ax_calls_by_op': {}}}
+
+
+def build_desktop(args):
+    desktop = simdesktop.SimulatedDesktop(seed = args.seed)
+    latency = simdesktop.lognormal(args.latency) if args.latency > 0 else simdesktop.constant(0.0)
+    for i in range(args.apps):
+        desktop.add_app('com.example.app%d' % i, windows = args.windows, latency = latency)
+    for i in range(args.hung):
+        desktop.add_app('com.example.hung%d' % i, windows = args.windows, latency = None)
+    for i in range(args.screens - 1):
+        desktop.add_screen(1920.0, 1080.0)
+    del desktop.pending_notifications[:]
+
+    return desktop
+
+
+def wait_for_late_apps(manager, timeout = 10.0):
+    deadline = time.time() + timeout
+    while manager._late_apps.empty() and time.time() < deadline:
+        time.sleep(0.0005)
+
+
+def run_benchmarks(args):
+    results = check_imports()
+    results.update(check_stop())
+
+    desktop = build_desktop(args)
+    simdesktop.install(desktop)
+
+    import wm
+    import wm.layout
+    import wm.manager
+    import wm.trace
+
+    # Work on a copy of the default config, which is also edited below
+    config_file = '/tmp/wm-bench.rc'
+    shutil.copy(os.path.join(os.path.dirname(wm.__file__), 'config', 'wm.rc'), config_file)
+    os.utime(config_file, (time.time() - 60, time.time() - 60))
+    results['config.compile'] = measure(desktop, lambda: wm.config.compile_config(config_file), repeat = 100)
+    results['config.cached'] = measure(desktop, lambda: wm.config.load_config(config_file), repeat = 100)
+
+    # The compiled config is cached where only the user can write, and a cache
+    # that others could have written is never unpickled
+    cache_file = wm.config.get_cache_file(config_file)
+    if os.path.dirname(cache_file) == os.path.dirname(config_file) or os.stat(cache_file).st_mode & 077:
+        raise SystemExit('The compiled config is cached in %s, which others can read or write.' % cache_file)
+    with open(cache_file, 'rb') as f:
+        key = cPickle.load(f)[0]
+    with open(cache_file, 'wb') as f:
+        cPickle.dump((key, 'planted'), f)
+    os.chmod(cache_file, 0666)
+    if wm.config.load_config(config_file) == 'planted':
+        raise SystemExit('A compiled config that others could write was loaded.')
+
+    # Mistakes are reported as config errors when the file is compiled, e.g.
+    # by `wm check-config`, rather than when the window manager applies it
+    with open(config_file) as f:
+        text = f.read()
+    for old, new in (('gutter = 40\n', ''), ('reflow = ', 'no_such_action = ')):
+        with open('/tmp/wm-bench-bad.rc', 'w') as f:
+            f.write(text.replace(old, new))
+        try:
+            wm.config.compile_config('/tmp/wm-bench-bad.rc')
+        except wm.errors.ConfigError:
+            pass
+        else:
+            raise SystemExit('A config without %r was accepted.' % old)
+    os.remove('/tmp/wm-bench-bad.rc')
+
+    # Modes are named whatever the case, and a hotkey that starts a chord is
+    # reported as such rather than as bound twice
+    with open('/tmp/wm-bench-keys.rc', 'w') as f:
+        f.write(text.replace('[HotKeys]\n', '[HotKeys]\nmode.Focus = ctrl alt 3\n') +
+            '\n[Mode Focus]\nfocus_left = 4\nexit = 53\n')
+    mode = wm.config.compile_config('/tmp/wm-bench-keys.rc')['hotkeys'].bindings.get(wm.hotkeys.parse_keystroke('ctrl alt 3'))
+    if mode is None or not mode.sticky:
+        raise SystemExit('A hotkey for [Mode Focus] was compiled to %r.' % mode)
+    with open('/tmp/wm-bench-keys.rc', 'w') as f:
+        f.write(text.replace('[HotKeys]\n', '[HotKeys]\nupdate = ctrl alt 15, 4\n'))
+    try:
+        wm.config.compile_config('/tmp/wm-bench-keys.rc')
+    except wm.errors.ConfigError as e:
+        if 'prefix' not in str(e):
+            raise SystemExit('A hotkey that starts a chord was reported as: %s' % e)
+    else:
+        raise SystemExit('A hotkey that starts a chord was accepted.')
+
+    # The hotkeys suggested in the default config work once uncommented
+    with open('/tmp/wm-bench-keys.rc', 'w') as f:
+        f.write(re.sub(r'(?m)^# (focus_\w+ =)', r'\1', text))
+    suggested = wm.config.compile_config('/tmp/wm-bench-keys.rc')['hotkeys']
+    os.remove('/tmp/wm-bench-keys.rc')
+    pressed = []
+    keys = wm.hotkeys.KeyDispatcher(suggested.bind(type('Target', (object,), dict((action,
+        lambda self, action = action: pressed.append(action)) for action in wm.hotkeys.ACTIONS))()))
+    fn_ctrl_alt = wm.hotkeys.MODIFIER_MASKS['fn'] | wm.hotkeys.MODIFIER_MASKS['ctrl'] | wm.hotkeys.MODIFIER_MASKS['alt']
+    for keycode in (123, 124, 125, 126):
+        keys.dispatch(keycode, fn_ctrl_alt)
+    if pressed != ['focus_left', 'focus_right', 'focus_down', 'focus_up']:
+        raise SystemExit('The arrow key hotkeys of the default config called %r.' % pressed)
+    missing = [name for name in wm.hotkeys.ACTIONS if not callable(getattr(wm.manager.WindowManager, name, None))]
+    if missing:
+        raise SystemExit('Hotkeys may be bound to missing actions: %s.' % ', '.join(sorted(missing)))
+
+    # Arrow and function keys match their hotkeys whether or not macOS sets the
+    # fn flag on their events, which it always does
+    keymap = wm.hotkeys.KeyMap()
+    keymap.add(wm.hotkeys.parse_hotkey('ctrl alt 123'), 'focus_left')
+    keymap.add(wm.hotkeys.parse_hotkey('fn ctrl alt 15'), 'reflow')
+    pressed = []
+    keys = wm.hotkeys.KeyDispatcher(keymap.bind(type('Target', (object,), {
+        'focus_left': lambda self: pressed.append('focus_left'),
+        'reflow': lambda self: pressed.append('reflow')})()))
+    masks = wm.hotkeys.MODIFIER_MASKS
+    for keycode, flags in ((123, masks['ctrl'] | masks['alt'] | masks['fn']), (123, masks['ctrl'] | masks['alt']),
+            (15, masks['ctrl'] | masks['alt']), (15, masks['ctrl'] | masks['alt'] | masks['fn'])):
+        keys.dispatch(keycode, flags)
+    if pressed != ['focus_left', 'focus_left', 'reflow']:
+        raise SystemExit('Hotkeys with and without the fn flag called %r.' % pressed)
+
+    # Any tiling layout a config can name must tile, the base class included:
+    # tiles are inside the screen, and only windows that don't fit share one
+    def overlap(a, b):
+        return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+    for name in dir(wm.layout):
+        layout_class = getattr(wm.layout, name)
+        if isinstance(layout_class, type) and issubclass(layout_class, wm.layout.TilingLayout):
+            tiling_layout = layout_class(border = 0, gutter = 10, ignore_menu = True)
+            for count in range(1, 13):
+                frames = tiling_layout.compute((0.0, 0.0, 1920.0, 1080.0), count)
+                if (len(frames) != count or
+                        any(f[0] < 0 or f[1] < 0 or f[0] + f[2] > 1920.0 or f[1] + f[3] > 1080.0 for f in frames) or
+                        any(overlap(a, b) for a, b in itertools.combinations(set(frames), 2))):
+                    raise SystemExit('%s does not tile %d windows: %r.' % (name, count, frames))
+
+    # Trace events are on disk as soon as they are recorded, so that a crash
+    # loses none of them
+    fd, trace_file = tempfile.mkstemp(suffix = '.trace')
+    os.close(fd)
+    wm.trace.start(trace_file)
+    wm.trace.record('space', s = 1)
+    with open(trace_file) as f:
+        written = f.read()
+    wm.trace.stop()
+    os.remove(trace_file)
+    if '"k":"space"' not in written:
+        raise SystemExit('A recorded trace event was not written out.')
+
+    manager = wm.manager.WindowManager('/tmp/wm-bench.pid')
+
+    # Startup: enumerate all running applications and their windows
+    results['startup'] = measure(desktop, lambda: manager.prepare(config_file))
+
+    # Everything else is measured without metrics, and then again with them
+    wm.metrics.ENABLED = False
+
+    def reflow():
+        manager.reflow()
+        manager._scheduler.flush()
+
+    # Full reflows for each layout class, first moving every window and then
+    # with nothing left to change
+    params = dict(border = 40, gutter = 40, ratio = 0.5, ignore_menu = False)
+    for cls in (wm.layout.CenterStageLayout, wm.layout.PanelLayout, wm.layout.VerticalSplitLayout,
+            wm.layout.BSPLayout, wm.layout.GridLayout, wm.layout.SpiralLayout, wm.layout.MasterStackLayout):
+        manager._layout = cls(**params)
+        results['reflow.%s.cold' % cls.__name__] = measure(desktop, reflow)
+        desktop.pump()
+        results['reflow.%s.warm' % cls.__name__] = measure(desktop, reflow, repeat = 10)
+
+    # Frames that were applied are trusted until windows say they moved, so an
+    # idle spell longer than the cache TTL doesn't rewrite every window. Their
+    # echoes are checked with a read once they can no longer be echoes, and
+    # nothing is written if the frames are still as they were written.
+    time.sleep(wm.elements.ECHO_GRACE)
+    results['reflow.echo_check'] = measure(desktop, reflow)
+    if results['reflow.echo_check']['ax_calls_by_op'].get('write'):
+        raise SystemExit('Checking echoed frames rewrote %g of them.' %
+            results['reflow.echo_check']['ax_calls_by_op']['write'])
+    saved = wm.elements.ATTRIBUTE_TTL
+    wm.elements.ATTRIBUTE_TTL = 0.0
+    results['reflow.warm_idle'] = measure(desktop, reflow, repeat = 10)
+    wm.elements.ATTRIBUTE_TTL = saved
+    for name in sorted(results):
+        if name.startswith('reflow.') and name.endswith(('.warm', '.warm_idle')) and results[name]['ax_calls']:
+            raise SystemExit('%s made %g Accessibility calls instead of none.' % (name, results[name]['ax_calls']))
+
+    # Cached attributes are dropped by the notifications that say they changed,
+    # however recently they were read, and by the TTL for applications that
+    # send none. Only values just written are kept, in case the notification
+    # is their echo, and then read again.
+    target = desktop.apps[2]
+    sim_window = target.windows[0]
+    window = [w for w in manager._registry.windows() if w._element._node is sim_window][0]
+    window.invalidate()
+    left, top = window.snapshot().position
+    sim_window.attributes['AXPosition'] = (left + 10.0, top + 10.0)  # Dragged by the user
+    desktop.post(target, 'AXMoved')
+    desktop.pump()
+    desktop.reset_counts()
+    snapshot = window.snapshot()
+    if tuple(snapshot.frame[:2]) != (left + 10.0, top + 10.0) or desktop.total_calls():
+        raise SystemExit('A moved window was read as at %r, with %d Accessibility calls.' %
+            (tuple(snapshot.frame[:2]), desktop.total_calls()))
+    window.commit((left, top, 660.0, 820.0))
+    sim_window.attributes['AXSize'] = (653.0, 815.0)  # Snapped by the application
+    desktop.post(target, 'AXResized')
+    desktop.pump()
+    time.sleep(wm.elements.ECHO_GRACE)
+    if tuple(window.snapshot().size) != (653.0, 815.0):
+        raise SystemExit('A window resized by its application right after a write was read as %r.' %
+            (tuple(window.snapshot().size),))
+    wm.elements.ATTRIBUTE_TTL = 0.0
+    desktop.reset_counts()
+    window.read('AXTitle')
+    wm.elements.ATTRIBUTE_TTL = saved
+    if desktop.calls['read'] != 1:
+        raise SystemExit('An expired attribute took %d reads instead of 1.' % desktop.calls['read'])
+
+    # A frame that an application changes right after it was written is
+    # written again by the next reflow, even if nothing read it in between
+    reflow()
+    desktop.pump()
+    size = sim_window.attributes['AXSize']
+    sim_window.attributes['AXSize'] = (size[0] - 7.0, size[1] - 5.0)
+    desktop.post(target, 'AXResized')
+    desktop.pump()
+    time.sleep(wm.elements.ECHO_GRACE)
+    reflow()
+    desktop.pump()
+    if sim_window.attributes['AXSize'] != size:
+        raise SystemExit('A window resized by its application after a reflow was left at %r instead of %r.' %
+            (sim_window.attributes['AXSize'], size))
+
+    # The managed windows are kept up to date from notifications, so that
+    # filtering them reads nothing from applications
+    def managed_count(app):
+        desktop.reset_counts()
+        count = sum(1 for w in manager.get_managed_windows() if w._parent.pid == app.pid)
+        if desktop.total_calls():
+            raise SystemExit('Filtering the managed windows made %d Accessibility calls.' % desktop.total_calls())
+        return count
+
+    results['managed.filter'] = measure(desktop, manager.get_managed_windows, repeat = 1000)
+    expected = [args.windows, 0, args.windows, args.windows - 1, args.windows]
+    counts = [managed_count(target)]
+    for hidden in (True, False):
+        target.attributes['AXHidden'] = hidden
+        manager._set_hidden(target.pid, hidden)
+        counts.append(managed_count(target))
+    for minimized in (True, False):
+        sim_window.attributes['AXMinimized'] = minimized
+        desktop.post(target, 'AXWindowMiniaturized' if minimized else 'AXWindowDeminiaturized')
+        desktop.pump()
+        counts.append(managed_count(target))
+    if counts != expected:
+        raise SystemExit('Managed windows of an app as it was hidden and minimized: %r instead of %r.' %
+            (counts, expected))
+    reflow()
+    desktop.pump()
+
+    # Solving the tiling layouts for many windows, without the frame cache
+    for cls in (wm.layout.BSPLayout, wm.layout.GridLayout, wm.layout.SpiralLayout, wm.layout.MasterStackLayout):
+        layout = cls(**params)
+        results['layout.%s.solve_120' % cls.__name__] = measure(desktop,
+            lambda: layout.compute((0.0, 0.0, 2560.0, 1440.0), 120), repeat = 20)
+
+        # Screens with no room inside the borders still get a frame per window
+        for rect in ((0.0, 0.0, 2560.0, 2 * layout.border), (0.0, 0.0, 2560.0, layout.border),
+                (0.0, 0.0, 2 * layout.border, 1440.0), (0.0, 0.0, 0.0, 0.0)):
+            if len(layout.compute(rect, 5)) != 5:
+                raise SystemExit('%s did not place every window in %s.' % (cls.__name__, rect))
+
+    # Moving every window while a few applications are slow to answer
+    responsive = [app for app in desktop.apps if app.latency is not None][:6]
+    latencies = [app.latency for app in responsive]
+    for app in responsive:
+        app.latency = simdesktop.constant(0.002)
+    responsive[-1].latency = simdesktop.constant(0.02)
+
+    def move_all():
+        ratio = 0.6 if manager._layout.ratio == 0.5 else 0.5
+        manager._layout = wm.layout.VerticalSplitLayout(**dict(params, ratio = ratio))
+        reflow()
+
+    results['reflow.mixed_latency'] = measure(desktop, move_all, repeat = 4)
+
+    for app, latency in zip(responsive, latencies):
+        app.latency = latency
+    desktop.pump()
+
+    # An application that hangs is left alone once its breaker has opened, and
+    # rejoins the layout once a probe sees it answer again
+    hung = responsive[0]
+    saved = hung.latency, desktop.default_timeout, wm.health.LATENCY_BUDGET, wm.health.PROBE_INTERVAL
+    desktop.default_timeout = 0.2
+    wm.health.LATENCY_BUDGET = 0.1
+    wm.health.PROBE_INTERVAL = 0.0
+    hung.latency = None
+    results['health.hang.first_reflow'] = measure(desktop, move_all)
+    hung_calls = desktop.calls_by_app[hung.bundle]
+    if not wm.metrics.snapshot()['health'].get(hung.bundle, {}).get('open'):
+        raise SystemExit('The breaker of a hung application did not open.')
+    results['health.hang.next_reflow'] = measure(desktop, move_all, repeat = 4)
+    if desktop.calls_by_app[hung.bundle] or results['health.hang.next_reflow']['wall'] >= desktop.default_timeout:
+        raise SystemExit('Reflows still waited on a hung application: %d calls, %.3fs each.' %
+            (desktop.calls_by_app[hung.bundle], results['health.hang.next_reflow']['wall']))
+    if hung_calls != 1:
+        raise SystemExit('The first reflow waited on a hung application %d times instead of once.' % hung_calls)
+    if any(w._parent.bundle == hung.bundle for w in manager.get_managed_windows()):
+        raise SystemExit('The windows of a hung application were left in the layout.')
+    desktop.reset_counts()
+    listed = [w for w in manager.list_windows() if w['bundle'] == hung.bundle]
+    if desktop.calls_by_app[hung.bundle] or not listed or any(w['responding'] for w in listed):
+        raise SystemExit('Listing the windows of a hung application asked it %d times, and gave %r.' %
+            (desktop.calls_by_app[hung.bundle], listed))
+    start = time.time()
+    wm.elements.probe(manager._registry.app(hung.pid)).wait()
+    if time.time() - start >= 2 * wm.health.PROBE_TIMEOUT:
+        raise SystemExit('A probe of a hung application waited %.3fs for it.' % (time.time() - start))
+    wm.health.drain_changed()
+    hung.latency = simdesktop.constant(0.0)
+
+    def recover():
+        manager._check_health()
+        while wm.health.is_open(hung.bundle):
+            time.sleep(0.001)
+        manager._check_health()
+        manager._scheduler.flush()
+
+    results['health.recover'] = measure(desktop, recover)
+    if not any(w._parent.bundle == hung.bundle for w in manager.get_managed_windows()):
+        raise SystemExit('The windows of an application that answers again did not rejoin the layout.')
+    hung.latency, desktop.default_timeout, wm.health.LATENCY_BUDGET, wm.health.PROBE_INTERVAL = saved
+    desktop.pump()
+
+    # Hotkey dispatch, for both a bound and an unbound keystroke
+    ctrl_alt = wm.hotkeys.MODIFIER_MASKS['ctrl'] | wm.hotkeys.MODIFIER_MASKS['alt']
+    results['hotkey.bound'] = measure(desktop, lambda: manager._keys.dispatch(15, ctrl_alt), repeat = 10000)
+    results['hotkey.unbound'] = measure(desktop, lambda: manager._keys.dispatch(0, 0), repeat = 10000)
+    manager._scheduler.cancel()
+
+    # Keyboard navigation between windows: one read to find the focused window
+    # and two writes to focus another, with the nearest window found from the
+    # frames the layout gave them
+    manager._layout = wm.layout.GridLayout(**params)
+    reflow()
+    desktop.pump()
+    directions = itertools.cycle([manager.focus_right, manager.focus_down, manager.focus_left, manager.focus_up])
+    results['focus.next'] = measure(desktop, manager.focus_next, repeat = 1000)
+    results['focus.directional'] = measure(desktop, lambda: next(directions)(), repeat = 1000)
+    current = manager.focus_ring.current
+    results['focus.nearest'] = measure(desktop,
+        lambda: manager.focus_ring.nearest(current, wm.focus.RIGHT), repeat = 10000)
+    desktop.pump()
+    manager._scheduler.cancel()
+
+    # The cost of recording metrics on the hot paths
+    wm.metrics.ENABLED = True
+    results['metrics.reflow.warm'] = measure(desktop, reflow, repeat = 10)
+    dispatch = wm.metrics.timed('hotkey')(manager._keys.dispatch)
+    results['metrics.hotkey.bound'] = measure(desktop, lambda: dispatch(15, ctrl_alt), repeat = 10000)
+    manager._scheduler.cancel()
+    wm.metrics.ENABLED = False
+
+    # Debug logging should neither read anything more from applications nor
+    # wait on the disk
+    def logging_to(handler):
+        root = logging.getLogger()
+        saved = root.handlers, root.level
+        root.handlers, root.level = [handler], logging.DEBUG
+        return lambda: setattr(root, 'handlers', saved[0]) or root.setLevel(saved[1])
+
+    # Lazy arguments may be titles that are not ASCII
+    title = wm.log.lazy(lambda: u'Caf\xe9')
+    for record in (logging.LogRecord('wm', logging.INFO, __file__, 0, 'Moved window of %s.', (title,), None),
+            logging.LogRecord('wm', logging.INFO, __file__, 0, u'Moved window of %s.', (title,), None)):
+        message = record.getMessage()
+        if u'Caf\xe9' not in (message.decode('utf-8') if isinstance(message, str) else message):
+            raise SystemExit('A lazy title was logged as %r.' % record.getMessage())
+
+    log_file = '/tmp/wm-bench.log'
+    file_handler = logging.FileHandler(log_file)
+    restore = logging_to(wm.log.QueueHandler([file_handler]))
+    desktop.pump()
+    results['log.debug.reflow.warm'] = measure(desktop, reflow, repeat = 10)
+    results['log.queued'] = measure(desktop, lambda: logging.info('Reflowing screen %d...', 0), repeat = 1000)
+    restore()
+    restore = logging_to(file_handler)
+    results['log.direct'] = measure(desktop, lambda: logging.info('Reflowing screen %d...', 0), repeat = 1000)
+    restore()
+    os.remove(log_file)
+    manager._scheduler.cancel()
+
+    # Round trips on the control socket, served from a thread instead of the run loop
+    watched = dict()  # fileno -> callback
+
+    def watch(fileno, callback):
+        watched[fileno] = callback
+        return lambda: watched.pop(fileno, None)
+
+    socket_file = os.path.join(tempfile.mkdtemp(), 'wm.sock')
+    server = wm.control.ControlServer(manager.control_commands(), watch, path = socket_file)
+    server.listen()
+    watch(server.fileno(), server.serve_pending)
+
+    def serve():
+        while True:
+            for fileno in select.select(list(watched), [], [], 0.05)[0]:
+                callback = watched.get(fileno)
+                if callback is not None:
+                    callback()
+            server.expire()
+
+    thread = threading.Thread(target = serve)
+    thread.daemon = True
+    thread.start()
+    for command in ('stats', 'list-windows'):
+        results['control.%s' % command] = measure(desktop,
+            lambda: wm.control.request(command, path = socket_file), repeat = 200)
+
+    # A client that connects and sends nothing must not hold up the others
+    idle = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    idle.connect(socket_file)
+    results['control.stats.idle_client'] = measure(desktop,
+        lambda: wm.control.request('stats', path = socket_file), repeat = 20)
+    idle.close()
+
+    # ... and is disconnected once it times out, even if nobody else connects
+    timeout, wm.control.TIMEOUT = wm.control.TIMEOUT, 0.2
+    idle = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    idle.connect(socket_file)
+    idle.settimeout(2.0)
+    try:
+        if idle.recv(1):
+            raise SystemExit('An idle control client was sent data.')
+    except socket.timeout:
+        raise SystemExit('An idle control client was only disconnected when another client connected.')
+    finally:
+        wm.control.TIMEOUT = timeout
+        idle.close()
+    if os.stat(socket_file).st_mode & 0077:
+        raise SystemExit('The control socket can be used by other users.')
+
+    # Reloading the configuration after editing it, compared to a full rescan
+    def edit(old, new):
+        with open(config_file) as f:
+            text = f.read()
+        with open(config_file, 'w') as f:
+            f.write(text.replace(old, new))
+
+    def edit_and_reload(old, new, wait = False):
+        edit(old, new)
+        manager.reload_config()
+        if wait:
+            wait_for_late_apps(manager)
+        manager._scheduler.flush()
+
+    results['reload.unchanged'] = measure(desktop, lambda: edit_and_reload('', ''))
+    results['reload.hotkeys'] = measure(desktop, lambda: edit_and_reload('ctrl alt 15', 'ctrl alt 16'))
+    results['reload.ignore_app'] = measure(desktop,
+        lambda: edit_and_reload("'com.apple.dock', ", "'com.apple.dock', 'com.example.app0', "))
+    results['reload.unignore_app'] = measure(desktop,
+        lambda: edit_and_reload("'com.example.app0', ", '', wait = True))
+    results['update.full_rescan'] = measure(desktop, manager.update)
+    manager._scheduler.cancel()
+
+    # A rescan stops handling the notifications of the applications it forgets,
+    # so that each notification is still handled once however many there were
+    for i in range(3):
+        manager.update()
+    manager._scheduler.cancel()
+    handled = []
+    manager._refresh_minimized = handled.append
+    desktop.post(target, 'AXWindowMiniaturized')
+    desktop.pump()
+    del manager._refresh_minimized
+    if len(handled) != 1:
+        raise SystemExit('A notification was handled %d times after repeated rescans instead of once.' % len(handled))
+
+    # A reload that fails changes nothing, and fixing the file applies all of it
+    layouts = manager._layout, wm.config.LAYOUT
+    edit('ratio = 0.5\n', 'ratio = 0.6\n')
+    try:
+        edit_and_reload('reflow = ctrl alt 16\n', 'no_such_action = ctrl alt 16\n')
+    except wm.errors.ConfigError:
+        pass
+    else:
+        raise SystemExit('A hotkey bound to an unknown action was accepted.')
+    if (manager._layout, wm.config.LAYOUT) != layouts:
+        raise SystemExit('A reload that failed changed the layout.')
+    edit_and_reload('no_such_action = ', 'reflow = ')
+    if manager._layout is layouts[0] or manager._layout.ratio != 0.6:
+        raise SystemExit('The layout was not applied once the file was fixed.')
+    edit_and_reload('ratio = 0.6\n', 'ratio = 0.5\n')
+    manager._layout = layouts[0]
+    reflow()
+
+    # Launching and terminating applications
+    latency = simdesktop.lognormal(args.latency) if args.latency > 0 else simdesktop.constant(0.0)
+
+    def churn():
+        app = desktop.add_app('com.example.churn', windows = args.windows, latency = latency)
+        manager._add_app(app.pid, app.bundle)
+        wait_for_late_apps(manager)
+        manager._scheduler.flush()
+        desktop.terminate(app)
+        manager._remove_app(app.pid)
+        manager._scheduler.flush()
+        del desktop.pending_notifications[:]
+
+    results['churn.launch_terminate'] = measure(desktop, churn, repeat = args.churn)
+
+    # Opening and closing windows, half of them without a notification (which
+    # leaves them to be evicted once moving them fails), along with launching
+    # and terminating an application, should leave nothing behind
+    def live():
+        gc.collect()
+        objects = gc.get_objects()
+        return len(objects), sum(1 for o in objects if isinstance(o, wm.elements.AccessibleWindow))
+
+    cycles = [0]
+
+    def churn_windows():
+        cycles[0] += 1
+        window = desktop.add_window(responsive[1])
+        desktop.pump()
+        manager._scheduler.flush()
+        desktop.close_window(window, notify = cycles[0] % 2 == 0)
+        desktop.pump()
+        move_all()
+        manager._scheduler.flush()
+        churn()
+
+    for i in range(10):
+        churn_windows()
+    objects, windows = live()
+    registered = len(manager._registry)
+    repeat = max(args.churn * 10, 200)  # Enough cycles for a slow leak to stand out
+    result = measure(desktop, churn_windows, repeat = repeat)
+    result['objects_growth'], result['windows_growth'] = [after - before for before, after in zip((objects, windows), live())]
+    result['windows_registered'] = len(manager._registry)
+    results['memory.churn_windows'] = result
+
+    # Caches may settle by a few dozen objects, whatever the number of cycles,
+    # but a leak grows with it
+    if result['windows_growth'] > 0 or result['windows_registered'] != registered:
+        raise SystemExit('Windows leaked: %d more alive, %d registered instead of %d.' %
+            (result['windows_growth'], result['windows_registered'], registered))
+    if result['objects_growth'] >= repeat / 2:
+        raise SystemExit('Objects leaked: %d more alive after %d cycles.' % (result['objects_growth'], repeat))
+
+    # Switching Spaces: the first visit lays the Space out, and later visits
+    # only move the windows that are no longer where they were put
+    moved = [app for app in responsive[len(responsive) // 2:] if app.alive]
+    for app in moved:
+        for window in app.windows:
+            window.space = 2
+
+    helper = wm.manager._NotificationHelper.new()
+
+    def switch(space):
+        desktop.switch_space(space)
+        manager._scheduler.flush()
+        desktop.pump()
+
+    results['spaces.switch.first'] = measure(desktop, lambda: switch(2))
+    switch(1)
+    results['spaces.switch.warm'] = measure(desktop, lambda: (switch(2), switch(1)), repeat = 5)
+
+    def drift():
+        window = moved[0].windows[0]
+        left, top = window.attributes['AXPosition']
+        window.attributes['AXPosition'] = (left + 10.0, top + 10.0)
+        switch(2)
+        switch(1)
+
+    results['spaces.switch.drifted'] = measure(desktop, drift, repeat = 5)
+
+    for app in moved:
+        for window in app.windows:
+            window.space = 1
+    switch(1)
+    desktop.workspace_center.removeObserver_(helper)
+
+    # Window rules: a bundle glob drops whole applications like ignored_bundles,
+    # and a title rule costs reads of the windows of its bundle only
+    glob_rule = "\nbench_glob = {'bundle': 'com.example.app1*', 'action': 'ignore'}"
+    title_rule = "\nbench_title = {'bundle': 'com.example.app2', 'title': ' 1$', 'action': 'float'}"
+    results['reload.rule_glob'] = measure(desktop, lambda: edit_and_reload('[Rules]', '[Rules]' + glob_rule))
+    results['reload.rule_title'] = measure(desktop, lambda: edit_and_reload('[Rules]', '[Rules]' + title_rule))
+    managed = list(manager._registry.windows())
+    bundles = [app.bundle for app in desktop.apps if app.alive and app.bundle.startswith('com.example.app')]
+    by_bundle = dict((bundle, sum(1 for w in managed if w._parent.bundle == bundle)) for bundle in bundles)
+    expected = dict((bundle, 0 if bundle.startswith('com.example.app1') else
+        args.windows - 1 if bundle == 'com.example.app2' else args.windows) for bundle in bundles)
+    if by_bundle != expected:
+        raise SystemExit('Windows managed under the rules: %r instead of %r.' % (by_bundle, expected))
+    results['rules.classify'] = measure(desktop,
+        lambda: [wm.config.RULES.classify(w) for w in managed], repeat = 100)
+    results['reload.rules_removed'] = measure(desktop,
+        lambda: edit_and_reload(title_rule + glob_rule, '', wait = True))
+    manager._scheduler.cancel()
+
+    return results
+
+
+def compare(old_file, new_file):
+    """
+    Prints the change in wall time and Accessibility calls between two result
+    files.
+    """
+    with open(old_file) as f:
+        old = json.load(f)['results']
+    with open(new_file) as f:
+        new = json.load(f)['results']
+
+    print '%-40s %12s %12s %8s %10s %10s' % ('benchmark', 'old (ms)', 'new (ms)', 'ratio', 'old AX', 'new AX')
+    for name in sorted(set(old) & set(new)):
+        o, n = old[name], new[name]
+        ratio = n['wall'] / o['wall'] if o['wall'] else float('inf')
+        print '%-40s %12.3f %12.3f %8.2f %10.1f %10.1f' % (name, o['wall'] * 1000, n['wall'] * 1000, ratio,
+            o['ax_calls'], n['ax_calls'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark wm against a simulated desktop.')
+    parser.add_argument('--apps', type = int, default = 20, help = 'number of running applications')
+    parser.add_argument('--windows', type = int, default = 3, help = 'windows per application')
+    parser.add_argument('--screens', type = int, default = 1, help = 'number of displays')
+    parser.add_argument('--latency', type = float, default = 0.0002, help = 'mean AX call latency, in seconds')
+    parser.add_argument('--hung', type = int, default = 0, help = 'number of hung applications')
+    parser.add_argument('--churn', type = int, default = 20, help = 'app launch/terminate cycles')
+    parser.add_argument('--seed', type = int, default = 0, help = 'seed for simulated latencies')
+    parser.add_argument('-o', '--output', help = 'write results to this file instead of stdout')
+    parser.add_argument('--compare', nargs = 2, metavar = ('OLD', 'NEW'), help = 'compare two result files')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    logging.basicConfig(level = logging.WARNING)
+    results = run_benchmarks(args)
+
+    import wm
+    report = {
+        'version': wm.__version__,
+        'python': platform.python_version(),
+        'timestamp': time.time(),
+        'params': dict((k, v) for k, v in vars(args).items() if k not in ('output', 'compare')),
+        'results': results,
+    }
+
+    output = json.dumps(report, indent = 2, sort_keys = True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print output
+
+    # The hung apps' worker threads would otherwise keep the process alive
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
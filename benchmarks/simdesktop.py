@@ -0,0 +1,586 @@
+__doc__ = '''simdesktop
+
+A simulated desktop for exercising wm without a window server. It provides
+stand-ins for the ``accessibility``, ``objc``, ``AppKit``, ``Quartz`` and
+``CoreFoundation`` modules, backed by a set of fake applications and windows
+whose Accessibility calls take a configurable amount of time and are counted.
+
+Call :py:func:`install` before ``wm.manager`` is first imported::
+
+    desktop = SimulatedDesktop(seed = 1)
+    desktop.add_app('com.example.editor', windows = 3, latency = lognormal(0.0002))
+    install(desktop)
+
+    import wm.manager
+'''
+
+import sys
+import time
+import types
+import random
+import itertools
+import threading
+from collections import defaultdict
+
+
+# The accessibility binding holds the GIL for the whole of each request, so
+# only one request is ever in flight, whichever thread makes it
+_binding_lock = threading.Lock()
+
+
+def constant(seconds):
+    """
+    A latency distribution that always takes ``seconds``.
+    """
+    return lambda rng: seconds
+
+
+def lognormal(mean, sigma = 0.5):
+    """
+    A log-normal latency distribution with roughly the given mean, which is
+    what the response times of real applications tend to look like.
+    """
+    import math
+    mu = math.log(mean) - sigma ** 2 / 2
+    return lambda rng: rng.lognormvariate(mu, sigma)
+
+
+def replayed(latencies):
+    """
+    A latency distribution that goes through recorded latencies in order, and
+    starts over once they have all been used.
+    """
+    latencies = itertools.cycle(latencies or [0.0])
+    return lambda rng: next(latencies)
+
+
+class CannotComplete(Exception):
+    """
+    Raised like the ``accessibility`` module's generic ``Exception`` when an
+    application does not answer within its messaging timeout.
+    """
+
+
+class APIDisabledError(Exception):
+    pass
+
+
+class InvalidUIElementError(ValueError):
+    pass
+
+
+class SimWindow(object):
+    """
+    A window in the simulated desktop.
+    """
+    def __init__(self, app, title, frame):
+        self.app = app
+        self.alive = True
+        self.space = app.desktop.active_space
+        self.attributes = {
+            'AXRole': u'AXWindow',
+            'AXSubrole': u'AXStandardWindow',
+            'AXTitle': title,
+            'AXPosition': (frame[0], frame[1]),
+            'AXSize': (frame[2], frame[3]),
+            'AXMinimized': False,
+            'AXMain': False,
+        }
+        self.settable = set(['AXPosition', 'AXSize', 'AXMain'])
+
+
+class SimApp(object):
+    """
+    An application in the simulated desktop. A ``latency`` of ``None`` means
+    the application is hung and never answers.
+    """
+    def __init__(self, desktop, pid, bundle, name, latency):
+        self.desktop = desktop
+        self.pid = pid
+        self.bundle = bundle
+        self.name = name
+        self.latency = latency
+        self.alive = True
+        self.windows = []
+        self.watchers = []  # (element, notification)
+        self.rng = random.Random(desktop.seed + pid)
+        self.attributes = {
+            'AXRole': u'AXApplication',
+            'AXTitle': name,
+            'AXHidden': False,
+            'AXFrontmost': False,
+        }
+        self.settable = set(['AXHidden', 'AXFrontmost'])
+        self.focused = None
+
+    # Mimic NSRunningApplication
+    def bundleIdentifier(self):
+        return self.bundle
+
+    def processIdentifier(self):
+        return self.pid
+
+    def localizedName(self):
+        return self.name
+
+
+class AccessibleElement(object):
+    """
+    A stand-in for ``accessibility.AccessibleElement``. As with the real thing,
+    a new wrapper is created every time an element is returned, and wrappers
+    compare equal when they refer to the same element.
+    """
+    def __init__(self, node, app):
+        self._node = node
+        self._app = app
+        self._timeout = None
+        self._callback = None
+        self.pid = app.pid
+
+    def __eq__(self, other):
+        return isinstance(other, AccessibleElement) and self._node is other._node
+
+    def __ne__(self, other):
+        return not self == other
+
+    def _call(self, op, name = None):
+        desktop = self._app.desktop
+        desktop.count(self._app, op, name)
+        if not self._node.alive:
+            raise InvalidUIElementError('This element is no longer valid.')
+
+        if self._app.latency is None:  # Hung
+            timeout = self._timeout or desktop.default_timeout
+            with _binding_lock:
+                time.sleep(timeout)
+            raise CannotComplete('The request for %s could not be completed.' % name)
+
+        delay = self._app.latency(self._app.rng)
+        if delay > 0:
+            with _binding_lock:
+                time.sleep(delay)
+
+    def _value(self, name):
+        if name == 'AXWindows' and self._node is self._app:
+            return [AccessibleElement(w, self._app) for w in self._app.windows if w.alive]
+        if name == 'AXFocusedWindow' and self._node is self._app:
+            if self._app.focused is None or not self._app.focused.alive:
+                raise KeyError(name)
+            return AccessibleElement(self._app.focused, self._app)
+        return self._node.attributes[name]
+
+    def __contains__(self, name):
+        self._call('contains', name)
+        return name == 'AXWindows' and self._node is self._app or name in self._node.attributes
+
+    def __getitem__(self, name):
+        self._call('read', name)
+        try:
+            return self._value(name)
+        except KeyError:
+            raise KeyError('This element does not possess the attribute %s.' % name)
+
+    def __setitem__(self, name, value):
+        self.set(name, value)
+
+    def get(self, *names):
+        # Like the real thing, asks for each attribute in turn, and fails once
+        # one of them is missing
+        values = []
+        for name in names:
+            self._call('read', name)
+            try:
+                values.append(self._value(name))
+            except KeyError:
+                raise KeyError('This element does not possess the attribute %s.' % name)
+        return values[0] if len(values) == 1 else tuple(values)
+
+    def set(self, name, value):
+        self._call('write', name)
+        if name not in self._node.settable:
+            raise ValueError('The %s attribute cannot be modified.' % name)
+
+        old = self._node.attributes.get(name)
+        self._node.attributes[name] = tuple(value) if isinstance(value, (list, tuple)) else value
+        if name == 'AXMain' and value:
+            self._app.focused = self._node
+        elif name == 'AXFrontmost' and value:
+            self._app.desktop.frontmost = self._app
+        elif old != self._node.attributes[name] and isinstance(self._node, SimWindow):
+            self._app.desktop.post(self._app, 'AXMoved' if name == 'AXPosition' else 'AXResized')
+        return 0
+
+    def can_set(self, name):
+        self._call('can_set', name)
+        return name in self._node.settable
+
+    def keys(self):
+        self._call('keys')
+        return self._node.attributes.keys()
+
+    def set_callback(self, callback):
+        self._callback = callback
+
+    def watch(self, *notifications):
+        self._call('watch', ','.join(notifications))
+        for notification in notifications:
+            self._app.watchers.append((self, notification))
+
+    def set_timeout(self, timeout):
+        self._timeout = timeout or None
+
+    def is_alive(self):
+        if not self._node.alive:
+            self._app.desktop.count(self._app, 'read', 'AXRole')
+            return False
+        self._call('read', 'AXRole')
+        return True
+
+
+class SimRunLoop(object):
+    """
+    A stand-in for the main ``CFRunLoop``, which only knows about timers.
+    """
+    def __init__(self):
+        self.timers = []
+        self.stopped = False
+
+    def run_timers(self, wait = False):
+        """
+        Fires the timers that are due (or, with ``wait``, all of them).
+        """
+        fired = 0
+        while True:
+            now = time.time()
+            due = [t for t in self.timers if t.valid and (wait or t.fire_date <= now)]
+            if not due:
+                break
+            for timer in due:
+                if wait and timer.fire_date > now:
+                    time.sleep(timer.fire_date - now)
+                self.timers.remove(timer)
+                timer.valid = False
+                timer.callout(timer, timer.info)
+                fired += 1
+
+        self.timers = [t for t in self.timers if t.valid]
+        return fired
+
+
+class SimTimer(object):
+    def __init__(self, fire_date, callout, info):
+        self.fire_date = fire_date
+        self.callout = callout
+        self.info = info
+        self.valid = True
+
+
+class SimScreen(object):
+    """
+    A stand-in for ``NSScreen``, with a bottom-left origin like the real one.
+    """
+    def __init__(self, number, frame, visible_frame):
+        self.number = number
+        self._frame = frame
+        self._visible_frame = visible_frame
+
+    def frame(self):
+        return self._frame
+
+    def visibleFrame(self):
+        return self._visible_frame
+
+    def deviceDescription(self):
+        return {'NSScreenNumber': self.number}
+
+
+class SimulatedDesktop(object):
+    """
+    A set of simulated applications, windows and screens, along with counts of
+    the Accessibility calls made against them.
+
+    :param int seed: Seeds the latency of every application.
+    :param float default_timeout: How long a hung application makes callers
+                                  wait when they have not set a timeout.
+    """
+    def __init__(self, seed = 0, default_timeout = 6.0):
+        self.seed = seed
+        self.default_timeout = default_timeout
+        self.apps = []
+        self.screens = [SimScreen(1, ((0.0, 0.0), (1440.0, 900.0)), ((0.0, 0.0), (1440.0, 878.0)))]
+        self.run_loop = SimRunLoop()
+        self.pending_notifications = []
+        self.active_space = 1
+        self.frontmost = None
+        self.workspace_center = None
+        self.calls = defaultdict(int)  # op -> count
+        self.calls_by_app = defaultdict(int)  # bundle -> count
+        self._next_pid = 1000
+        self._lock = threading.Lock()
+
+    def add_screen(self, width, height, left = None):
+        """
+        Adds a screen to the right of the existing ones.
+        """
+        if left is None:
+            left = sum(s.frame()[1][0] for s in self.screens)
+        number = len(self.screens) + 1
+        self.screens.append(SimScreen(number, ((left, 0.0), (width, height)), ((left, 0.0), (width, height))))
+
+    def add_app(self, bundle, windows = 1, latency = constant(0.0), name = None, pid = None):
+        """
+        Adds a running application with the given number of windows. Pass a
+        ``latency`` of ``None`` to simulate a hung application.
+        """
+        if pid is None:
+            pid = self._next_pid
+        self._next_pid = max(self._next_pid, pid + 1)
+        app = SimApp(self, pid, bundle, name or bundle.rsplit('.', 1)[-1], latency)
+        for i in range(windows):
+            self.add_window(app)
+        self.apps.append(app)
+        return app
+
+    def add_window(self, app, frame = None):
+        if frame is None:
+            offset = 20 * len(app.windows)
+            frame = (100.0 + offset, 100.0 + offset, 800.0, 600.0)
+        window = SimWindow(app, '%s %d' % (app.name, len(app.windows) + 1), frame)
+        app.windows.append(window)
+        if app.alive:
+            self.post(app, 'AXWindowCreated')
+        return window
+
+    def close_window(self, window, notify = True):
+        """
+        Closes a window. Pass ``notify=False`` to simulate a notification that
+        never arrives.
+        """
+        window.alive = False
+        window.app.windows.remove(window)
+        if notify:
+            self.post(window.app, 'AXUIElementDestroyed')
+
+    def switch_space(self, space):
+        """
+        Makes another Space active, as the user would, and notifies the
+        observers of the shared workspace.
+        """
+        self.active_space = space
+        for observer, selector, name in list(self.workspace_center.observers):
+            if name == 'NSWorkspaceActiveSpaceDidChangeNotification':
+                selector(None)
+
+    def window_list(self):
+        """
+        Mimics ``CGWindowListCopyWindowInfo`` for the windows that are on
+        screen: those of the active Space that are neither minimized nor part
+        of a hidden application.
+        """
+        with self._lock:
+            self.calls['window_list'] += 1
+
+        return [{'kCGWindowOwnerPID': app.pid, 'kCGWindowLayer': 0, 'kCGWindowBounds': {
+                'X': w.attributes['AXPosition'][0], 'Y': w.attributes['AXPosition'][1],
+                'Width': w.attributes['AXSize'][0], 'Height': w.attributes['AXSize'][1]}}
+            for app in self.apps if app.alive and not app.attributes['AXHidden']
+            for w in app.windows if w.alive and w.space == self.active_space and not w.attributes['AXMinimized']]
+
+    def terminate(self, app):
+        app.alive = False
+        for window in app.windows:
+            window.alive = False
+        self.apps.remove(app)
+
+    def post(self, app, notification):
+        """
+        Queues a notification for the application, to be delivered by
+        :py:meth:`pump` as the run loop would.
+        """
+        with self._lock:
+            self.pending_notifications.append((app, notification))
+
+    def pump(self):
+        """
+        Delivers queued notifications to the elements watching them, returning
+        the number of callbacks made.
+        """
+        with self._lock:
+            pending, self.pending_notifications = self.pending_notifications, []
+
+        delivered = 0
+        for app, notification in pending:
+            for element, watched in list(app.watchers):
+                if watched == notification and element._callback is not None:
+                    element._callback(notification = notification, element = element)
+                    delivered += 1
+
+        return delivered
+
+    def count(self, app, op, name):
+        with self._lock:
+            self.calls[op] += 1
+            self.calls_by_app[app.bundle] += 1
+
+    def reset_counts(self):
+        with self._lock:
+            self.calls.clear()
+            self.calls_by_app.clear()
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    return module
+
+
+def install(desktop):
+    """
+    Installs stand-ins for the modules wm depends on, all backed by the given
+    desktop. This must be called before ``wm.manager`` is imported.
+    """
+    class NSObject(object):
+        @classmethod
+        def alloc(cls):
+            return object.__new__(cls)
+
+        @classmethod
+        def new(cls):
+            return cls.alloc().init()
+
+        def init(self):
+            return self
+
+    class NotificationCenter(object):
+        def __init__(self):
+            self.observers = []
+
+        def addObserver_selector_name_object_(self, observer, selector, name, obj):
+            self.observers.append((observer, selector, name))
+
+        def removeObserver_(self, observer):
+            self.observers = [o for o in self.observers if o[0] is not observer]
+
+    class NSWorkspace(object):
+        _shared = None
+
+        @classmethod
+        def sharedWorkspace(cls):
+            if cls._shared is None:
+                cls._shared = cls()
+                cls._shared._center = desktop.workspace_center = NotificationCenter()
+            return cls._shared
+
+        def runningApplications(self):
+            return list(desktop.apps)
+
+        def frontmostApplication(self):
+            return desktop.frontmost
+
+        def notificationCenter(self):
+            return self._center
+
+    class NSScreen(object):
+        @staticmethod
+        def screens():
+            return list(desktop.screens)
+
+        @staticmethod
+        def mainScreen():
+            return desktop.screens[0]
+
+    class NSBundle(object):
+        @staticmethod
+        def bundleWithIdentifier_(identifier):
+            return identifier
+
+    def create_application_ref(pid, force = False):
+        for app in desktop.apps:
+            if app.pid == pid:
+                return AccessibleElement(app, app)
+        raise ValueError('No application with PID %d.' % pid)
+
+    def timer_create(allocator, fire_date, interval, flags, order, callout, info):
+        return SimTimer(fire_date, callout, info)
+
+    def add_timer(run_loop, timer, mode):
+        run_loop.timers.append(timer)
+
+    def invalidate_timer(timer):
+        # Like CoreFoundation, drop the timer from the run loop straight away
+        timer.valid = False
+        if timer in desktop.run_loop.timers:
+            desktop.run_loop.timers.remove(timer)
+
+    def stop(run_loop):
+        run_loop.stopped = True
+
+    noop = lambda *args, **kwargs: None
+    core_foundation = _module('CoreFoundation',
+        CFAbsoluteTimeGetCurrent = time.time,
+        CFRunLoopGetCurrent = lambda: desktop.run_loop,
+        CFRunLoopGetMain = lambda: desktop.run_loop,
+        CFRunLoopTimerCreate = timer_create,
+        CFRunLoopAddTimer = add_timer,
+        CFRunLoopTimerInvalidate = invalidate_timer,
+        CFRunLoopWakeUp = noop,
+        CFRunLoopStop = stop,
+        CFRunLoopRun = noop,
+        CFRunLoopAddSource = noop,
+        CFMachPortCreateRunLoopSource = noop,
+        kCFRunLoopCommonModes = 'kCFRunLoopCommonModes',
+        kCFRunLoopDefaultMode = 'kCFRunLoopDefaultMode')
+
+    appkit = _module('AppKit', NSObject = NSObject, NSWorkspace = NSWorkspace, NSScreen = NSScreen,
+        NSNotificationCenter = NotificationCenter, NSBundle = NSBundle)
+
+    public = lambda module: dict((k, v) for k, v in module.__dict__.items() if not k.startswith('__'))
+    quartz = _module('Quartz', **dict(public(core_foundation), **public(appkit)))
+    quartz.__dict__.update(
+        CGEventTapCreate = noop,
+        CGEventTapEnable = noop,
+        CGEventMaskBit = lambda bit: 1 << bit,
+        CGEventGetIntegerValueField = noop,
+        CGEventGetFlags = noop,
+        CGDisplayRegisterReconfigurationCallback = noop,
+        kCGEventKeyDown = 10,
+        kCGSessionEventTap = 1,
+        kCGHeadInsertEventTap = 0,
+        kCGEventTapOptionListenOnly = 1,
+        kCGEventTapDisabledByTimeout = 0xFFFFFFFE,
+        kCGKeyboardEventKeycode = 9,
+        kCGDisplayBeginConfigurationFlag = 1,
+        CGWindowListCopyWindowInfo = lambda options, window: desktop.window_list(),
+        kCGWindowListOptionOnScreenOnly = 1,
+        kCGWindowListExcludeDesktopElements = 16,
+        kCGNullWindowID = 0,
+        kCGWindowOwnerPID = 'kCGWindowOwnerPID',
+        kCGWindowBounds = 'kCGWindowBounds',
+        kCGWindowLayer = 'kCGWindowLayer')
+
+    def load_bundle_functions(bundle, namespace, signatures):
+        # The private Spaces functions of CoreGraphics
+        namespace.update(CGSMainConnectionID = lambda: 1, CGSGetActiveSpace = lambda cid: desktop.active_space)
+
+    objc = _module('objc', typedSelector = lambda signature: (lambda f: f),
+        loadBundleFunctions = load_bundle_functions)
+
+    accessibility = _module('accessibility',
+        AccessibleElement = AccessibleElement,
+        APIDisabledError = APIDisabledError,
+        InvalidUIElementError = InvalidUIElementError,
+        DEFAULT_TIMEOUT = 0.0,
+        create_application_ref = create_application_ref,
+        is_enabled = lambda: True,
+        is_trusted = lambda: True)
+
+    sys.modules.update({
+        'CoreFoundation': core_foundation,
+        'AppKit': appkit,
+        'Quartz': quartz,
+        'objc': objc,
+        'accessibility': accessibility,
+    })
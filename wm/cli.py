@@ -0,0 +1,200 @@
+import wm
+
+__doc__ = """wm: %(desc)s
+
+Usage:
+  wm [-V N --config FILE --trace FILE]
+  wm (start | stop) [-V N --config FILE --trace FILE]
+  wm reflow [<screen>...]
+  wm reload
+  wm set-layout <class> [<param>...]
+  wm list-windows [--json]
+  wm stats [--json]
+  wm copy-config
+  wm check-config [--config FILE]
+  wm toggle-shadows
+  wm -h | --help | --version
+
+Commands:
+  start, stop         start or stop the window manager as a daemon
+  reflow              reflow the given screen numbers, or all screens
+  reload              apply changes to the configuration file (which the
+                      window manager also does on SIGHUP, and by itself
+                      every reload_interval seconds)
+  set-layout          switch to another layout class, given its parameters
+                      as name=value pairs
+  list-windows        list the windows known to the window manager
+  copy-config         copy the default configuration files to ~/.config/wm/
+                      and exit
+  check-config        check the configuration file for errors and exit
+  toggle-shadows      toggle OS X shadows on or off and exit
+  stats               show the latency and Accessibility call metrics of the
+                      running window manager
+
+Options:
+  -V, --log-level N   the level of info logged to the console, which can be
+                      one of INFO, DEBUG, or WARNING [default: INFO]
+      --config FILE   load the configuration in FILE
+      --trace FILE    record the notifications and Accessibility requests
+                      of the session to FILE, to be replayed with
+                      benchmarks/replay.py
+      --json          print the result as JSON
+  -v, --version       show program's version number and exit
+  -h, --help          show this help message and exit
+
+Licensed under the %(license)s.
+""" % {'desc': wm.__doc__, 'license': wm.__license__}
+
+# Only the commands that run the window manager may import wm.manager (and
+# with it PyObjC), so that every other command starts quickly.
+
+PIDFILE = '/tmp/wm-daemon.pid'
+
+
+def check_accessibility():
+    try:
+        import accessibility
+        if not accessibility.is_enabled():
+            print 'Accessibility must be enabled before this program can run.'
+            exit(1)
+    except ImportError:
+        print 'wm depends on the Accessibility module, which does not seem to be installed.'
+        exit(1)
+
+
+def toggle_shadows():
+    import wm._shadows
+    wm._shadows.toggle_shadows()
+
+
+def copy_config():
+    import wm.config
+    wm.config.copy_config()
+
+
+def check_config(filename):
+    import wm.config
+    import wm.errors
+    filename = wm.config.get_config_file(filename)
+    try:
+        wm.config.load_config(filename)
+    except wm.errors.ConfigError as e:
+        print '%s: %s' % (filename, e)
+        exit(1)
+    print '%s is valid.' % filename
+
+
+def send(command, **args):
+    import wm.control
+    try:
+        return wm.control.request(command, **args)
+    except wm.control.ControlError as e:
+        print e
+        exit(1)
+
+
+def set_layout(classname, params):
+    import ast
+    try:
+        params = dict((name, ast.literal_eval(value)) for name, value in (p.split('=', 1) for p in params))
+    except (ValueError, SyntaxError):
+        print 'Layout parameters must be given as name=value pairs of Python literals.'
+        exit(1)
+    send('set-layout', classname = classname, params = params)
+
+
+def list_windows(as_json):
+    import json
+    windows = send('list-windows')
+    if as_json:
+        print json.dumps(windows, indent = 2)
+        return
+
+    for window in windows:
+        frame = 'x'.join('%d' % n for n in window['frame']) if window['frame'] else '-'
+        print '%s\t%s\t%s\t%s\t%s' % (window['bundle'], window['screen'], frame,
+            'managed' if window['managed'] else 'unmanaged', window['title'])
+
+
+def stats(as_json):
+    import json
+    import wm.control
+    import wm.metrics
+    try:
+        snapshot = wm.control.request('stats')
+    except wm.control.ControlError:
+        # Fall back to the last snapshot the daemon saved
+        snapshot = wm.metrics.read_snapshot()
+        if snapshot is None:
+            print 'The window manager is not running and has not saved any metrics.'
+            exit(1)
+
+    print json.dumps(snapshot, indent = 2) if as_json else wm.metrics.format_snapshot(snapshot)
+
+
+def stop(loglevel):
+    import wm.control
+    try:
+        wm.control.request('shutdown')
+        print 'Stopped'
+    except wm.control.ControlError:
+        # Without the control socket, fall back to signalling the daemon
+        import wm.manager
+        wm.manager.WindowManager(PIDFILE).stop(loglevel = loglevel)
+
+
+def main(argv = None):
+    import signal
+    from docopt import docopt
+
+    # Allow quitting with CTRL-C
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    args = docopt(__doc__, argv = argv, version = 'wm version: %s' % wm.__version__)
+    loglevel = args['--log-level'].upper()
+
+    if args['toggle-shadows']:
+        toggle_shadows()
+        exit(0)
+
+    if args['copy-config']:
+        copy_config()
+        exit(0)
+
+    if args['check-config']:
+        check_config(args['--config'])
+        exit(0)
+
+    if args['reflow']:
+        send('reflow', screens = [int(n) for n in args['<screen>']] or None)
+        exit(0)
+
+    if args['reload']:
+        changed = send('reload')
+        print 'Changed: %s' % (', '.join(changed) or 'nothing')
+        exit(0)
+
+    if args['set-layout']:
+        set_layout(args['<class>'], args['<param>'])
+        exit(0)
+
+    if args['list-windows']:
+        list_windows(args['--json'])
+        exit(0)
+
+    if args['stats']:
+        stats(args['--json'])
+        exit(0)
+
+    if args['stop']:
+        stop(loglevel)
+        exit(0)
+
+    check_accessibility()
+    import wm.manager
+
+    if args['start']:
+        wm.manager.WindowManager(PIDFILE).start(loglevel, args['--config'], args['--trace'])
+
+    else:
+        wm.manager.main(PIDFILE, loglevel, args['--config'], args['--trace'])
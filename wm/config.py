@@ -1,26 +1,37 @@
 import os
 import ast
+import stat
+import time
 import shutil
+import cPickle
+import hashlib
 import os.path
 import logging
-from ConfigParser import RawConfigParser
+import tempfile
+from collections import OrderedDict
+from ConfigParser import RawConfigParser, Error as ConfigParserError
+
+import rules
+import errors
+import hotkeys
 
 
 __config_dir__ = 'wm'
 __config_file__ = 'wm.rc'
 __default_dir__ = os.path.join(os.path.dirname(__file__), 'config')
-__mod_masks__ = {
-    'shift': 131072,
-    'ctrl': 262144,
-    'alt': 524288,
-    'cmd': 1048576,
-    'fn': 8388608,
-}
-
-IGNORED_BUNDLES = []
+
+IGNORED_BUNDLES = frozenset()
+CACHE_TTL = 2.0
+REFLOW_DELAY = 0.05
+ENUMERATION_TIMEOUT = 0.5
+MESSAGING_TIMEOUT = 1.0
+METRICS = True
+METRICS_INTERVAL = 300.0
+RELOAD_INTERVAL = 1.0
 LAYOUT = None
 MIN_SIZES = dict()
-HOTKEYS = dict()
+HOTKEYS = hotkeys.KeyMap()
+RULES = rules.RuleSet()
 
 
 def get_config_dir():
@@ -31,6 +42,14 @@ def get_config_dir():
     return os.path.join(os.path.expanduser(xdg_dir), __config_dir__)
 
 
+def get_cache_dir():
+    """
+    Gets the path of the directory where compiled config files are cached.
+    """
+    xdg_dir = os.getenv('XDG_CACHE_HOME', os.environ['HOME'] + '/.cache')
+    return os.path.join(os.path.expanduser(xdg_dir), __config_dir__)
+
+
 def copy_config(internal = False):
     """
     Copies the default config file to XDG_CONFIG_HOME/wm/wm.rc. If the file
@@ -63,56 +82,291 @@ def copy_config(internal = False):
         logging.debug('Default configuration copied to %s.', config_file)
 
 
-def read_config(filename = None):
+def get_config_file(filename = None):
     """
-    Reads the config file at filename (or at the default location if filename
-    is ``None``).
+    Gets the path of the config file to read, which is ``filename`` if given.
+    Otherwise it is the file in the config directory, where the default config
+    file is copied if there is none yet.
     """
-    global IGNORED_BUNDLES
-    global LAYOUT
-    global MIN_SIZES
-    global HOTKEYS
-
     if filename is None:
         filename = os.path.join(get_config_dir(), __config_file__)
         if not os.path.exists(filename):
             copy_config(internal = True)
 
+    return filename
+
+
+def _bool(value):
+    if value.lower() not in RawConfigParser._boolean_states:
+        raise ValueError('expected a boolean, e.g. True or False')
+    return RawConfigParser._boolean_states[value.lower()]
+
+
+def _seconds(value):
+    seconds = float(value)
+    if seconds < 0:
+        raise ValueError('expected a number of seconds')
+    return seconds
+
+
+def _bundles(value):
+    bundles = ast.literal_eval(value)
+    if not isinstance(bundles, (list, tuple, set)) or not all(isinstance(b, basestring) for b in bundles):
+        raise ValueError('expected a list of bundle identifiers')
+    return frozenset(bundles)
+
+
+def _size(value):
+    size = ast.literal_eval(value)
+    if (not isinstance(size, tuple) or len(size) != 2 or
+            not all(isinstance(n, (int, long, float)) and n >= 0 for n in size)):
+        raise ValueError('expected a (width, height) tuple')
+    return (float(size[0]), float(size[1]))
+
+
+def _rule(name, value):
+    return rules.Rule(name, ast.literal_eval(value))
+
+
+# The options of the [General] section: option -> (setting, parser)
+_GENERAL_OPTIONS = OrderedDict([
+    ('ignored_bundles', ('IGNORED_BUNDLES', _bundles)),
+    ('cache_ttl', ('CACHE_TTL', _seconds)),
+    ('reflow_delay', ('REFLOW_DELAY', _seconds)),
+    ('enumeration_timeout', ('ENUMERATION_TIMEOUT', _seconds)),
+    ('messaging_timeout', ('MESSAGING_TIMEOUT', _seconds)),
+    ('metrics', ('METRICS', _bool)),
+    ('metrics_interval', ('METRICS_INTERVAL', _seconds)),
+    ('reload_interval', ('RELOAD_INTERVAL', _seconds)),
+])
+_DEFAULTS = dict((name, globals()[name]) for name, _ in _GENERAL_OPTIONS.values())
+
+# The sections a config file may have, besides any number of [Mode <name>]
+_SECTIONS = ['General', 'HotKeys', 'Layout', 'Minimum Sizes', 'Rules']
+
+# Bump this whenever the compiled form changes, so that old caches are ignored
+COMPILED_VERSION = 4
+
+# Files modified this many seconds ago or less are not cached, since some file
+# systems only record modification times to the second
+RACY_INTERVAL = 2.0
+
+
+def compile_config(filename):
+    """
+    Parses and validates a config file into its compiled form, a dict of:
+
+    * ``general``: the settings of the [General] section, with defaults for
+      the options that are not given.
+    * ``min_sizes``: a dict of bundle -> (width, height).
+    * ``hotkeys``: a :py:class:`hotkeys.KeyMap` of action names, along with
+      ``hotkeys_source``, the sections it was compiled from.
+    * ``layout``: a tuple of the layout's class name and parameters.
+    * ``rules``: a :py:class:`rules.RuleSet` of the [Rules] section, after the
+      ``ignored_bundles`` of the [General] section.
+
+    :raises errors.ConfigError: If anything in the file is invalid.
+    """
     config = RawConfigParser()
-    config.read(filename)
+    try:
+        if not config.read(filename):
+            raise errors.ConfigError('Bad config file. Cannot read %s.' % filename)
+    except ConfigParserError as e:
+        raise errors.ConfigError('Bad config file. %s' % e)
 
-    IGNORED_BUNDLES = ast.literal_eval(config.get('General', 'ignored_bundles'))
+    for section in config.sections():
+        if section not in _SECTIONS and not section.startswith('Mode '):
+            raise errors.ConfigError('Bad config file. Unknown section [%s].' % section)
 
-    for name, value in config.items('Minimum Sizes'):
-        MIN_SIZES[name] = ast.literal_eval(value)
+    general = dict(_DEFAULTS)
+    if config.has_section('General'):
+        for option, value in config.items('General'):
+            if option not in _GENERAL_OPTIONS:
+                raise errors.ConfigError('Bad config file. Unknown option \'%s\' in [General].' % option)
+            name, parse = _GENERAL_OPTIONS[option]
+            try:
+                general[name] = parse(value)
+            except (ValueError, SyntaxError) as e:
+                raise errors.ConfigError('Bad config file. Option \'%s\' in [General]: %s.' % (option, e))
 
-    # Load arbitrary hotkeys (mod + [, mod...] + keycode)
-    for name, value in config.items('HotKeys'):
-        entries = value.split(' ')
-        length = len(entries)
-        if length < 2:
-            raise Exception('Bad config file. Hotkeys must have >= 2 entries, ex. \'alt shift 16\'.')
+    min_sizes = dict()
+    if config.has_section('Minimum Sizes'):
+        for bundle, value in config.items('Minimum Sizes'):
+            try:
+                min_sizes[bundle] = _size(value)
+            except (ValueError, SyntaxError) as e:
+                raise errors.ConfigError('Bad config file. Minimum size of \'%s\': %s.' % (bundle, e))
 
-        hotkey = [0, int(entries[length - 1])]  # [mod_mask, keycode]
-        for i in entries[:length - 2]:
-            hotkey[0] |= int(__mod_masks__[i])
+    window_rules = []
+    if config.has_section('Rules'):
+        for name, value in config.items('Rules'):
+            try:
+                window_rules.append(_rule(name, value))
+            except (ValueError, SyntaxError) as e:
+                raise errors.ConfigError('Bad config file. Rule \'%s\': %s.' % (name, e))
 
-        HOTKEYS[name] = hotkey
-        logging.debug('Hotkey registered for \'%s\': %d, %d', name, hotkey[0], hotkey[1])
+    # Compile hotkeys (mod + [, mod...] + keycode [, ...]) into a keymap
+    sections = sorted(s for s in config.sections() if s == 'HotKeys' or s.startswith('Mode '))
+    hotkeys_source = tuple((section, tuple(sorted(config.items(section)))) for section in sections)
+    keymap = hotkeys.compile_keymap(config) if config.has_section('HotKeys') else hotkeys.KeyMap()
+
+    # Get the layout class and the rest of the items for its constructor
+    if not config.has_option('Layout', 'class'):
+        raise errors.ConfigError('Bad config file. Layout section must have a class.')
 
-    # Load layout class and use the rest of the items in the constructor
     classname = None
-    layout_dict = dict()
+    params = dict()
     for name, value in config.items('Layout'):
         if name == 'class':
             classname = value
         else:
-            layout_dict[name] = ast.literal_eval(value)
+            try:
+                params[name] = ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                raise errors.ConfigError('Bad config file. Layout parameter \'%s\' is not a Python literal.' % name)
+
+    load_layout(classname, params)  # Fail now rather than when it is applied
+
+    return {
+        'general': general,
+        'min_sizes': min_sizes,
+        'hotkeys': keymap,
+        'hotkeys_source': hotkeys_source,
+        'layout': (classname, params),
+        'rules': rules.RuleSet(window_rules, general['IGNORED_BUNDLES']),
+    }
+
+
+def get_cache_file(filename):
+    """
+    Gets the path of the file that caches the compiled form of a config file,
+    in the user's cache directory and named after the config file's path.
+    """
+    digest = hashlib.sha1(os.path.abspath(filename)).hexdigest()
+    return os.path.join(get_cache_dir(), 'config-%s.cache' % digest)
+
+
+def _is_private(f):
+    # Unpickling can run code, so only trust files no one else could have written
+    info = os.fstat(f.fileno())
+    return info.st_uid == os.getuid() and not info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def load_config(filename):
+    """
+    Gets the compiled form of a config file, which is cached in the user's
+    cache directory and only compiled again once the file's modification time
+    or size changes.
+    """
+    info = os.stat(filename)
+    key = (COMPILED_VERSION, info.st_mtime, info.st_size)
+    cache_file = get_cache_file(filename)
+    try:
+        with open(cache_file, 'rb') as f:
+            if _is_private(f):
+                cached_key, compiled = cPickle.load(f)
+                if cached_key == key:
+                    return compiled
+            else:
+                logging.warning('Ignoring %s, since others could have written it.', cache_file)
+    except Exception:
+        pass  # Missing, stale or unreadable, so compile it again
+
+    compiled = compile_config(filename)
+    if time.time() - info.st_mtime < RACY_INTERVAL:
+        return compiled  # Another edit could still go unnoticed with the same mtime
+
+    temp_file = None
+    try:
+        cache_dir = os.path.dirname(cache_file)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0700)
+        fd, temp_file = tempfile.mkstemp(prefix = '.config-', dir = cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            cPickle.dump((key, compiled), f, cPickle.HIGHEST_PROTOCOL)
+        os.rename(temp_file, cache_file)
+    except (IOError, OSError) as e:
+        logging.debug('Could not cache the compiled config in %s: %s', cache_file, e)
+        if temp_file is not None and os.path.exists(temp_file):
+            os.remove(temp_file)
+
+    return compiled
+
+
+# What each compiled setting was last built from
+_sources = dict()
+
+
+def stage_config(filename = None):
+    """
+    Reads and builds the settings of the config file at filename (or at the
+    default location if filename is ``None``), without applying them, so that
+    the caller can finish its own preparations before anything changes. Pass
+    the result to :py:func:`apply_config`.
+
+    Settings whose part of the file is unchanged keep their current values, so
+    that e.g. the layout instance survives a reload that only changed hotkeys.
+
+    :rvalue: A tuple of a dict of the settings that changed -> their new
+             values, and of what the compiled settings were built from.
+    :raises errors.ConfigError: If the file is invalid.
+    """
+    compiled = load_config(get_config_file(filename))
+
+    values = dict(compiled['general'])
+    values['MIN_SIZES'] = compiled['min_sizes']
+    values['RULES'] = compiled['rules']
+    values = dict((name, value) for name, value in values.items() if value != globals()[name])
+    if compiled['hotkeys_source'] != _sources.get('HOTKEYS'):
+        values['HOTKEYS'] = compiled['hotkeys']
+    if compiled['layout'] != _sources.get('LAYOUT'):
+        values['LAYOUT'] = load_layout(*compiled['layout'])
 
-    if classname is None:
-        raise Exception('Bad config file. Layout section must have a class.')
+    return values, {'HOTKEYS': compiled['hotkeys_source'], 'LAYOUT': compiled['layout']}
+
+
+def apply_config(staged):
+    """
+    Applies settings read by :py:func:`stage_config`, which cannot fail.
+
+    :rvalue: The set of the names of the settings that changed.
+    """
+    values, sources = staged
+    _sources.update(sources)
+    globals().update(values)
+    return set(values)
+
+
+def read_config(filename = None):
+    """
+    Reads the config file at filename (or at the default location if filename
+    is ``None``) and applies it. Nothing is changed if the file has an error.
+
+    :rvalue: The set of the names of the settings that changed.
+    :raises errors.ConfigError: If the file is invalid.
+    """
+    return apply_config(stage_config(filename))
+
+
+def load_layout(classname, params):
+    """
+    Creates a layout from its class name (e.g. ``layout.PanelLayout``, or just
+    ``PanelLayout`` for the built-in layouts) and constructor parameters.
+
+    :raises errors.ConfigError: If there is no such class, or it does not take
+                                these parameters (e.g. one is missing).
+    """
+    if '.' not in classname:
+        classname = 'layout.' + classname
 
     name = classname.rsplit('.', 1)
-    layout_module = __import__(name[0], globals(), locals(), [], -1)
-    layout_class = getattr(layout_module, name[1])
-    LAYOUT = layout_class(**layout_dict)
+    try:
+        layout_module = __import__(name[0], globals(), locals(), [], -1)
+        layout_class = getattr(layout_module, name[1])
+    except (ImportError, AttributeError):
+        raise errors.ConfigError('Bad config file. There is no layout class named \'%s\'.' % classname)
+
+    try:
+        return layout_class(**params)
+    except (TypeError, ValueError, RuntimeError) as e:
+        raise errors.ConfigError('Bad config file. Bad parameters for layout %s: %s.' % (classname, str(e).rstrip('.')))
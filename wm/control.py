@@ -0,0 +1,288 @@
+__doc__ = '''wm.control
+
+This module provides the control channel of the window manager: a server that
+answers commands on a Unix domain socket, and a client for it. Requests and
+responses are single lines of JSON, for example::
+
+    {"command": "reflow", "args": {}}
+    {"ok": true, "result": null}
+
+The module only depends on the standard library, so that the client can be
+used without loading PyObjC.
+'''
+
+import os
+import json
+import stat
+import time
+import errno
+import socket
+import logging
+import tempfile
+
+
+def get_socket_file():
+    """
+    Gets the path of the control socket. It is kept in a directory that only
+    the current user can enter, under ``$TMPDIR`` (which macOS already makes
+    per-user) and named after the user's ID where it is not.
+    """
+    return os.path.join(tempfile.gettempdir(), 'wm-%d' % os.getuid(), 'wm.sock')
+
+SOCKET_FILE = get_socket_file()
+
+# The number of seconds either side waits on the other before giving up.
+TIMEOUT = 2.0
+
+# The number of seconds the server blocks sending a response to a client that
+# does not read it, since it answers on the window manager's thread.
+SEND_TIMEOUT = 0.1
+
+# The largest request or response, in bytes, that will be read.
+MAX_MESSAGE = 1 << 20
+
+
+class ControlError(Exception):
+    """
+    Raised by the client when the window manager cannot be reached, or when it
+    reports that a command failed.
+    """
+
+
+def _read_line(conn):
+    data = ''
+    while not data.endswith('\n'):
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+        if len(data) > MAX_MESSAGE:
+            raise ValueError('Message is too long.')
+
+    return data
+
+
+class ControlServer(object):
+    """
+    Serves commands on a Unix domain socket. Each command is a callable in
+    ``commands``, which is called with the request's arguments as keyword
+    arguments and returns a JSON-serializable result.
+
+    The server never blocks waiting for connections or requests: the owner
+    watches :py:meth:`fileno` (e.g. from its run loop) and calls
+    :py:meth:`serve_pending` when it becomes readable, so that commands run on
+    the owner's thread. Requests that have not fully arrived yet are read as
+    more of them arrives, with ``watch(fileno, callback)``, which must call
+    ``callback()`` whenever the file descriptor is readable and return a
+    function that stops watching it. Clients that take longer than
+    :py:data:`TIMEOUT` to send their request are disconnected by
+    :py:meth:`expire`, which the owner should also call every so often.
+
+    The ``shutdown`` command is handled by the server itself. After replying,
+    it calls ``on_shutdown`` and keeps the connection open, so that the client
+    sees it close only once the process has exited.
+    """
+    def __init__(self, commands, watch, on_shutdown = None, path = SOCKET_FILE):
+        self.commands = commands
+        self.path = path
+        self._watch = watch
+        self._on_shutdown = on_shutdown
+        self._socket = None
+        self._lingering = []
+        self._pending = dict()  # connection -> [data, deadline, unwatch]
+
+    def listen(self):
+        """
+        Binds the socket, replacing a stale socket file left by a previous
+        instance. The directory holding it is created if needed, and must only
+        be accessible by the current user.
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            os.mkdir(directory, 0700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        info = os.lstat(directory)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0077:
+            raise Exception('%s must be a directory that only the current user can access.' % directory)
+
+        if os.path.exists(self.path):
+            if is_listening(self.path):
+                raise Exception('Another window manager is already listening on %s.' % self.path)
+            os.remove(self.path)
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0177)  # So that nobody else can connect, even briefly
+        try:
+            sock.bind(self.path)
+        finally:
+            os.umask(umask)
+        sock.listen(16)
+        sock.setblocking(False)
+        self._socket = sock
+        logging.info('Listening for commands on %s.', self.path)
+
+    def fileno(self):
+        return self._socket.fileno()
+
+    def serve_pending(self):
+        """
+        Accepts every connection that is waiting, and answers those whose
+        request has already arrived.
+        """
+        self.expire()
+        while True:
+            try:
+                conn, _ = self._socket.accept()
+            except socket.error as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    return
+                raise
+
+            conn.setblocking(False)
+            self._pending[conn] = ['', time.time() + TIMEOUT, None]
+            self._receive(conn)
+            if conn in self._pending:
+                self._pending[conn][2] = self._watch(conn.fileno(), lambda conn = conn: self._receive(conn))
+
+    def expire(self):
+        """
+        Disconnects the clients that have not sent their request in time.
+        """
+        now = time.time()
+        for conn, (data, deadline, unwatch) in self._pending.items():
+            if now > deadline:
+                logging.warning('Control connection failed: no request after %.1fs.', TIMEOUT)
+                self._drop(conn)
+                conn.close()
+
+    def _drop(self, conn):
+        unwatch = self._pending.pop(conn)[2]
+        if unwatch is not None:
+            unwatch()
+
+    def _receive(self, conn):
+        # Reads whatever has arrived, and answers once the request is complete
+        entry = self._pending.get(conn)
+        if entry is None:
+            return
+
+        try:
+            while not entry[0].endswith('\n'):
+                try:
+                    chunk = conn.recv(65536)
+                except socket.error as e:
+                    if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                        return  # The rest is still on its way
+                    raise
+                if not chunk:
+                    break
+                entry[0] += chunk
+                if len(entry[0]) > MAX_MESSAGE:
+                    raise ValueError('Message is too long.')
+
+            self._drop(conn)
+            if not entry[0]:
+                conn.close()  # Closed without asking for anything
+                return
+
+            conn.setblocking(True)
+            conn.settimeout(SEND_TIMEOUT)
+            self._handle(conn, entry[0])
+        except Exception as e:
+            logging.warning('Control connection failed: %s', e)
+            if conn in self._pending:
+                self._drop(conn)
+            conn.close()
+
+    def _handle(self, conn, data):
+        request = json.loads(data)
+        command = request.get('command')
+        args = request.get('args') or {}
+        logging.debug('Control command <%s> with %s.', command, args)
+
+        if command == 'shutdown':
+            conn.sendall(json.dumps({'ok': True, 'result': None}) + '\n')
+            self._lingering.append(conn)
+            if self._on_shutdown is not None:
+                self._on_shutdown()
+            return
+
+        handler = self.commands.get(command)
+        if handler is None:
+            response = {'ok': False, 'error': 'Unknown command: %s.' % command}
+        else:
+            try:
+                response = {'ok': True, 'result': handler(**dict((str(k), v) for k, v in args.items()))}
+            except Exception as e:
+                logging.warning('Control command <%s> failed: %s', command, e)
+                response = {'ok': False, 'error': str(e)}
+
+        conn.sendall(json.dumps(response) + '\n')
+        conn.close()
+
+    def close(self):
+        """
+        Stops listening and removes the socket file. Connections waiting on a
+        shutdown are left for the process's exit to close.
+        """
+        for conn in self._pending.keys():
+            self._drop(conn)
+            conn.close()
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def request(command, path = SOCKET_FILE, timeout = TIMEOUT, **args):
+    """
+    Sends a command to the window manager and returns its result.
+
+    For ``shutdown``, this also waits (up to ``timeout`` seconds) until the
+    window manager's process has exited.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        try:
+            sock.connect(path)
+        except socket.error as e:
+            raise ControlError('The window manager is not running (%s).' % e)
+
+        try:
+            sock.sendall(json.dumps({'command': command, 'args': args}) + '\n')
+            line = _read_line(sock)
+            if not line:
+                raise ControlError('The window manager closed the connection.')
+            response = json.loads(line)
+
+            if command == 'shutdown':
+                # The connection is closed when the process exits
+                while sock.recv(4096):
+                    pass
+        except (socket.error, ValueError) as e:
+            raise ControlError('Could not talk to the window manager: %s' % e)
+    finally:
+        sock.close()
+
+    if not response.get('ok'):
+        raise ControlError(response.get('error'))
+
+    return response.get('result')
+
+
+def is_listening(path = SOCKET_FILE):
+    """
+    Checks whether a server is accepting connections on the given socket.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except socket.error:
+        return False
+    finally:
+        sock.close()
@@ -149,11 +149,14 @@ class Daemon(object):
         try:
             i = 0
             while 1:
-                os.kill(pid, signal.SIGTERM)
+                # Kill the daemon if it hasn't exited after five seconds. (Not
+                # with SIGHUP, which makes the window manager reload.)
+                if i < 50:
+                    os.kill(pid, signal.SIGTERM)
+                else:
+                    os.kill(pid, signal.SIGKILL)
                 time.sleep(0.1)
                 i = i + 1
-                if i % 10 == 0:
-                    os.kill(pid, signal.SIGHUP)
         except OSError, err:
             err = str(err)
             if err.find("No such process") > 0:
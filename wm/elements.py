@@ -5,92 +5,484 @@ exposed by the ``accessibility`` library, as well as some functions for
 retrieving and creating 'accessible' applications.
 '''
 
+import time
 import logging
+import threading
 import accessibility as acbl
+from collections import OrderedDict, deque
 from AppKit import NSWorkspace
 
+import health
+import log
+import metrics
+import trace
+
+
+# The number of seconds a cached attribute value is trusted, as a fallback for
+# applications that do not send the notifications we watch.
+ATTRIBUTE_TTL = 2.0
+
+# Moves and resizes reported within this many seconds of the window manager
+# writing a position or size may be echoes of that write, so the value written
+# is kept until then, and read again afterwards to check it.
+ECHO_GRACE = 0.5
+
+# The notifications watched for each application, and the window attributes
+# whose cached values each of them invalidates.
+WATCHED_NOTIFICATIONS = {
+    'AXWindowCreated': (),
+    'AXUIElementDestroyed': None,  # i.e. everything
+    'AXMoved': ('AXPosition',),
+    'AXResized': ('AXPosition', 'AXSize'),
+    'AXWindowMiniaturized': ('AXMinimized',),
+    'AXWindowDeminiaturized': ('AXMinimized',),
+    'AXTitleChanged': ('AXTitle',),
+}
+
+# The window attributes that are read together for a WindowSnapshot.
+SNAPSHOT_ATTRIBUTES = ('AXPosition', 'AXSize', 'AXMinimized', 'AXTitle')
+
+_DEFAULT = object()
+_MISSING = object()
+
+# Windows found to no longer exist while they were being moved, for the window
+# manager to forget (see drain_evicted).
+_evicted = deque()
+
+
+def _ignore(*args, **kwargs):
+    pass
+
+
+def _ax(bundle, op, func, *args):
+    # Every Accessibility request goes through here so that it can be measured,
+    # and so that applications that stop answering can be left alone
+    start = time.time()
+    result = error = None
+    try:
+        result = func(*args)
+        return result
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        elapsed = time.time() - start
+        if metrics.ENABLED:
+            metrics.record_ax(bundle, op, elapsed, error is not None)
+        if trace.ENABLED:
+            trace.record_ax(bundle, op, func, args, elapsed, result, error)
+        # Missing attributes and stale elements are answers too
+        health.record(bundle, elapsed, error is not None and not isinstance(error, (KeyError, ValueError)))
+
+
+class AttributeCache(object):
+    """
+    Caches the attribute values of a single accessible element. Values are
+    dropped when a notification indicates that they have changed, and expire
+    after :py:data:`ATTRIBUTE_TTL` seconds otherwise.
+
+    Values written by the window manager are remembered apart from the values
+    read, and trusted until a notification may have contradicted them (see
+    :py:meth:`trusted`).
+
+    Attributes that the element does not possess are cached as ``None``.
+    """
+    def __init__(self, element, bundle = None):
+        self._element = element
+        self._bundle = bundle
+        self._entries = dict()  # name -> (value, timestamp)
+        self._written = dict()  # name -> (value, timestamp) of the last write not contradicted since
+        self._recheck = dict()  # name -> time after which the value must be read again
+
+    def get(self, attribute, ttl = _DEFAULT):
+        """
+        Gets the value of an attribute, only asking the element for it if there
+        is no fresh cached value. A ``ttl`` of ``None`` never expires.
+        """
+        value = self.peek(attribute, ttl)
+        if value is _MISSING:
+            try:
+                value = _ax(self._bundle, 'read', self._element.__getitem__, attribute)
+            except KeyError:
+                value = None
+            self._entries[attribute] = (value, time.time())
+            self._recheck.pop(attribute, None)
+            if attribute in self._written and self._written[attribute][0] != value:
+                del self._written[attribute]
+
+        return value
+
+    def get_many(self, *attributes):
+        """
+        Gets the values of several attributes like :py:meth:`get`. The
+        Accessibility API has no batched read, so each attribute without a
+        fresh cached value costs a request of its own.
+        """
+        return tuple(self.get(attribute) for attribute in attributes)
+
+    def peek(self, attribute, ttl = _DEFAULT):
+        """
+        Gets the cached value of an attribute without asking the element, or a
+        sentinel if there is no fresh cached value. A ``ttl`` of ``None`` gets
+        the last known value, however old, even if it is due to be checked.
+        """
+        entry = self._entries.get(attribute)
+        if entry is None:
+            return _MISSING
+
+        if ttl is _DEFAULT:
+            ttl = ATTRIBUTE_TTL
+        if ttl is not None:
+            now = time.time()
+            if now - entry[1] >= ttl or now >= self._recheck.get(attribute, float('inf')):
+                return _MISSING
+
+        return entry[0]
+
+    def trusted(self, attribute):
+        """
+        Gets the value an attribute can be taken to have, to decide whether it
+        needs writing: a value the window manager wrote is trusted for as long
+        as no notification may have contradicted it, and any other value while
+        it is fresh. A written value that may have been contradicted is read
+        again once :py:data:`ECHO_GRACE` is over.
+
+        :rvalue: The value, or a sentinel if it is not known.
+        """
+        deadline = self._recheck.get(attribute)
+        if deadline is not None:
+            return self._entries[attribute][0] if time.time() < deadline else self.get(attribute)
+        if attribute in self._written:
+            return self._written[attribute][0]
+
+        return self.peek(attribute)
+
+    def store(self, attribute, value, written = False):
+        """
+        Records a value that is known to be current, e.g. one just written,
+        in which case ``written`` should be ``True``.
+        """
+        now = time.time()
+        self._entries[attribute] = (value, now)
+        self._recheck.pop(attribute, None)
+        if written:
+            self._written[attribute] = (value, now)
+        else:
+            self._written.pop(attribute, None)
+
+    def invalidate(self, *attributes):
+        """
+        Drops the cached values of the given attributes, or of all of them if
+        none are given.
+        """
+        if not attributes:
+            self._entries.clear()
+            self._written.clear()
+            self._recheck.clear()
+        else:
+            for attribute in attributes:
+                self._entries.pop(attribute, None)
+                self._written.pop(attribute, None)
+                self._recheck.pop(attribute, None)
+
+    def changed(self, *attributes):
+        """
+        Handles a notification that the given attributes may have changed.
+        Values the window manager wrote less than :py:data:`ECHO_GRACE` seconds
+        ago are kept until then, since the notification is likely an echo of
+        the write, and are read again afterwards; all other values are dropped.
+        """
+        now = time.time()
+        for attribute in attributes:
+            written = self._written.get(attribute)
+            if written is not None and now - written[1] < ECHO_GRACE:
+                self._recheck[attribute] = written[1] + ECHO_GRACE
+            else:
+                self.invalidate(attribute)
+
 
 class AccessibleApplication(object):
     """
     Defines an application available to the Accessibility API.
+
+    :param float timeout: If given, the number of seconds the application has
+                          to answer each request about it or its windows.
     """
-    def __init__(self, element, bundle):
+    def __init__(self, element, bundle, timeout = None):
         self._element = element
         self._bundle = bundle
-        self._title = None
+        self.timeout = timeout
+        self._cache = AttributeCache(element, bundle)
         self._windows = []
+        self._callback = None
 
-        # Gets the windows
-        if 'AXWindows' in self._element:
-            for ref in self._element['AXWindows']:
-                self._windows.append(AccessibleWindow(ref, self))
+        # Gets the windows, along with what the window manager needs next
+        windows, _, _ = self._cache.get_many('AXWindows', 'AXHidden', 'AXTitle')
+        for ref in windows or []:
+            self._windows.append(AccessibleWindow(ref, self))
 
     @property
     def bundle(self):
         return self._bundle
 
     @property
-    def title(self):
-        if self._title is None:  # Cache the title, since it won't change
-            if 'AXTitle' in self._element:
-                self._title = self._element['AXTitle']
+    def pid(self):
+        return self._element.pid
+
+    @property
+    def windows(self):
+        return list(self._windows)
+
+    def snapshots(self):
+        """
+        Gets a :py:class:`WindowSnapshot` of each of the application's windows.
+        """
+        return [window.snapshot() for window in self._windows]
+
+    def refresh_windows(self):
+        """
+        Re-reads the application's list of windows and reconciles it with the
+        windows that are already known, so that existing windows keep their
+        cached state.
+
+        :rvalue: A tuple of the (added, removed) AccessibleWindows.
+        """
+        self._cache.invalidate('AXWindows')
+        known = list(self._windows)
+        windows = []
+        added = []
+        for ref in self._cache.get('AXWindows') or []:
+            for window in known:
+                if window._element == ref:
+                    known.remove(window)
+                    break
             else:
-                logging.debug('No title found for bundle %s.', self._bundle)
+                window = AccessibleWindow(ref, self)
+                added.append(window)
+            windows.append(window)
+
+        self._windows = windows
+        return added, known
+
+    @property
+    def title(self):
+        title = self._cache.get('AXTitle', ttl = None)  # The title won't change
+        if title is None:
+            logging.debug('No title found for bundle %s.', self._bundle)
 
-        return self._title
+        return title
 
     @property
     def hidden(self):
-        if 'AXHidden' in self._element:
-            return self._element['AXHidden']
-        else:
-            return None
+        return self._cache.get('AXHidden')
 
     @hidden.setter
     def hidden(self, value):
         if 'AXHidden' in self._element and self._element.can_set('AXHidden'):
-            self._element['AXHidden'] = value
+            _ax(self._bundle, 'write', self._element.__setitem__, 'AXHidden', value)
+            self._cache.store('AXHidden', value)
         else:
             logging.debug('Could not set application with bundle %s as (un)hidden.', self._bundle)
 
+    def focused_window(self):
+        """
+        Gets the window of the application that has the keyboard focus, with a
+        single request, or ``None`` if it is not one of the known windows.
+        """
+        try:
+            ref = _ax(self._bundle, 'read', self._element.__getitem__, 'AXFocusedWindow')
+        except Exception as e:
+            logging.debug('Cannot get the focused window of %s: %s', self._bundle, e)
+            return None
+
+        for window in self._windows:
+            if window._element == ref:
+                return window
+
+        return None
+
+    def watch(self, callback):
+        """
+        Watches the notifications in :py:data:`WATCHED_NOTIFICATIONS` for this
+        application. When one arrives, the cached attributes it affects are
+        invalidated before ``callback(notification, app)`` is called.
+
+        Watching an application again only replaces the callback, since the
+        notifications cannot be unregistered.
+        """
+        watching = self._callback is not None
+        self._callback = callback
+        if watching:
+            return
+
+        def _notify(notification, element):
+            callback = self._callback
+            if callback is not None:
+                self.invalidate(notification)
+                callback(notification, self)
+
+        self._element.set_callback(_notify)
+        for notification in WATCHED_NOTIFICATIONS:
+            try:
+                self._element.watch(notification)
+            except Exception as e:
+                logging.debug('Cannot watch <%s> for bundle %s: %s', notification, self._bundle, e.args[0])
+
+    def unwatch(self):
+        """
+        Stops handling the application's notifications and forgets its windows,
+        e.g. once it has terminated. Since the notifications cannot be
+        unregistered, the callback is replaced by one that ignores them, which
+        no longer refers to this application.
+        """
+        if self._callback is not None:
+            self._callback = None
+            self._element.set_callback(_ignore)
+        self._windows = []
+        self._cache.invalidate()
+
+    def evict(self, window):
+        """
+        Forgets a window that no longer exists, without asking the application
+        for its windows again.
+        """
+        if window in self._windows:
+            self._windows.remove(window)
+        self._cache.invalidate('AXWindows')
+
+    def invalidate(self, notification):
+        """
+        Invalidates the cached window attributes affected by a notification.
+        Since notifications are delivered for the application as a whole, this
+        applies to all of its windows.
+
+        Moves and resizes that closely follow a write by the window manager
+        may be caused by it, so the frame that was just written is kept until
+        it can be read again (see :py:meth:`AttributeCache.changed`).
+        """
+        attributes = WATCHED_NOTIFICATIONS.get(notification, ())
+        if attributes is None:
+            self._cache.invalidate('AXWindows')
+            for window in self._windows:
+                window.invalidate()
+        elif notification in ('AXMoved', 'AXResized'):
+            for window in self._windows:
+                window._cache.changed(*attributes)
+        elif attributes:
+            for window in self._windows:
+                window.invalidate(*attributes)
+
 
 class AccessibleWindow(object):
     """
     Defines a window available to the Accessibility API.
+
+    Each window caches its attribute values (including the last frame that was
+    applied to it), as well as which of its attributes can be modified, so that
+    repeated reflows only send the writes that actually change something.
     """
     def __init__(self, element, parent):
+        # Messaging timeouts are set per element, so windows don't inherit them
+        if parent.timeout is not None:
+            element.set_timeout(parent.timeout)
         self._element = element
         self._parent = parent
+        self._cache = AttributeCache(element, parent.bundle)
+        self._settable = dict()
+        self.rule = None  # The rule that applies to the window; see rules.RuleSet
+
+    def can_set(self, attribute):
+        """
+        Checks whether the attribute of a given name exists and is modifiable.
+        The result is cached, since it does not change for a given window.
+        """
+        if attribute not in self._settable:
+            bundle = self._parent.bundle
+            # A value that has been read already tells whether the attribute exists
+            value = self._cache.peek(attribute, ttl = None)
+            if value is _MISSING:
+                exists = _ax(bundle, 'read', self._element.__contains__, attribute)
+            else:
+                exists = value is not None
+            self._settable[attribute] = exists and _ax(bundle, 'read', self._element.can_set, attribute)
+
+        return self._settable[attribute]
+
+    def snapshot(self):
+        """
+        Gets the state of the window that the window manager needs, only
+        reading the attributes that are not cached.
+
+        :rvalue: A :py:class:`WindowSnapshot`.
+        """
+        position, size, minimized, title = self._cache.get_many(*SNAPSHOT_ATTRIBUTES)
+        return WindowSnapshot(self, position, size, minimized, title, self.resizable)
+
+    def read(self, *attributes):
+        """
+        Gets the values of several attributes (``None`` for missing ones),
+        only reading those that are not cached.
+
+        :rvalue: A tuple of the values, in the order of the attributes.
+        """
+        return self._cache.get_many(*attributes)
+
+    def is_alive(self):
+        """
+        Checks, with a single request, whether the window still exists. A window
+        whose application does not answer is assumed to.
+        """
+        try:
+            return _ax(self._parent.bundle, 'read', self._element.is_alive)
+        except ValueError:
+            return False  # The element is no longer valid
+        except Exception:
+            return True
+
+    def focus(self):
+        """
+        Gives the window the keyboard focus: it becomes the main window of its
+        application, which is brought to the front.
+        """
+        bundle = self._parent.bundle
+        _ax(bundle, 'write', self._element.__setitem__, 'AXMain', True)
+        _ax(bundle, 'write', self._parent._element.__setitem__, 'AXFrontmost', True)
+
+    def invalidate(self, *attributes):
+        """
+        Forgets the cached values of the given attributes (or of all of them),
+        for instance when the window has been moved or resized by someone other
+        than the window manager.
+        """
+        self._cache.invalidate(*attributes)
+
+    @property
+    def title(self):
+        return self._cache.get('AXTitle')
 
     @property
     def position(self):
-        if 'AXPosition' in self._element:
-            return self._element['AXPosition']
-        else:
-            logging.debug('No AXPosition property found for window in app %s.', self._parent.title)
-            return None
+        position = self._cache.get('AXPosition')
+        if position is None:
+            logging.debug('No AXPosition property found for window in app %s.', log.lazy(lambda: self._parent.title))
+
+        return position
 
     @position.setter
     def position(self, value):
-        if 'AXPosition' in self._element and self._element.can_set('AXPosition'):
-            self._element['AXPosition'] = value
-        else:
-            logging.debug('Could not set AXPosition property found for window in app %s.', self._parent.title)
+        self._write('AXPosition', (value[0], value[1]))
 
     @property
     def size(self):
-        if 'AXSize' in self._element:
-            return self._element['AXSize']
-        else:
-            logging.debug('No AXSize property found for window in app %s.', self._parent.title)
-            return None
+        size = self._cache.get('AXSize')
+        if size is None:
+            logging.debug('No AXSize property found for window in app %s.', log.lazy(lambda: self._parent.title))
+
+        return size
 
     @size.setter
     def size(self, value):
-        if 'AXSize' in self._element and self._element.can_set('AXSize'):
-            self._element['AXSize'] = value
-        else:
-            logging.debug('Could not set AXSize property found for window in app %s.', self._parent.title)
+        self._write('AXSize', (value[0], value[1]))
 
     @property
     def frame(self):
@@ -104,91 +496,347 @@ class AccessibleWindow(object):
 
     @frame.setter
     def frame(self, value):
-        self.position = value[0], value[1]
-        self.size = value[2], value[3]
+        self.commit(value)
+
+    @property
+    def cached_title(self):
+        """
+        The last known title of the window, however old, without asking the
+        application for it; ``None`` if it is not known.
+        """
+        title = self._cache.peek('AXTitle', ttl = None)
+        return None if title is _MISSING else title
+
+    @property
+    def cached_frame(self):
+        """
+        The last known frame of the window, however old, without asking the
+        application for it; ``None`` if it is not known.
+        """
+        position = self._cache.peek('AXPosition', ttl = None)
+        size = self._cache.peek('AXSize', ttl = None)
+        if position is _MISSING or size is _MISSING or position is None or size is None:
+            return None
+
+        return (position[0], position[1], size[0], size[1])
+
+    def commit(self, frame):
+        """
+        Applies a frame (left, top, width, height) to the window, writing only
+        the position and/or size that differ from the last known frame.
+
+        :param frame: The desired frame of the window.
+        :rvalue: The number of attributes that were actually written.
+        """
+        writes = self._write('AXPosition', (frame[0], frame[1]))
+        writes += self._write('AXSize', (frame[2], frame[3]))
+        return writes
+
+    def _write(self, attribute, value):
+        if self._cache.trusted(attribute) == value:
+            return 0
+
+        if self.can_set(attribute):
+            _ax(self._parent.bundle, 'write', self._element.__setitem__, attribute, value)
+            self._cache.store(attribute, value, written = True)
+            return 1
+        else:
+            logging.debug('Could not set %s property found for window in app %s.', attribute, log.lazy(lambda: self._parent.title))
+            return 0
 
     @property
     def resizable(self):
-        return self._element.can_set('AXSize') and self._element.can_set('AXPosition')
+        return self.can_set('AXSize') and self.can_set('AXPosition')
 
     @property
     def minimized(self):
-        if 'AXMinimized' in self._element:
-            return self._element['AXMinimized']
-        else:
-            logging.debug('No AXMinimized property found for window in app %s.', self._parent.title)
+        minimized = self._cache.get('AXMinimized')
+        if minimized is None:
+            logging.debug('No AXMinimized property found for window in app %s.', log.lazy(lambda: self._parent.title))
+
+        return minimized
+
+
+class WindowSnapshot(object):
+    """
+    An immutable view of the state of an :py:class:`AccessibleWindow`, as read
+    by :py:meth:`AccessibleWindow.snapshot`. Attributes that the window does not
+    possess are ``None``.
+    """
+    __slots__ = ('window', 'position', 'size', 'minimized', 'title', 'resizable')
+
+    def __init__(self, window, position, size, minimized, title, resizable):
+        for name, value in zip(self.__slots__, (window, position, size, minimized, title, resizable)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Window snapshots cannot be modified.')
+
+    @property
+    def bundle(self):
+        return self.window._parent.bundle
+
+    @property
+    def frame(self):
+        # (left, top, width, height)
+        if self.position is None or self.size is None:
             return None
 
+        return (self.position[0], self.position[1], self.size[0], self.size[1])
 
-def new_application(pid, bundle):
+
+def commit_frames(frames, cancelled = None):
+    """
+    Applies a sequence of (window, frame) pairs, skipping any redundant writes.
+
+    Windows are written application by application, in order. The
+    ``accessibility`` binding holds the GIL for the whole of each request, so
+    writing from several threads would not overlap them; instead, each request
+    is bounded by the application's messaging timeout, and the windows of
+    applications that are not responding (see :py:mod:`health`) are left where
+    they are.
+
+    Windows whose writes fail because they no longer exist are evicted from
+    their application, and handed to the window manager by
+    :py:func:`drain_evicted`.
+
+    :param cancelled: If given, it is checked before each window, and the
+                      remaining windows are skipped once it returns ``True``.
+    :rvalue: The total number of attributes that were actually written.
+    """
+    groups = OrderedDict()
+    for window, frame in frames:
+        groups.setdefault(window._parent.pid, []).append((window, frame))
+
+    return sum(_commit_group(group, cancelled) for group in groups.values())
+
+
+def _commit_group(frames, cancelled):
+    # Applies the frames of a single application's windows, in order
+    writes = 0
+    try:
+        for window, frame in frames:
+            if (cancelled is not None and cancelled()) or health.is_open(window._parent.bundle):
+                break
+
+            try:
+                writes += window.commit(frame)
+            except Exception:
+                if health.is_open(window._parent.bundle) or window.is_alive():
+                    raise
+                window._parent.evict(window)
+                _evicted.append(window)
+                logging.debug('Evicted a window of %s that no longer exists.', window._parent.bundle)
+                continue
+            logging.debug('New window frame: %f, %f, %f, %f', *frame)
+    except Exception as e:
+        logging.warning('Could not move the windows of %s: %s', frames[0][0]._parent.bundle, e)
+
+    return writes
+
+
+def drain_evicted():
+    """
+    Gets (and forgets) the windows evicted by :py:func:`commit_frames` since
+    the last call.
+    """
+    windows = []
+    while _evicted:
+        windows.append(_evicted.popleft())
+
+    return windows
+
+
+def new_application(pid, bundle, timeout = None):
     """
     Create an AccessibleApplication manually using its PID and bundle
     identifier.
+
+    :param float timeout: If given, the number of seconds the application has
+                          to answer each Accessibility request.
     """
     app = None
-    ref = acbl.create_application_ref(pid)
     try:
-        if ref['AXRole'] == u'AXApplication':
-            app = AccessibleApplication(ref, bundle)
+        ref = acbl.create_application_ref(pid)
+        if timeout is not None:
+            ref.set_timeout(timeout)
+
+        role = _ax(bundle, 'read', ref.__getitem__, 'AXRole')
+        if role == u'AXApplication':
+            app = AccessibleApplication(ref, bundle, timeout)
             logging.debug('Bundle <%s> is an accessible application.', bundle)
         else:
-            logging.debug('Bundle <%s> is not an accessible application, role is %s.', bundle, ref['AXRole'])
+            logging.debug('Bundle <%s> is not an accessible application, role is %s.', bundle, role)
     except acbl.APIDisabledError:
         logging.debug('Bundle <%s> is not available to the Accessibility API.', bundle)
     except Exception as e:
-        logging.debug('Bundle <%s> role request failed with exception: %s.', bundle, e.args[0])
+        logging.debug('Bundle <%s> role request failed with exception: %s.', bundle, e.args[0] if e.args else e)
 
     return app
 
 
-def get_accessible_applications(ignored_bundles = []):
+def new_application_async(pid, bundle, callback, timeout = None):
+    """
+    Like :py:func:`new_application`, but creates the application on a worker
+    thread and then calls ``callback(app)`` from that thread. The callback is
+    not called if the application is not accessible.
+    """
+    def _load():
+        app = new_application(pid, bundle, timeout)
+        if app is not None:
+            callback(app)
+
+    _get_pool('workers', WORKERS).apply_async(_load)
+
+
+def probe(app):
     """
-    Get a list of all available AccessibleApplications.
+    Asks an application that has stopped responding for its role, on a
+    background thread, so that its health is updated once it answers. The
+    binding holds the GIL while it waits, so the request is made through an
+    element of its own that only waits :py:data:`health.PROBE_TIMEOUT`.
+
+    :rvalue: The ``AsyncResult`` of the probe.
+    """
+    def _probe():
+        ref = acbl.create_application_ref(app.pid)
+        ref.set_timeout(health.PROBE_TIMEOUT)
+        return _ax(app.bundle, 'probe', ref.__getitem__, 'AXRole')
+
+    return _get_pool('probes', PROBERS).apply_async(_probe)
+
+
+# The number of threads used to load applications in the background. Their
+# requests do not overlap, since the accessibility binding holds the GIL.
+WORKERS = 8
+
+# The number of threads used to probe applications that are not responding.
+PROBERS = 2
+
+_pools = dict()
 
-    :param [str, ...] ignored_bundles: Bundles that should not be included.
+
+def _get_pool(name, size):
+    # Create each pool on first use, since most imports never need it
+    pool = _pools.get(name)
+    if pool is None:
+        from multiprocessing.pool import ThreadPool
+        pool = _pools[name] = ThreadPool(size)
+
+    return pool
+
+
+class _Enumeration(object):
+    """
+    Collects the applications created by the worker pool during a call to
+    :py:func:`get_accessible_applications`. Applications that arrive after the
+    caller has stopped waiting are handed to the ``on_ready`` callback instead.
+    """
+    def __init__(self, on_ready):
+        self.loaded = dict()  # pid -> AccessibleApplication or None
+        self._abandoned = set()
+        self._on_ready = on_ready
+        self._cond = threading.Condition()
+
+    def load(self, pid, bundle, timeout):
+        app = new_application(pid, bundle, timeout)
+        with self._cond:
+            if pid not in self._abandoned:
+                self.loaded[pid] = app
+                self._cond.notify()
+                return
+
+        logging.debug('Pending bundle <%s> is now %s.', bundle, 'accessible' if app else 'unavailable')
+        if app is not None and self._on_ready is not None:
+            self._on_ready(app)
+
+    def wait(self, pids, timeout):
+        """
+        Waits until all of the given PIDs have loaded, or until the timeout
+        expires. Returns the PIDs that have not loaded yet.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while len(self.loaded) < len(pids):
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+            pending = [pid for pid in pids if pid not in self.loaded]
+            self._abandoned.update(pending)
+
+        return pending
+
+
+def get_accessible_applications(ignore = None, timeout = None, on_ready = None, messaging_timeout = None):
+    """
+    Get a list of all available AccessibleApplications. Applications are
+    loaded on a pool of worker threads, and those that have not loaded once
+    ``timeout`` has passed are left to finish in the background.
+
+    The accessibility binding holds the GIL for the whole of each request, so
+    requests are made one at a time whichever thread makes them, and the wait
+    can overrun ``timeout`` by up to one request. It is ``messaging_timeout``
+    that bounds how long a single application can hold up startup.
+
+    :param ignore: Called as ``ignore(bundle)`` to tell whether the applications
+                   of a bundle should not be included.
+    :param float timeout: The number of seconds to wait for all applications,
+                          after which any stragglers are reported as pending.
+    :param on_ready: Called as ``on_ready(app)`` from a worker thread once a
+                     pending application has been created.
+    :param float messaging_timeout: The number of seconds each application has
+                                    to answer each Accessibility request.
     """
     running_apps = []
     _ignored = []
     _unavailable = []
     _accessibile = []
+    _pending = []
 
     # Get all running apps
     logging.debug('Getting running applications from the sharedWorkspace.')
     workspace = NSWorkspace.sharedWorkspace()
+    enumeration = _Enumeration(on_ready)
+    bundles = dict()
+    pids = []  # Keep the workspace's order
     for application in workspace.runningApplications():
+        bundle = application.bundleIdentifier()
 
         # Skip weird stuff
-        if not application.bundleIdentifier():
+        if not bundle:
             continue
         # Apps we should ignore
-        if application.bundleIdentifier() in ignored_bundles:
-            _ignored.append(application.bundleIdentifier())
+        if ignore is not None and ignore(bundle):
+            _ignored.append(bundle)
             continue
 
-        # Create AXUIElementRef
-        try:
-            ref = acbl.create_application_ref(application.processIdentifier())
-        except ValueError as e:
-            # This should only happpen when the element does not respond to AXRole -- which means we don't want it anyway
-            logging.debug('Application with bundle <%s> and PID %d is being uncooperative.', application.bundleIdentifier(), application.processIdentifier())
-            continue
-
-        try:
-            if ref['AXRole'] == u'AXApplication':
-                running_apps.append(AccessibleApplication(ref, application.bundleIdentifier()))
-                _accessibile.append(application.bundleIdentifier())
-            else:
-                _unavailable.append(application.bundleIdentifier())
-        # Deal with errors
-        except acbl.APIDisabledError:
-            _unavailable.append(application.bundleIdentifier())
-        except ValueError:
-            _unavailable.append(application.bundleIdentifier())
-        except Exception as e:
-            logging.debug('Bundle <%s> role request failed with exception: %s', application.bundleIdentifier(), e.args[0])
-            _unavailable.append(application.bundleIdentifier())
+        pid = application.processIdentifier()
+        bundles[pid] = bundle
+        pids.append(pid)
+
+    pool = _get_pool('workers', WORKERS)
+    for pid in pids:
+        pool.apply_async(enumeration.load, (pid, bundles[pid], messaging_timeout))
+
+    pending = enumeration.wait(pids, timeout)
+    for pid in pids:
+        app = enumeration.loaded.get(pid)
+        if pid in pending:
+            _pending.append(bundles[pid])
+        elif app is not None:
+            running_apps.append(app)
+            _accessibile.append(bundles[pid])
+        else:
+            _unavailable.append(bundles[pid])
 
     logging.debug('Current accessible application bundles: <%s>.', '>, <'.join(_accessibile))
     logging.debug('Currently ignored bundles: <%s>.', '>, <'.join(_ignored))
     logging.debug('Unavailable bundles: <%s>.', '>, <'.join(_unavailable))
+    if _pending:
+        logging.info('Still waiting on bundles: <%s>.', '>, <'.join(_pending))
     return running_apps
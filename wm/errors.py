@@ -0,0 +1,11 @@
+__doc__ = '''wm.errors
+
+This module provides the exceptions raised by wm.
+'''
+
+
+class ConfigError(Exception):
+    """
+    Raised when the config file is malformed, or refers to something (e.g. a
+    layout class or an action) that does not exist.
+    """
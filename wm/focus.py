@@ -0,0 +1,190 @@
+__doc__ = '''wm.focus
+
+This module provides keyboard navigation between the managed windows. The
+:py:class:`FocusRing` keeps the windows of every screen in layout order, along
+with the frames they were last given, so that moving the focus to the next
+window, or to the nearest window in a direction, never has to ask applications
+where their windows are.
+
+Directional lookups go through a :py:class:`FrameIndex`, which keeps the frames
+sorted on each axis. A lookup walks outwards from the focused window and stops
+as soon as no window further away could be closer than the best one found.
+'''
+
+from bisect import bisect_left, bisect_right
+
+
+LEFT, RIGHT, UP, DOWN = 'left', 'right', 'up', 'down'
+
+# The axis (0 for x, 1 for y) and sense of each direction
+_DIRECTIONS = {
+    LEFT: (0, -1),
+    RIGHT: (0, 1),
+    UP: (1, -1),
+    DOWN: (1, 1),
+}
+
+# How much more a step sideways counts than a step in the requested direction
+_SIDEWAYS_WEIGHT = 2.0
+
+
+def _center(frame):
+    return (frame[0] + frame[2] / 2.0, frame[1] + frame[3] / 2.0)
+
+
+class FrameIndex(object):
+    """
+    An index of (window, frame) pairs for finding the nearest window in a
+    direction. Building it sorts the frames once per axis; a lookup is a
+    bisection followed by a walk over the windows that could still be nearer.
+
+    :param entries: A sequence of (window, frame) tuples, in layout order, which
+                    also breaks ties.
+    """
+    def __init__(self, entries):
+        self._entries = [(window, tuple(frame), _center(frame), i) for i, (window, frame) in enumerate(entries)]
+        self._sorted = []
+        self._keys = []
+        for axis in (0, 1):
+            ordered = sorted(self._entries, key = lambda entry: entry[2][axis])
+            self._sorted.append(ordered)
+            self._keys.append([entry[2][axis] for entry in ordered])
+
+    def __len__(self):
+        return len(self._entries)
+
+    def nearest(self, frame, direction, exclude = None):
+        """
+        Finds the window whose center is nearest to that of a frame in one of
+        :py:data:`LEFT`, :py:data:`RIGHT`, :py:data:`UP` or :py:data:`DOWN`.
+        Windows whose centers are out of line with it count as further away.
+
+        :param exclude: A window that is never returned, i.e. the focused one.
+        :rvalue: The window, or ``None`` if there is none in that direction.
+        """
+        axis, sense = _DIRECTIONS[direction]
+        origin = _center(frame)
+        ordered, keys = self._sorted[axis], self._keys[axis]
+        if sense > 0:
+            candidates = (ordered[i] for i in xrange(bisect_right(keys, origin[axis]), len(ordered)))
+        else:
+            candidates = (ordered[i] for i in xrange(bisect_left(keys, origin[axis]) - 1, -1, -1))
+
+        best, best_score = None, None
+        for window, _, center, order in candidates:
+            distance = abs(center[axis] - origin[axis])
+            if best_score is not None and distance > best_score[0]:
+                break  # Everything further along is further away
+            if window is exclude:
+                continue
+
+            score = (distance + _SIDEWAYS_WEIGHT * abs(center[1 - axis] - origin[1 - axis]), order)
+            if best_score is None or score < best_score:
+                best, best_score = window, score
+
+        return best
+
+
+class FocusRing(object):
+    """
+    The managed windows of every screen in layout order (screen by screen), and
+    the frames they were last given, as updated after each reflow. The ring
+    also remembers the window it last focused.
+    """
+    def __init__(self):
+        self.current = None
+        self._screens = dict()  # screen -> tuple of (window, frame)
+        self._ring = None  # Tuple of windows, built on demand
+        self._positions = None  # id(window) -> index in the ring
+        self._frames = None  # id(window) -> frame
+        self._index = None  # FrameIndex, built on demand
+
+    def __len__(self):
+        return len(self._get_ring())
+
+    def __contains__(self, window):
+        self._get_ring()
+        return id(window) in self._positions
+
+    def update(self, screen, frames):
+        """
+        Replaces the windows of a screen with the (window, frame) pairs of the
+        layout that has just been applied to it.
+        """
+        frames = tuple((window, tuple(frame)) for window, frame in frames if frame is not None)
+        if self._screens.get(screen) == frames:
+            return
+
+        self._screens[screen] = frames
+        self._ring = self._positions = self._index = None
+
+    def discard(self, windows):
+        """
+        Forgets windows that are no longer managed, until the next update.
+        """
+        gone = set(id(window) for window in windows)
+        for screen, frames in self._screens.items():
+            if any(id(window) in gone for window, frame in frames):
+                self._screens[screen] = tuple(entry for entry in frames if id(entry[0]) not in gone)
+                self._ring = self._positions = self._index = None
+        if self.current is not None and id(self.current) in gone:
+            self.current = None
+
+    def clear(self):
+        self._screens.clear()
+        self._ring = self._positions = self._index = None
+        self.current = None
+
+    def _get_ring(self):
+        if self._ring is None:
+            self._ring = tuple(window for screen in sorted(self._screens) for window, frame in self._screens[screen])
+            self._positions = dict((id(window), i) for i, window in enumerate(self._ring))
+            self._frames = dict((id(window), frame) for frames in self._screens.values() for window, frame in frames)
+
+        return self._ring
+
+    def _get_index(self):
+        if self._index is None:
+            self._index = FrameIndex([entry for screen in sorted(self._screens) for entry in self._screens[screen]])
+
+        return self._index
+
+    def frame_of(self, window):
+        """
+        Gets the frame a window was last given by the layout, or ``None``.
+        """
+        self._get_ring()
+        return self._frames.get(id(window))
+
+    def step(self, window, offset):
+        """
+        Gets the window ``offset`` places after (or before, if negative) the
+        given one, wrapping around. A window that is not in the ring is taken
+        to be just before the first one.
+
+        :rvalue: A window, or ``None`` if the ring is empty.
+        """
+        ring = self._get_ring()
+        if not ring:
+            return None
+
+        position = self._positions.get(id(window))
+        if position is None:
+            return ring[0] if offset > 0 else ring[-1]
+
+        return ring[(position + offset) % len(ring)]
+
+    def nearest(self, window, direction):
+        """
+        Gets the nearest window in a direction from the given one, from the
+        frames the layout gave them. A window that is not in the ring has no
+        neighbours, so the first window is returned instead.
+
+        :rvalue: A window, or ``None``.
+        """
+        ring = self._get_ring()
+        position = None if window is None else self._positions.get(id(window))
+        if position is None:
+            return ring[0] if ring else None
+
+        return self._get_index().nearest(self._frames[id(window)], direction, exclude = window)
@@ -0,0 +1,198 @@
+__doc__ = '''wm.health
+
+This module keeps track of how well each application answers Accessibility
+requests, so that a single hung application cannot freeze the window manager.
+
+Every request is recorded with :py:func:`record`. When an application takes
+longer than :py:data:`LATENCY_BUDGET` to answer, or fails too many of its recent
+requests, its breaker opens: the window manager then leaves its windows where
+they are until a background probe sees it answer again. Probes are spaced out
+exponentially while the application stays unresponsive.
+
+Like :py:mod:`metrics`, this module only depends on the standard library.
+'''
+
+import time
+import logging
+import threading
+from collections import deque
+
+
+# A single request that takes this many seconds or longer opens the breaker.
+# Requests time out after config.MESSAGING_TIMEOUT, which is the same by default.
+LATENCY_BUDGET = 1.0
+
+# The breaker also opens once at least this fraction of the application's last
+# WINDOW requests (and at least MIN_CALLS of them) have failed.
+ERROR_RATE = 0.5
+WINDOW = 10
+MIN_CALLS = 4
+
+# The number of seconds before an open breaker is first probed, which doubles
+# after each probe that fails, up to MAX_PROBE_INTERVAL.
+PROBE_INTERVAL = 5.0
+MAX_PROBE_INTERVAL = 60.0
+
+# The number of seconds a probe waits for an answer. The accessibility binding
+# holds the GIL while it waits, so everything else waits as long.
+PROBE_TIMEOUT = 0.25
+
+# The number of seconds between checks for breakers that are due a probe.
+CHECK_INTERVAL = 1.0
+
+# The maximum number of application bundles that are tracked.
+MAX_BUNDLES = 256
+
+
+class Breaker(object):
+    """
+    The health of a single application: the outcomes of its last
+    :py:data:`WINDOW` requests, and whether its breaker is open.
+    """
+    def __init__(self):
+        self.outcomes = deque(maxlen = WINDOW)  # True for each failed request
+        self.open = False
+        self.reason = None
+        self.opened = None
+        self.trips = 0
+        self.interval = PROBE_INTERVAL
+        self.next_probe = None
+
+    def record(self, seconds, failed, now):
+        """
+        Records the outcome of a request, and returns ``True`` if it opened or
+        closed the breaker.
+        """
+        failed = failed or seconds >= LATENCY_BUDGET
+        if self.open:
+            if failed:
+                return False
+            self.open = False
+            self.outcomes.clear()
+            return True
+
+        self.outcomes.append(failed)
+        if seconds >= LATENCY_BUDGET:
+            self._trip('took %.1fs to answer' % seconds, now)
+            return True
+
+        failures = sum(self.outcomes)
+        if len(self.outcomes) >= MIN_CALLS and failures >= ERROR_RATE * len(self.outcomes):
+            self._trip('failed %d of its last %d requests' % (failures, len(self.outcomes)), now)
+            return True
+
+        return False
+
+    def _trip(self, reason, now):
+        self.open = True
+        self.reason = reason
+        self.opened = now
+        self.trips += 1
+        self.interval = PROBE_INTERVAL
+        self.next_probe = now + self.interval
+
+
+_lock = threading.Lock()
+_breakers = dict()  # bundle -> Breaker
+_open = set()  # Bundles whose breaker is open
+_changed = set()  # Bundles whose breaker opened or closed since the last drain_changed()
+
+
+def record(bundle, seconds, failed = False):
+    """
+    Records an Accessibility request made to an application, which took the
+    given number of seconds and may have failed to get an answer.
+    """
+    now = time.time()
+    with _lock:
+        breaker = _breakers.get(bundle)
+        if breaker is None:
+            if len(_breakers) >= MAX_BUNDLES:
+                return  # Keep memory bounded
+            breaker = _breakers[bundle] = Breaker()
+
+        if not breaker.record(seconds, failed, now):
+            return
+
+        _changed.add(bundle)
+        if breaker.open:
+            _open.add(bundle)
+        else:
+            _open.discard(bundle)
+
+    if breaker.open:
+        logging.warning('%s is not responding (it %s); leaving its windows alone.', bundle, breaker.reason)
+    else:
+        logging.info('%s is responding again after %.1fs.', bundle, now - breaker.opened)
+
+
+def is_open(bundle):
+    """
+    Checks whether the breaker of an application is open, i.e. whether its
+    windows should be left alone.
+    """
+    return bundle in _open
+
+
+def any_open():
+    return bool(_open)
+
+
+def due_probes():
+    """
+    Gets the bundles whose breaker is open and due a probe, and schedules their
+    next probe (further away each time).
+    """
+    now = time.time()
+    due = []
+    with _lock:
+        for bundle in _open:
+            breaker = _breakers[bundle]
+            if breaker.next_probe <= now:
+                due.append(bundle)
+                breaker.next_probe = now + breaker.interval
+                breaker.interval = min(breaker.interval * 2, MAX_PROBE_INTERVAL)
+
+    return due
+
+
+def drain_changed():
+    """
+    Gets (and forgets) the bundles whose breaker has opened or closed since the
+    last call.
+    """
+    with _lock:
+        changed = set(_changed)
+        _changed.clear()
+
+    return changed
+
+
+def forget(bundle):
+    """
+    Stops tracking an application, e.g. once it has terminated.
+    """
+    with _lock:
+        _breakers.pop(bundle, None)
+        _open.discard(bundle)
+        _changed.discard(bundle)
+
+
+def snapshot():
+    """
+    Gets the breakers that are open, or have ever opened, as a JSON-serializable
+    dict.
+    """
+    with _lock:
+        return dict((bundle, {'open': b.open, 'reason': b.reason, 'opened': b.opened, 'trips': b.trips,
+            'next_probe': b.next_probe if b.open else None}) for bundle, b in _breakers.items() if b.trips)
+
+
+def reset():
+    """
+    Closes and forgets every breaker.
+    """
+    with _lock:
+        _breakers.clear()
+        _open.clear()
+        _changed.clear()
@@ -0,0 +1,216 @@
+__doc__ = '''wm.hotkeys
+
+This module compiles the hotkeys in the config file into a keymap: a trie keyed
+on (keycode, modifier mask) pairs, whose leaves are the names of window manager
+methods. Once bound to a window manager, a keymap is used by a
+:py:class:`KeyDispatcher` to handle each keydown with a single dict lookup.
+
+Hotkeys are written as a modifier list followed by a keycode, and several of
+them may be separated by commas to form a chord::
+
+    [HotKeys]
+    reflow = ctrl alt 15
+    focus_left = ctrl alt 40, 4
+
+A hotkey named ``mode.<name>`` enters the modal keymap defined in the section
+``[Mode <name>]``, whatever the case of the name. Its bindings stay active until
+a key that is not bound in it (or is bound to ``exit``) is pressed::
+
+    [Mode focus]
+    focus_left = 4
+    focus_right = 37
+    exit = 53
+
+Hotkeys may only be bound to the :py:data:`ACTIONS`, which is checked when the
+config file is compiled.
+
+macOS sets the ``fn`` flag on every arrow, Home, End, Page Up/Down, Forward
+Delete and function key event (see :py:data:`FN_KEYS`), whether or not the
+key is pressed, so ``fn`` is ignored for those keys: ``ctrl alt 123`` matches
+ctrl-alt-left arrow, and is the same hotkey as ``fn ctrl alt 123``.
+'''
+
+import logging
+
+import errors
+
+
+# The window manager methods that hotkeys may be bound to
+ACTIONS = frozenset(['reflow', 'update', 'focus_next', 'focus_prev', 'focus_left', 'focus_right', 'focus_up',
+    'focus_down'])
+
+MODIFIER_MASKS = {
+    'shift': 131072,
+    'ctrl': 262144,
+    'alt': 524288,
+    'cmd': 1048576,
+    'fn': 8388608,
+}
+
+# The modifier flags that hotkeys are matched against; all others (caps lock,
+# device-dependent bits, etc.) are ignored.
+ALL_MODIFIERS = reduce(lambda a, b: a | b, MODIFIER_MASKS.values())
+
+# The keycodes of the keys whose events always have the fn flag set: the
+# arrows, Help, Home, End, Page Up/Down, Forward Delete and F1-F20
+FN_KEYS = frozenset([123, 124, 125, 126, 114, 115, 119, 116, 121, 117,
+    122, 120, 99, 118, 96, 97, 98, 100, 101, 109, 103, 111, 105, 107, 113, 106, 64, 79, 80, 90])
+
+# The modifier flags matched for each keycode, if not ALL_MODIFIERS
+_MODIFIERS = dict((keycode, ALL_MODIFIERS & ~MODIFIER_MASKS['fn']) for keycode in FN_KEYS)
+
+
+def parse_keystroke(text):
+    """
+    Parses a single keystroke such as ``'ctrl alt 15'`` into a (keycode,
+    modifier mask) tuple.
+    """
+    entries = text.split()
+    if not entries:
+        raise errors.ConfigError('Bad config file. Empty keystroke in hotkey.')
+
+    mask = 0
+    for name in entries[:-1]:
+        try:
+            mask |= MODIFIER_MASKS[name]
+        except KeyError:
+            raise errors.ConfigError('Bad config file. Unknown modifier \'%s\' in hotkey \'%s\'.' % (name, text))
+
+    try:
+        keycode = int(entries[-1])
+    except ValueError:
+        raise errors.ConfigError('Bad config file. Hotkeys must end with a keycode, ex. \'alt shift 16\'.')
+
+    return (keycode, mask & _MODIFIERS.get(keycode, ALL_MODIFIERS))
+
+
+def parse_hotkey(value):
+    """
+    Parses a hotkey, i.e. a comma-separated sequence of keystrokes.
+    """
+    return tuple(parse_keystroke(text) for text in value.split(','))
+
+
+class KeyMap(object):
+    """
+    A node in a trie of keystrokes. Each binding maps a (keycode, modifier
+    mask) tuple either to an action or to another keymap.
+
+    :param bool sticky: Whether the keymap stays active after one of its
+                        actions has been performed, i.e. whether it is modal.
+    """
+    def __init__(self, sticky = False):
+        self.sticky = sticky
+        self.bindings = dict()
+
+    def add(self, sequence, action):
+        """
+        Binds a sequence of keystrokes to an action (or to a keymap).
+        """
+        node = self
+        for keystroke in sequence[:-1]:
+            child = node.bindings.get(keystroke)
+            if child is None:
+                child = node.bindings[keystroke] = KeyMap()
+            elif not isinstance(child, KeyMap) or child.sticky:
+                raise errors.ConfigError('Bad config file. Another hotkey is a prefix of hotkey %r.' % (sequence,))
+            node = child
+
+        existing = node.bindings.get(sequence[-1])
+        if isinstance(existing, KeyMap) and not existing.sticky:
+            raise errors.ConfigError('Bad config file. Hotkey %r is a prefix of another hotkey.' % (sequence,))
+        elif sequence[-1] in node.bindings:
+            raise errors.ConfigError('Bad config file. Hotkey %r is bound more than once.' % (sequence,))
+        node.bindings[sequence[-1]] = action
+
+    def bind(self, target, _seen = None):
+        """
+        Creates a copy of this keymap in which action names are replaced by the
+        bound methods of the same name on ``target``.
+        """
+        seen = _seen if _seen is not None else dict()
+        if id(self) in seen:  # Modes may refer to each other
+            return seen[id(self)]
+
+        bound = seen[id(self)] = KeyMap(self.sticky)
+        for keystroke, action in self.bindings.items():
+            if isinstance(action, KeyMap):
+                bound.bindings[keystroke] = action.bind(target, seen)
+            elif action == 'exit':
+                bound.bindings[keystroke] = None
+            else:
+                try:
+                    bound.bindings[keystroke] = getattr(target, action)
+                except AttributeError:
+                    raise errors.ConfigError('Bad config file. There is no action named \'%s\'.' % action)
+
+        return bound
+
+    def __len__(self):
+        return len(self.bindings)
+
+
+def compile_keymap(config):
+    """
+    Compiles the ``[HotKeys]`` and ``[Mode ...]`` sections of a parsed config
+    file into a :py:class:`KeyMap` of action names.
+    """
+    root = KeyMap()
+    modes = dict()  # Lowercase name -> (section, keymap), since option names are lowercased
+    for section in config.sections():
+        if section.startswith('Mode '):
+            name = section[5:].strip().lower()
+            if name in modes:
+                raise errors.ConfigError('Bad config file. Mode \'%s\' is defined more than once.' % name)
+            modes[name] = (section, KeyMap(sticky = True))
+
+    sections = [('HotKeys', root)] + modes.values()
+    for section, keymap in sections:
+        for name, value in config.items(section):
+            sequence = parse_hotkey(value)
+            if name.startswith('mode.'):
+                try:
+                    keymap.add(sequence, modes[name[5:].lower()][1])
+                except KeyError:
+                    raise errors.ConfigError('Bad config file. There is no section for mode \'%s\'.' % name[5:])
+            elif name == 'exit' or name in ACTIONS:
+                keymap.add(sequence, name)
+            else:
+                raise errors.ConfigError('Bad config file. There is no action named \'%s\'.' % name)
+            logging.debug('Hotkey registered for \'%s\': %r', name, sequence)
+
+    return root
+
+
+class KeyDispatcher(object):
+    """
+    Dispatches keydown events against a bound :py:class:`KeyMap`, keeping track
+    of partially-typed chords and of the active mode.
+    """
+    def __init__(self, keymap):
+        self.root = keymap
+        self.node = keymap
+
+    def dispatch(self, keycode, flags):
+        """
+        Handles a keydown event, returning ``True`` if it matched a binding.
+        """
+        node = self.node
+        action = node.bindings.get((keycode, flags & _MODIFIERS.get(keycode, ALL_MODIFIERS)), False)
+
+        if action is False:
+            if node is not self.root:  # Leave the chord or mode and start over
+                self.node = self.root
+                return self.dispatch(keycode, flags)
+            return False
+        elif action is None:  # 'exit'
+            self.node = self.root
+        elif isinstance(action, KeyMap):
+            self.node = action
+        else:
+            if not node.sticky:
+                self.node = self.root
+            action()
+            logging.debug('Called method \'%s\' in response to hotkey.', action.__name__)
+
+        return True
@@ -1,8 +1,31 @@
 import logging
-from AppKit import NSScreen
+
+import config
+import tiling
+import utils
+
+
+# Frames computed by every layout, keyed on all of the inputs they depend on.
+_frame_cache = utils.LRUCache(256)
+
+
+def _freeze(value):
+    # Make layout parameters usable as part of a cache key
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    elif isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
 
 
 class Layout(object):
+    """
+    The base class for all layouts. A layout is split into a pure geometry part,
+    :py:meth:`compute`, which maps a screen rect and a number of windows to a
+    list of frames, and the application of those frames to actual windows in
+    :py:meth:`reflow`. Layout parameters should not be changed after the layout
+    has been created, since computed frames are memoized on them.
+    """
 
     __required_fields__ = []
 
@@ -18,20 +41,101 @@ class Layout(object):
             except AttributeError:
                 raise RuntimeError('The required field \'%s\' is missing.' % field)
 
+        self._params = _freeze(kwargs)
+
     def prepare(self, window_manager):
         pass
 
     def prev_window(self, window, window_manager):
-        return None
+        """
+        Gets the window before the given one in layout order, going from screen
+        to screen and wrapping around.
+        """
+        return window_manager.focus_ring.step(window, -1)
 
     def next_window(self, window, window_manager):
-        return None
+        """
+        Gets the window after the given one in layout order, going from screen
+        to screen and wrapping around.
+        """
+        return window_manager.focus_ring.step(window, 1)
+
+    def neighbour(self, window, direction, window_manager):
+        """
+        Gets the nearest window in a direction (one of ``focus.LEFT``,
+        ``focus.RIGHT``, ``focus.UP`` or ``focus.DOWN``) from the given one, as
+        they were placed by the layout.
+        """
+        return window_manager.focus_ring.nearest(window, direction)
 
     def focus_on(self, window):
-        pass
+        window.focus()
+
+    def compute(self, rect, count):
+        """
+        Computes the frames for ``count`` windows on a screen with the given
+        (left, top, width, height) rect. This must not depend on anything other
+        than its arguments and the layout's parameters.
+
+        :rvalue: A list of (left, top, width, height) tuples.
+        """
+        return []
+
+    def frames(self, rect, count):
+        """
+        Gets the frames for ``count`` windows on a screen with the given rect,
+        computing them only if these inputs have not been seen recently.
+
+        :rvalue: A tuple of (left, top, width, height) tuples.
+        """
+        key = (self.__class__, self._params, tuple(rect), count)
+        frames = _frame_cache.get(key)
+        if frames is None:
+            frames = tuple(tuple(frame) for frame in self.compute(tuple(rect), count))
+            _frame_cache[key] = frames
+
+        return frames
+
+    def rect_for(self, screen):
+        """
+        Gets the rect of a :py:class:`screens.Screen` that windows are laid out
+        in: its full frame if the layout ignores the menu (and dock), or else
+        its visible frame.
+        """
+        return screen.frame if getattr(self, 'ignore_menu', False) else screen.visible_frame
+
+    def plan(self, windows, rect):
+        """
+        Pairs each window with the frame it would be given on a screen with the
+        given rect, without touching any of the windows.
+
+        :rvalue: A list of (window, frame) tuples.
+        """
+        return zip(windows, self.frames(rect, len(windows)))
+
+    def reflow(self, window_manager = None, screen = None, space_id = None, cancelled = None):
+        """
+        Applies the layout to the managed windows on a
+        :py:class:`screens.Screen` (the main screen by default) and Space. If
+        ``cancelled`` is given, it is checked before each window and the reflow
+        stops once it returns ``True``, i.e. once the reflow has been
+        superseded.
+
+        :rvalue: The list of (window, frame) tuples that were applied.
+        """
+        import elements  # Only the window manager needs it, so import it late
+
+        if screen is None:
+            screen = window_manager.screens.main
 
-    def reflow(self, window_manager, screen, space_id):
-        pass
+        windows = window_manager.get_managed_windows(screen, space_id)
+        plan = self.plan(windows, self.rect_for(screen))
+        plan = [(window, frame if window.rule is None else window.rule.fit(frame)) for window, frame in plan]
+        elements.commit_frames(plan, cancelled)
+        if cancelled is not None and cancelled():
+            logging.debug('Reflow superseded by a newer one; stopping.')
+
+        return plan
 
 
 class CenterStageLayout(Layout):
@@ -40,7 +144,7 @@ class CenterStageLayout(Layout):
     for a uniform border space around them.
 
     :param int border: The border width, in pixels.
-    :param bool ignore_menu: Whether to ignore the space taken up by the menu.
+    :param bool ignore_menu: Whether to ignore the space taken up by the menu and dock.
 
     For example::
 
@@ -50,18 +154,13 @@ class CenterStageLayout(Layout):
 
     __required_fields__ = ['border', 'ignore_menu']
 
-    def reflow(self, window_manager = None, screen = NSScreen.mainScreen(), space_id = None):
-        menubar_offset = 0 if self.ignore_menu else 22
+    def compute(self, rect, count):
+        left = rect[0] + self.border
+        top = rect[1] + self.border
+        right = rect[0] + rect[2] - self.border
+        bottom = rect[1] + rect[3] - self.border
 
-        windows = window_manager.get_managed_windows(screen, space_id)
-        screen_frame = screen.frame()
-
-        for window in windows:
-            left = screen_frame[0][0] + self.border
-            top = screen_frame[0][1] + self.border + menubar_offset
-            right = screen_frame[1][0] - self.border
-            bottom = screen_frame[1][1] - self.border - menubar_offset
-            window.frame = (left, top, right - left, bottom - top)
+        return [(left, top, right - left, bottom - top)] * count
 
 
 class PanelLayout(Layout):
@@ -71,7 +170,7 @@ class PanelLayout(Layout):
 
     :param int border: The border width, in pixels.
     :param int gutter: The space between panels, in pixels.
-    :param bool ignore_menu: Whether to ignore the space taken up by the menu.
+    :param bool ignore_menu: Whether to ignore the space taken up by the menu and dock.
 
     For example::
 
@@ -81,27 +180,23 @@ class PanelLayout(Layout):
 
     __required_fields__ = ['border', 'gutter', 'ignore_menu']
 
-    def reflow(self, window_manager = None, screen = NSScreen.mainScreen(), space_id = None):
-        menubar_offset = 0 if self.ignore_menu else 22
-
-        windows = window_manager.get_managed_windows(screen, space_id)
-        screen_frame = screen.frame()
-
-        left = screen_frame[0][0] + self.border
-        top = screen_frame[0][1] + self.border + menubar_offset
-        right = screen_frame[1][0] - self.border
-        bottom = screen_frame[1][1] - self.border - menubar_offset
+    def compute(self, rect, count):
+        left = rect[0] + self.border
+        top = rect[1] + self.border
+        right = rect[0] + rect[2] - self.border
+        bottom = rect[1] + rect[3] - self.border
 
-        gutter_left = (screen_frame[1][0] - self.gutter) / 2
+        gutter_left = rect[0] + (rect[2] - self.gutter) / 2
         gutter_right = gutter_left + self.gutter
 
-        count = 0
-        for window in windows:
-            if count % 2 == 0:
-                window.frame = (left, top, gutter_left - left, bottom - top)
+        frames = []
+        for i in range(count):
+            if i % 2 == 0:
+                frames.append((left, top, gutter_left - left, bottom - top))
             else:
-                window.frame = (gutter_right, top, right - gutter_right, bottom - top)
-            count += 1
+                frames.append((gutter_right, top, right - gutter_right, bottom - top))
+
+        return frames
 
 
 class VerticalSplitLayout(Layout):
@@ -112,7 +207,7 @@ class VerticalSplitLayout(Layout):
     :param int border: The border width, in pixels.
     :param int gutter: The space between panels, in pixels.
     :param float ratio: The ratio between master/nonmaster windows.
-    :param bool ignore_menu: Whether to ignore the space taken up by the menu.
+    :param bool ignore_menu: Whether to ignore the space taken up by the menu and dock.
 
     For example::
 
@@ -122,32 +217,157 @@ class VerticalSplitLayout(Layout):
 
     __required_fields__ = ['border', 'gutter', 'ratio', 'ignore_menu']
 
-    def reflow(self, window_manager = None, screen = NSScreen.mainScreen(), space_id = None):
-        menubar_offset = 0 if self.ignore_menu else 22
-
-        windows = window_manager.get_managed_windows(screen, space_id)
-        screen_frame = screen.frame()
+    def compute(self, rect, count):
+        left = rect[0] + self.border
+        top = rect[1] + self.border
+        right = rect[0] + rect[2] - self.border
+        bottom = rect[1] + rect[3] - self.border
 
-        left = screen_frame[0][0] + self.border
-        top = screen_frame[0][1] + self.border + menubar_offset
-        right = screen_frame[1][0] - self.border
-        bottom = screen_frame[1][1] - self.border - menubar_offset
+        if count == 0:
+            return []
+        elif count == 1:  # The master window gets the whole screen
+            return [(left, top, right - left, bottom - top)]
 
-        gutter_left = screen_frame[1][0] * self.ratio - self.gutter / 2
+        gutter_left = rect[0] + rect[2] * self.ratio - self.gutter / 2
         gutter_right = gutter_left + self.gutter
 
-        slave_count = len(windows) - 1
+        slave_count = count - 1
         logging.debug('Number of slave windows: %d.', slave_count)
         slave_height = ((bottom - top) - self.gutter * (slave_count - 1)) / slave_count
         logging.debug('Slave window height is %f.', slave_height)
-        count = 0
+
+        frames = [(left, top, gutter_left - left, bottom - top)]
         offset = 0
-        for window in windows:
-            if count == 0:
-                window.frame = (left, top, gutter_left - left, bottom - top)
-            else:
-                window.position = (gutter_right, top + offset)
-                window.size = (right - gutter_right, slave_height)
-                offset += slave_height + self.gutter
-                logging.debug('New window frame: %f, %f, %f, %f', window.position[0], window.position[1], window.size[0], window.size[1])
-            count += 1
+        for i in range(slave_count):
+            frames.append((gutter_right, top + offset, right - gutter_right, slave_height))
+            offset += slave_height + self.gutter
+
+        return frames
+
+
+class TilingLayout(Layout):
+    """
+    The base class for the layouts that tile the screen with a tree of splits
+    (see :py:mod:`tiling`). No window is made smaller than ``min_size``, or
+    than the minimum size set for its application's bundle in the
+    ``[Minimum Sizes]`` section of the configuration file. When not all of the
+    windows fit, as many as fit are tiled and the others are stacked on top of
+    the last tile. Subclasses choose the tree in :py:meth:`tree`; by default
+    it is the same as :py:class:`BSPLayout`.
+
+    :param int border: The border width, in pixels.
+    :param int gutter: The space between windows, in pixels.
+    :param bool ignore_menu: Whether to ignore the space taken up by the menu and dock.
+    :param tuple min_size: The smallest (width, height) of any window, which is
+                           (200, 150) by default.
+    """
+
+    __required_fields__ = ['border', 'gutter', 'ignore_menu']
+
+    min_size = (200.0, 150.0)
+
+    def tree(self, count, rect):
+        """
+        Builds the tree of splits for ``count`` windows in the given rect.
+        """
+        return tiling.bsp(count, rect)
+
+    def solve(self, rect, minimums):
+        """
+        Computes the frames for windows with the given minimum sizes on a
+        screen with the given rect.
+        """
+        inner = (rect[0] + self.border, rect[1] + self.border, rect[2] - 2 * self.border, rect[3] - 2 * self.border)
+        return tiling.tile(lambda count: self.tree(count, inner), inner, minimums, self.gutter)
+
+    def compute(self, rect, count):
+        return self.solve(rect, (tuple(self.min_size),) * count)
+
+    def minimum_size(self, window):
+        """
+        Gets the smallest size a window may be given.
+        """
+        size = config.MIN_SIZES.get(window._parent.bundle.lower())
+        if size is None:
+            return tuple(self.min_size)
+
+        return (max(size[0], self.min_size[0]), max(size[1], self.min_size[1]))
+
+    def plan(self, windows, rect):
+        minimums = tuple(self.minimum_size(window) for window in windows)
+        key = (self.__class__, self._params, tuple(rect), minimums)
+        frames = _frame_cache.get(key)
+        if frames is None:
+            frames = _frame_cache[key] = tuple(self.solve(tuple(rect), minimums))
+
+        return zip(windows, frames)
+
+
+class BSPLayout(TilingLayout):
+    """
+    A tiling layout that splits the screen in two along its longer side, and
+    each half again, until every window has a tile of its own.
+
+    For example::
+
+        layout = BSPLayout(border = 40, gutter = 20, ignore_menu = False)
+
+    """
+
+    def tree(self, count, rect):
+        return tiling.bsp(count, rect)
+
+
+class GridLayout(TilingLayout):
+    """
+    A tiling layout that arranges windows in a grid of roughly square cells,
+    row by row.
+
+    For example::
+
+        layout = GridLayout(border = 40, gutter = 20, ignore_menu = False)
+
+    """
+
+    def tree(self, count, rect):
+        return tiling.grid(count, rect)
+
+
+class SpiralLayout(TilingLayout):
+    """
+    A tiling layout where each window takes a share of the space left by the
+    windows before it, spiralling clockwise towards the bottom-right.
+
+    :param float ratio: The share each window takes, 0.5 by default.
+
+    For example::
+
+        layout = SpiralLayout(border = 40, gutter = 20, ratio = 0.5, ignore_menu = False)
+
+    """
+
+    ratio = 0.5
+
+    def tree(self, count, rect):
+        return tiling.spiral(count, self.ratio)
+
+
+class MasterStackLayout(TilingLayout):
+    """
+    A tiling layout with a column of 'master' windows on the left, and the
+    other windows stacked in a column on the right.
+
+    :param int masters: The number of master windows, 1 by default.
+    :param float ratio: The share of the width taken by the masters, 0.5 by default.
+
+    For example::
+
+        layout = MasterStackLayout(border = 40, gutter = 20, masters = 1, ratio = 0.6, ignore_menu = False)
+
+    """
+
+    masters = 1
+    ratio = 0.5
+
+    def tree(self, count, rect):
+        return tiling.master_stack(count, self.masters, self.ratio)
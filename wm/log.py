@@ -0,0 +1,169 @@
+__doc__ = '''wm.log
+
+This module sets up logging for wm so that logging never blocks the window
+manager: records are formatted by the thread that logs them, and written to the
+log file (which is rotated) by a background thread.
+
+Arguments that are expensive to compute, such as attributes that have to be
+read from an application, can be wrapped with :py:func:`lazy` so that they are
+only computed when the record is actually logged::
+
+    logging.debug('Moved window of %s.', log.lazy(lambda: window._parent.title))
+'''
+
+import os
+import Queue
+import atexit
+import logging
+import threading
+import logging.handlers
+
+
+LOG_FILE = '/tmp/wm.log'
+
+# The log file is rotated once it reaches this many bytes
+MAX_BYTES = 1 << 20
+BACKUPS = 3
+
+# Records logged while this many are waiting to be written are dropped
+QUEUE_SIZE = 10000
+
+FORMAT = '[%(asctime)s][%(levelname)s] %(message)s'
+
+
+class lazy(object):
+    """
+    Wraps a log argument that is only computed, by calling ``func(*args)``,
+    if the record is actually formatted.
+    """
+    __slots__ = ('func', 'args')
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        value = self.func(*self.args)
+        return value.encode('utf-8') if isinstance(value, unicode) else str(value)
+
+    def __unicode__(self):
+        value = self.func(*self.args)
+        return value if isinstance(value, unicode) else str(value).decode('utf-8', 'replace')
+
+    def __repr__(self):
+        return repr(self.func(*self.args))
+
+    def __float__(self):
+        return float(self.func(*self.args))
+
+    def __int__(self):
+        return int(self.func(*self.args))
+
+
+class QueueHandler(logging.Handler):
+    """
+    Hands records over to a background thread, which passes them on to the
+    given handlers. Records are formatted before they are queued, so that lazy
+    arguments are computed on the thread that logged them.
+
+    The thread is started on first use, and again after a fork (e.g. once the
+    daemon has detached), since threads do not survive forking.
+    """
+    def __init__(self, handlers, size = QUEUE_SIZE):
+        logging.Handler.__init__(self)
+        self.handlers = handlers
+        self.dropped = 0
+        self._queue = Queue.Queue(size)
+        self._thread = None
+        self._pid = None
+
+    def emit(self, record):
+        try:
+            # Keep only what the writing thread needs
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+
+            if self._pid != os.getpid():
+                self._start()
+            self._queue.put_nowait(record)
+        except Queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def _start(self):
+        self._pid = os.getpid()
+        self._queue = Queue.Queue(self._queue.maxsize)
+        self._thread = threading.Thread(target = self._write, name = 'wm-log')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _write(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                self._handle(logging.makeLogRecord({'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': 'Dropped %d log records.' % dropped}))
+            self._handle(record)
+
+    def _handle(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def close(self):
+        """
+        Writes the records that are still queued, and closes the handlers.
+        """
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(1.0)
+        for handler in self.handlers:
+            handler.close()
+        logging.Handler.close(self)
+
+
+_handler = None
+
+
+def configure(loglevel = 'INFO', console = False, filename = LOG_FILE):
+    """
+    Sets up the root logger to write to the (rotated) log file, and optionally
+    to the console, from a background thread. Calling this again only changes
+    the level.
+
+    :param str loglevel: One of DEBUG, INFO, WARNING, etc.
+    """
+    global _handler
+
+    level = getattr(logging, loglevel)
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _handler is not None:
+        return
+
+    handlers = []
+    error = None
+    try:
+        handlers.append(logging.handlers.RotatingFileHandler(filename, maxBytes = MAX_BYTES, backupCount = BACKUPS))
+        handlers[-1].setFormatter(logging.Formatter(FORMAT, datefmt = '%y-%m-%d %H:%M:%S'))
+    except IOError as e:
+        error = e
+        console = True
+
+    if console:
+        handlers.append(logging.StreamHandler())
+        handlers[-1].setFormatter(logging.Formatter(FORMAT, datefmt = '%H:%M:%S'))
+
+    _handler = QueueHandler(handlers)
+    root.addHandler(_handler)
+    atexit.register(_handler.close)
+    if error is not None:
+        logging.warning('Cannot write the log to %s: %s', filename, error)
@@ -0,0 +1,763 @@
+__doc__ = '''wm.manager
+
+This module provides the window manager itself, which is the only part of wm
+that needs PyObjC and the Accessibility API. It should only be imported by code
+that actually talks to the window server.
+'''
+
+import os
+import objc
+import Queue
+import signal
+import socket
+import logging
+from Quartz import *
+
+import config
+import control
+import daemon
+import elements
+import focus
+import health
+import hotkeys
+import log
+import metrics
+import registry
+import rules
+import scheduler
+import screens
+import spaces
+import trace
+import utils
+
+
+def _accessibility_notifications_callback(notification, app):
+    """
+    Provides the callback for all watched notifications exposed through the
+    Accessibility API. By the time it is called, the cached attributes of the
+    :py:class:`elements.AccessibleApplication` have already been invalidated,
+    so this function only needs to translate notifications into calls to the
+    window manager.
+    """
+    trace.record('notification', n = notification, p = app.pid, b = app.bundle)
+    if notification in ['AXWindowCreated', 'AXUIElementDestroyed']:
+        WindowManager()._refresh_windows(app)
+    elif notification in ['AXWindowMiniaturized', 'AXWindowDeminiaturized']:
+        WindowManager()._refresh_minimized(app)
+    elif notification == 'AXMoved':
+        WindowManager()._refresh_placements(app)
+    logging.debug('Notification <%s> for application <%s>.', notification, app.bundle)
+
+
+def _repeat(interval, callback):
+    # Calls callback() every interval seconds from the current run loop
+    timer = CFRunLoopTimerCreate(None, CFAbsoluteTimeGetCurrent() + interval, interval, 0, 0,
+        lambda timer, info: callback(), None)
+    CFRunLoopAddTimer(CFRunLoopGetCurrent(), timer, kCFRunLoopCommonModes)
+    return timer
+
+
+def _watch_socket(fileno, callback):
+    # Calls callback() from the current run loop whenever the socket is readable
+    cfsocket = CFSocketCreateWithNative(None, fileno, kCFSocketReadCallBack,
+        lambda cfsocket, kind, address, data, info: callback(), None)
+    CFSocketSetSocketFlags(cfsocket, kCFSocketAutomaticallyReenableReadCallBack)
+    source = CFSocketCreateRunLoopSource(None, cfsocket, 0)
+    CFRunLoopAddSource(CFRunLoopGetCurrent(), source, kCFRunLoopDefaultMode)
+    return cfsocket
+
+
+def _watch_connection(fileno, callback):
+    # Like _watch_socket, returning a function that stops watching
+    cfsocket = _watch_socket(fileno, callback)
+    return lambda: CFSocketInvalidate(cfsocket)
+
+
+def _mtime(filename):
+    try:
+        return os.path.getmtime(filename)
+    except OSError:
+        return None
+
+
+class _NotificationHelper(NSObject):
+    """
+    Watches several notifications important to the WindowManager. This class
+    makes use of the PyObjc bridge, which may help explain the decorators and
+    the fake __init__ method.
+    """
+    def init(self):
+        self = super(_NotificationHelper, self).init()
+        if self is not None:
+
+            # Start watching notifications
+            nc = NSWorkspace.sharedWorkspace().notificationCenter()
+            nc.addObserver_selector_name_object_(self, self.appLaunched_, 'NSWorkspaceDidLaunchApplicationNotification', None)
+            nc.addObserver_selector_name_object_(self, self.appTerminated_, 'NSWorkspaceDidTerminateApplicationNotification', None)
+            nc.addObserver_selector_name_object_(self, self.appHidden_, 'NSWorkspaceDidHideApplicationNotification', None)
+            nc.addObserver_selector_name_object_(self, self.appUnhidden_, 'NSWorkspaceDidUnhideApplicationNotification', None)
+            nc.addObserver_selector_name_object_(self, self.spaceChanged_, 'NSWorkspaceActiveSpaceDidChangeNotification', None)
+
+            logging.info('A NotificationHelper is now watching notifications in the workspace.')
+
+        return self
+
+    @objc.typedSelector(b'v@:@')
+    def appLaunched_(self, notification):
+        logging.info('New app launched.')
+        bundle = notification.userInfo()['NSApplicationBundleIdentifier']
+        pid = notification.userInfo()['NSApplicationProcessIdentifier']
+        trace.record('workspace', n = 'launched', p = pid, b = bundle)
+        WindowManager()._add_app(pid, bundle)
+
+    @objc.typedSelector(b'v@:@')
+    def appTerminated_(self, notification):
+        pid = notification.userInfo()['NSApplicationProcessIdentifier']
+        trace.record('workspace', n = 'terminated', p = pid)
+        WindowManager()._remove_app(pid)
+
+    @objc.typedSelector(b'v@:@')
+    def appHidden_(self, notification):
+        try:
+            application = notification.userInfo()['NSWorkspaceApplicationKey']
+            logging.debug('Application \'%s\' has been hidden.', application.localizedName())
+            trace.record('workspace', n = 'hidden', p = application.processIdentifier())
+            WindowManager()._set_hidden(application.processIdentifier(), True)
+        except KeyError:
+            logging.debug('The notification did not contain the expected dictionary entry.')
+
+    @objc.typedSelector(b'v@:@')
+    def appUnhidden_(self, notification):
+        try:
+            application = notification.userInfo()['NSWorkspaceApplicationKey']
+            logging.debug('Application \'%s\' is no longer hidden.', application.localizedName())
+            trace.record('workspace', n = 'unhidden', p = application.processIdentifier())
+            WindowManager()._set_hidden(application.processIdentifier(), False)
+        except KeyError:
+            logging.debug('The notification did not contain the expected dictionary entry.')
+
+    @objc.typedSelector(b'v@:@')
+    def spaceChanged_(self, notification):
+        logging.debug('User has changed spaces.')
+        WindowManager()._space_changed()
+
+
+class WindowManager(daemon.Daemon):
+    """
+    WindowManager is a singleton class that manage windows on OS X.
+    """
+    __metaclass__ = utils.SingletonMetaclass
+
+    def start(self, loglevel = 'INFO', *args, **kwargs):
+        log.configure(loglevel)
+        logging.info('Starting daemon...')
+
+        super(WindowManager, self).start(*args, **kwargs)
+
+    def stop(self, loglevel = 'INFO', *args, **kwargs):
+        log.configure(loglevel)
+        logging.info('Stopping daemon...')
+
+        # Ask the daemon to quit, which returns as soon as it has exited
+        try:
+            control.request('shutdown')
+            if self.verbose >= 1:
+                print 'Stopped'
+        except control.ControlError as e:
+            logging.info('Could not ask the daemon to stop, sending signals instead: %s', e)
+            super(WindowManager, self).stop(*args, **kwargs)
+        logging.info('Stopping window manager.')
+
+    def prepare(self, config_file = None):
+        """
+        Sets up the window manager's state and loads the running applications,
+        without watching for events or entering the run loop.
+        """
+        self._scheduler = scheduler.ReflowScheduler(self._reflow)
+        self._late_apps = Queue.Queue()
+        self.screens = screens.ScreenModel()
+        self._registry = registry.WindowRegistry()
+        self._active_space = spaces.active_space()
+        self._space_states = dict()
+        self.focus_ring = focus.FocusRing()
+        self._timers = None
+        self._config_file = config.get_config_file(config_file)
+        self.reload_config()
+        self._record_screens()
+        self.update()
+
+    def run(self, config_file = None, trace_file = None):
+        logging.info('Starting the window manager...')
+        if trace_file is not None:
+            trace.start(trace_file)
+        self.prepare(config_file)
+
+        # Create notification observer
+        observer = _NotificationHelper.new()  # noqa
+
+        # Allows calling arbitrary methods of WindowManager with hotkeys
+        @metrics.timed('hotkey')
+        def hotkey_handler(proxy, etype, event, refcon):
+            if etype == kCGEventTapDisabledByTimeout:
+                CGEventTapEnable(tap, True)
+                return
+
+            code = CGEventGetIntegerValueField(event, kCGKeyboardEventKeycode)
+            self._keys.dispatch(code, CGEventGetFlags(event))
+
+        # Register the callback for keyboard events
+        mask = CGEventMaskBit(kCGEventKeyDown)
+        tap = CGEventTapCreate(kCGSessionEventTap, kCGHeadInsertEventTap, kCGEventTapOptionListenOnly, mask, hotkey_handler, None)
+        tap_source = CFMachPortCreateRunLoopSource(None, tap, 0)
+        CFRunLoopAddSource(CFRunLoopGetCurrent(), tap_source, kCFRunLoopDefaultMode)
+
+        # Enable the tap
+        CGEventTapEnable(tap, True)
+        logging.info('Global hotkeys are now being watched.')
+
+        # Watch for displays being added, removed or rearranged
+        def display_handler(display, flags, info):
+            if not flags & kCGDisplayBeginConfigurationFlag:
+                self._screens_changed()
+
+        CGDisplayRegisterReconfigurationCallback(display_handler, None)
+
+        # Log metrics and check the config file for changes every so often
+        self._timers = dict()
+        self._start_timers()
+
+        # Probe the applications that have stopped responding
+        health_timer = _repeat(health.CHECK_INTERVAL, self._check_health)
+
+        # Answer commands from the control socket on the main thread
+        self._control = control.ControlServer(self.control_commands(), _watch_connection,
+            on_shutdown = lambda: CFRunLoopStop(CFRunLoopGetCurrent()))
+        self._control.listen()
+        control_socket = _watch_socket(self._control.fileno(), self._control.serve_pending)
+        control_timer = _repeat(control.TIMEOUT, self._control.expire)
+
+        # Reload the configuration on SIGHUP. Python only runs signal handlers
+        # between bytecodes, so the signal also wakes up the run loop.
+        self._reload_requested = False
+
+        def sighup_handler(signum, frame):
+            self._reload_requested = True
+
+        def wakeup_handler():
+            try:
+                while receiver.recv(4096):
+                    pass
+            except socket.error:
+                pass
+            if self._reload_requested:
+                self._reload_requested = False
+                self._try_reload_config()
+
+        receiver, sender = socket.socketpair()
+        receiver.setblocking(False)
+        sender.setblocking(False)
+        signal.set_wakeup_fd(sender.fileno())
+        signal.signal(signal.SIGHUP, sighup_handler)
+        wakeup_socket = _watch_socket(receiver.fileno(), wakeup_handler)
+
+        self.reflow()
+
+        # Run app loop
+        try:
+            CFRunLoopRun()
+        except KeyboardInterrupt:
+            logging.info('Stopping window manager.')
+        finally:
+            signal.set_wakeup_fd(-1)
+            CFRunLoopTimerInvalidate(health_timer)
+            CFRunLoopTimerInvalidate(control_timer)
+            CFSocketInvalidate(wakeup_socket)
+            CFSocketInvalidate(control_socket)
+            self._control.close()
+            trace.stop()
+
+    @metrics.timed('update')
+    def update(self):
+        """
+        Forgets every application and window, and enumerates the running
+        applications again. Configuration changes do not need this, see
+        :py:meth:`reload_config`.
+        """
+        # Stop handling the notifications of the applications being forgotten,
+        # as when they terminate, since they are watched again once found
+        for app in self._registry.apps():
+            app.unwatch()
+            health.forget(app.bundle)
+        self._registry = registry.WindowRegistry()
+        self._space_states.clear()
+        self.focus_ring.clear()
+
+        # Load running apps
+        apps = elements.get_accessible_applications(config.RULES.ignores_app,
+            timeout = config.ENUMERATION_TIMEOUT,
+            on_ready = self._app_ready,
+            messaging_timeout = config.MESSAGING_TIMEOUT)
+        visible = spaces.visible_frames()
+        for app in apps:
+            self._register_app(app, visible)
+
+        logging.info('The window manager is now aware of: %s', log.lazy(lambda: ', '.join(self.app_names())))
+
+    @metrics.timed('reload')
+    def reload_config(self):
+        """
+        Reads the configuration file again and applies only the settings that
+        have changed. Registered applications and windows keep their cached
+        state, except for those of bundles whose rules changed.
+
+        Nothing is changed if the file has an error, including hotkeys bound to
+        actions that the window manager does not have.
+
+        :rvalue: The sorted names of the settings that changed.
+        """
+        old_rules = config.RULES
+        self._config_mtime = _mtime(self._config_file)
+        staged = config.stage_config(self._config_file)
+        if 'HOTKEYS' in staged[0]:
+            keys = hotkeys.KeyDispatcher(staged[0]['HOTKEYS'].bind(self))
+
+        # Everything is valid, so apply it
+        changed = config.apply_config(staged)
+        logging.info('Configuration read from %s, changed: %s.', self._config_file, ', '.join(sorted(changed)) or 'nothing')
+
+        elements.ATTRIBUTE_TTL = config.CACHE_TTL
+        metrics.ENABLED = config.METRICS
+        self._scheduler.delay = config.REFLOW_DELAY
+        if 'HOTKEYS' in changed:
+            self._keys = keys
+        if 'LAYOUT' in changed:
+            self._layout = config.LAYOUT
+        if 'RULES' in changed:
+            self._rules_changed(old_rules)
+        if self._timers is not None and changed & set(['METRICS_INTERVAL', 'RELOAD_INTERVAL']):
+            self._start_timers()
+        if changed & set(['LAYOUT', 'MIN_SIZES']):
+            self._space_states.clear()
+            self.reflow()
+
+        return sorted(changed)
+
+    def get_managed_windows(self, screen = None, spaceId = None):
+        # Hidden apps and minimized windows are tracked from notifications
+        windows = self._registry.managed(None if screen is None else screen.number, spaceId)
+        if health.any_open():
+            # Leave the windows of unresponsive applications out of the layout
+            windows = tuple(w for w in windows if not health.is_open(w._parent.bundle))
+
+        return windows
+
+    def reflow(self, screens = None):
+        """
+        Requests a reflow of the given screen numbers (or of all screens).
+        Requests that arrive in quick succession are merged into a single
+        reflow by the scheduler.
+        """
+        self._scheduler.request(screens)
+
+    @metrics.timed('reflow')
+    def _reflow(self, generation, screens):
+        # Pick up applications that were slow to answer, now that we're on the main thread
+        while not self._late_apps.empty():
+            app = self._late_apps.get_nowait()
+            try:
+                self._register_app(app)
+            except Exception as e:
+                # e.g. it terminated before we got to it
+                logging.debug('Could not register %s: %s', app.bundle, e)
+                self._registry.remove_app(app.pid)
+                app.unwatch()
+                continue
+            logging.info('The window manager is now aware of %s.', log.lazy(lambda: app.title))
+            if screens is not None:
+                screens = screens | self._registry.screens_of(self._registry.windows(app = app))
+
+        targets = [s for s in self.screens if screens is None or s.number in screens]
+        for i, screen in enumerate(targets):
+            logging.info('Reflowing screen %d...', screen.number)
+            plan = self._layout.reflow(self, screen, self._active_space,
+                cancelled = lambda: self._scheduler.is_stale(generation))
+            if plan is not None and not self._scheduler.is_stale(generation):
+                # Remember the layout of this Space, to restore it when switching back
+                self._space_states[(self._active_space, screen.number)] = (self._layout,
+                    tuple(win for win, frame in plan), tuple(frame for win, frame in plan))
+                self.focus_ring.update(screen.number, plan)
+
+            # Windows that turned out to be gone leave a gap for another reflow to fill
+            evicted = elements.drain_evicted()
+            self.focus_ring.discard(evicted)
+            for win in evicted:
+                self._registry.remove_window(win)
+            if evicted:
+                self.reflow([screen.number])
+
+            if self._scheduler.is_stale(generation):
+                # Hand the screens we did not finish over to the newer reflow
+                self._scheduler.request([s.number for s in targets[i:]])
+                return
+
+    def control_commands(self):
+        """
+        Gets the commands served on the control socket.
+        """
+        return {
+            'reflow': self.reflow,
+            'set-layout': self.set_layout,
+            'list-windows': self.list_windows,
+            'stats': metrics.snapshot,
+            'reload': self.reload_config,
+        }
+
+    def set_layout(self, classname, params = {}):
+        """
+        Replaces the current layout with a new instance of the given class, and
+        reflows all screens.
+        """
+        self._layout = config.load_layout(classname, params)
+        logging.info('Layout is now %s.', self._layout.__class__.__name__)
+        self.reflow()
+
+    def list_windows(self):
+        """
+        Describes every registered window, in layout order. The windows of
+        applications that are not responding are described from what is
+        already known of them, without waiting on them.
+        """
+        managed = set(id(w) for w in self._registry.managed())
+        windows = []
+        for win in self._registry.windows():
+            app = win._parent
+            responding = not health.is_open(app.bundle)
+            if responding:
+                snapshot = win.snapshot()
+                title, frame = snapshot.title, snapshot.frame
+            else:
+                title, frame = win.cached_title, win.cached_frame
+            windows.append({
+                'pid': app.pid,
+                'bundle': app.bundle,
+                'app': app.title,
+                'title': title,
+                'frame': frame,
+                'screen': self._registry.placement(win)[0],
+                'managed': id(win) in managed,
+                'responding': responding,
+            })
+
+        return windows
+
+    def focus_next(self):
+        """
+        Focuses the window after the focused one, in layout order.
+        """
+        self._move_focus(lambda window: self._layout.next_window(window, self))
+
+    def focus_prev(self):
+        """
+        Focuses the window before the focused one, in layout order.
+        """
+        self._move_focus(lambda window: self._layout.prev_window(window, self))
+
+    def focus_left(self):
+        """
+        Focuses the nearest window to the left of the focused one.
+        """
+        self._move_focus(lambda window: self._layout.neighbour(window, focus.LEFT, self))
+
+    def focus_right(self):
+        """
+        Focuses the nearest window to the right of the focused one.
+        """
+        self._move_focus(lambda window: self._layout.neighbour(window, focus.RIGHT, self))
+
+    def focus_up(self):
+        """
+        Focuses the nearest window above the focused one.
+        """
+        self._move_focus(lambda window: self._layout.neighbour(window, focus.UP, self))
+
+    def focus_down(self):
+        """
+        Focuses the nearest window below the focused one.
+        """
+        self._move_focus(lambda window: self._layout.neighbour(window, focus.DOWN, self))
+
+    def _move_focus(self, find):
+        current = self._focused_window()
+        target = find(current)
+        if target is None or target is current:
+            return
+
+        try:
+            self._layout.focus_on(target)
+        except Exception as e:
+            logging.debug('Could not focus a window of %s: %s', target._parent.bundle, e)
+            return
+        self.focus_ring.current = target
+
+    def _focused_window(self):
+        # The user may have focused another window since the ring last did, so
+        # ask the frontmost application (and only it) which one has the focus
+        running = NSWorkspace.sharedWorkspace().frontmostApplication()
+        app = None if running is None else self._registry.app(running.processIdentifier())
+        if app is not None and not health.is_open(app.bundle):
+            window = app.focused_window()
+            if window is not None:
+                return window
+
+        return self.focus_ring.current
+
+    def _try_reload_config(self):
+        try:
+            self.reload_config()
+        except Exception as e:
+            logging.error('Could not reload the configuration, keeping the current one: %s', e)
+
+    def _check_config(self):
+        # Reload the configuration when its file has been modified
+        if _mtime(self._config_file) != self._config_mtime:
+            self._try_reload_config()
+
+    def _check_health(self):
+        # Reflow around applications that stopped or started responding again
+        changed = health.drain_changed()
+        if changed:
+            self.reflow(self._registry.screens_of(w for w in self._registry.windows() if w._parent.bundle in changed))
+
+        for bundle in health.due_probes():
+            apps = [app for app in self._registry.apps() if app.bundle == bundle]
+            if not apps:
+                health.forget(bundle)  # e.g. it never finished loading
+            for app in apps:
+                elements.probe(app)
+
+    def _start_timers(self):
+        # (Re)creates the timers whose intervals are set in the configuration
+        for timer in self._timers.values():
+            CFRunLoopTimerInvalidate(timer)
+        self._timers.clear()
+
+        if config.METRICS_INTERVAL > 0:
+            self._timers['metrics'] = _repeat(config.METRICS_INTERVAL, metrics.report)
+        if config.RELOAD_INTERVAL > 0:
+            self._timers['reload'] = _repeat(config.RELOAD_INTERVAL, self._check_config)
+
+    def _rules_changed(self, old):
+        # Only the applications of bundles whose rules changed are affected
+        new = config.RULES
+        for app in list(self._registry.apps()):
+            if new.ignores_app(app.bundle):
+                self._remove_app(app.pid)
+            elif new.candidates(app.bundle)[0] != old.candidates(app.bundle)[0]:
+                self._reclassify(app)
+
+        for application in NSWorkspace.sharedWorkspace().runningApplications():
+            bundle = application.bundleIdentifier()
+            if bundle and old.ignores_app(bundle) and not new.ignores_app(bundle):
+                self._add_app(application.processIdentifier(), bundle)
+
+    def _reclassify(self, app):
+        # Windows the old rules left out are added back, and those the new rules leave out dropped
+        windows = list(self._registry.windows(app = app))
+        affected = self._registry.screens_of(windows)
+        for win in windows:
+            self._registry.remove_window(win)
+        self.focus_ring.discard(windows)
+
+        visible = spaces.visible_frames()
+        for win in app.windows:
+            self._add_window(win, visible)
+        affected |= self._registry.screens_of(app.windows)
+
+        if affected:
+            self.reflow(affected)
+
+    def app_names(self):
+        return [app.title for app in self._registry.apps()]
+
+    @metrics.timed('add_app')
+    def _add_app(self, pid, bundle):
+        # Newly-launched apps are often too busy to answer, so don't wait for them
+        if not config.RULES.ignores_app(bundle):
+            elements.new_application_async(pid, bundle, self._app_ready, timeout = config.MESSAGING_TIMEOUT)
+
+    def _app_ready(self, app):
+        # Called from a worker thread; the app is registered before the next reflow
+        self._late_apps.put(app)
+        self.reflow(())
+
+    def _register_app(self, app, visible = None):
+        if self._registry.app(app.pid) is not None:
+            return  # e.g. it was launched while being enumerated
+
+        self._registry.add_app(app, hidden = bool(app.hidden))
+        app.watch(_accessibility_notifications_callback)
+        for win in app.windows:
+            self._add_window(win, visible)
+
+    @metrics.timed('remove_app')
+    def _remove_app(self, pid):
+        windows = self._registry.windows(app = pid)
+        affected = self._registry.screens_of(windows)
+        app = self._registry.remove_app(pid)
+        if app is None:
+            return
+
+        self.focus_ring.discard(windows)
+        app.unwatch()
+        health.forget(app.bundle)
+        logging.info('The window manager is no longer aware of %s.', log.lazy(lambda: app.title))
+        self.reflow(affected)
+
+    def _refresh_windows(self, app):
+        # Only this application's windows have changed, so reconcile just those
+        if self._registry.app(app.pid) is not app:
+            return
+
+        added, removed = app.refresh_windows()
+        affected = self._registry.screens_of(removed)
+        for win in removed:
+            self._registry.remove_window(win)
+        for win in added:
+            self._add_window(win)
+        affected |= self._registry.screens_of(added)
+
+        if affected:
+            self.reflow(affected)
+
+    def _refresh_minimized(self, app):
+        # The notification doesn't say which window it was, but only this app's can have changed
+        changed = []
+        for win in self._registry.windows(app = app):
+            if self._registry.set_minimized(win, bool(win.snapshot().minimized)):
+                changed.append(win)
+
+        if changed:
+            self._assign_spaces(spaces.visible_frames(), changed)
+            self.reflow(self._registry.screens_of(changed))
+
+    def _refresh_placements(self, app):
+        # Windows may have been dragged to another screen
+        affected = set()
+        for win in self._registry.windows(app = app):
+            old = self._registry.placement(win)[0]
+            new = self._place(win)
+            if new != old:
+                affected.update((old, new))
+
+        if affected:
+            self.reflow(affected)
+
+    @metrics.timed('space_change')
+    def _space_changed(self):
+        """
+        Restores the layout of the Space that has just become active. If its
+        windows are the ones it was last laid out with, only the windows that
+        are no longer where they were put are moved, and nothing at all is
+        asked of applications otherwise. Screens whose windows have changed
+        are reflowed as usual.
+        """
+        self._active_space = spaces.active_space()
+        trace.record('space', s = self._active_space)
+        visible = spaces.visible_frames()
+        self._assign_spaces(visible, self._registry.windows())
+
+        stale = []
+        for screen in self.screens:
+            windows = self.get_managed_windows(screen, self._active_space)
+            state = self._space_states.get((self._active_space, screen.number))
+            if state is None or state[0] is not self._layout or state[1] != windows:
+                stale.append(screen.number)
+                continue
+
+            self.focus_ring.update(screen.number, zip(windows, state[2]))
+            drifted = [(win, frame) for win, frame in zip(windows, state[2])
+                if spaces.rounded(frame) not in visible.get(win._parent.pid, ())]
+            for win, frame in drifted:
+                win.invalidate('AXPosition', 'AXSize')
+            if drifted:
+                logging.debug('Restoring %d windows on screen %d.', len(drifted), screen.number)
+                elements.commit_frames(drifted)
+
+        if stale:
+            self.reflow(stale)
+
+    def _assign_spaces(self, visible, windows):
+        # Windows that are on screen are on the active Space
+        for win in windows:
+            if spaces.rounded(win.cached_frame) in visible.get(win._parent.pid, ()):
+                screen, space = self._registry.placement(win)
+                if space != self._active_space:
+                    self._registry.place(win, screen, self._active_space)
+
+    def _screens_changed(self):
+        if self.screens.refresh():
+            self._record_screens()
+            self._space_states.clear()
+            self.focus_ring.clear()
+            for win in self._registry.windows():
+                self._place(win)
+            self.reflow()
+
+    def _record_screens(self):
+        if trace.ENABLED:
+            trace.record('screens', s = [(s.number, s.frame, s.visible_frame) for s in self.screens])
+
+    def _place(self, window):
+        screen = self._screen_for(window)
+        number = None if screen is None else screen.number
+        self._registry.place(window, number, self._registry.placement(window)[1])
+        return number
+
+    def _set_hidden(self, pid, hidden):
+        # Record the new state so that it does not have to be asked for again
+        app = self._registry.app(pid)
+        if app is not None:
+            app._cache.store('AXHidden', hidden)
+            if self._registry.set_hidden(pid, hidden):
+                if not hidden:
+                    self._assign_spaces(spaces.visible_frames(), self._registry.windows(app = pid))
+                self.reflow(self._registry.screens_of(self._registry.windows(app = pid)))
+
+    def _screen_for(self, window, frame = None):
+        # Screen rules win over where the window is, as long as that display is connected
+        rule = window.rule
+        if rule is not None and rule.action == rules.SCREEN and rule.screen <= len(self.screens):
+            return list(self.screens)[rule.screen - 1]
+
+        return self.screens.screen_for(window.snapshot().frame if frame is None else frame)
+
+    def _add_window(self, window, visible = None):
+        # Rules come first, so that the windows they leave out are asked for nothing more
+        window.rule = config.RULES.classify(window)
+        if window.rule is not None and window.rule.action in (rules.IGNORE, rules.FLOAT):
+            logging.debug('Window for application %s matches rule \'%s\' (%s). Ignoring it.',
+                log.lazy(lambda: window._parent.title), window.rule.name, window.rule.action)
+            return
+
+        # Windows are on the active Space, unless they are known not to be on screen
+        snapshot = window.snapshot()
+        if snapshot.resizable:
+            screen = self._screen_for(window, snapshot.frame)
+            on_screen = visible is None or spaces.rounded(snapshot.frame) in visible.get(window._parent.pid, ())
+            self._registry.add_window(window, screen = None if screen is None else screen.number,
+                space = self._active_space if on_screen else None, minimized = bool(snapshot.minimized))
+        else:
+            logging.debug('Window for application %s is not resizable. Ignoring it.', log.lazy(lambda: window._parent.title))
+
+
+def main(pidfile = '/tmp/wm-daemon.pid', loglevel = 'INFO', config_file = None, trace_file = None):
+    """
+    Runs a demonstration of the window manager in the foreground.
+    """
+    log.configure(loglevel, console = True)
+
+    WindowManager(pidfile).run(config_file, trace_file)
+
+
+if __name__ == '__main__':
+    main()
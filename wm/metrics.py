@@ -0,0 +1,246 @@
+__doc__ = '''wm.metrics
+
+This module keeps hot-path metrics for the window manager: latency histograms
+for its main operations, and counts and timings of the Accessibility calls made
+to each application. Everything is kept in fixed-size structures in memory, and
+recording is skipped entirely while :py:data:`ENABLED` is ``False``.
+'''
+
+import json
+import time
+import logging
+import functools
+import threading
+
+import health
+
+
+ENABLED = False
+
+# Latencies are bucketed by powers of two, in microseconds, up to ~16 seconds.
+BUCKETS = 24
+
+# The maximum number of application bundles that are tracked.
+MAX_BUNDLES = 256
+
+# Where :py:func:`report` writes a snapshot for ``wm stats`` to read.
+STATS_FILE = '/tmp/wm-stats.json'
+
+
+class Histogram(object):
+    """
+    A fixed-size latency histogram with power-of-two buckets.
+    """
+    def __init__(self):
+        self.buckets = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        micros = int(seconds * 1e6)
+        index = min(micros.bit_length(), BUCKETS - 1)
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        """
+        Gets an upper bound, in seconds, on the given percentile (0.0 to 1.0).
+        """
+        if not self.count:
+            return 0.0
+
+        target = fraction * self.count
+        seen = 0
+        for index, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                return min((2 ** index) / 1e6, self.max)
+
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'max': self.max,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'buckets': list(self.buckets),
+        }
+
+
+_lock = threading.Lock()
+_histograms = dict()  # name -> Histogram
+_bundles = dict()  # bundle -> [calls, errors, total seconds, max seconds]
+
+
+def histogram(name):
+    """
+    Gets the histogram of the given name, creating it if needed.
+    """
+    with _lock:
+        if name not in _histograms:
+            _histograms[name] = Histogram()
+        return _histograms[name]
+
+
+def timed(name):
+    """
+    Decorates a function so that its latency is recorded in the histogram of
+    the given name.
+    """
+    hist = histogram(name)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+
+            start = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.time() - start
+                with _lock:
+                    hist.add(elapsed)
+
+        return wrapper
+    return decorator
+
+
+def record_ax(bundle, op, seconds, error = False):
+    """
+    Records an Accessibility call of the given kind ('read' or 'write') made
+    to an application.
+    """
+    with _lock:
+        _histograms.setdefault('ax.' + op, Histogram()).add(seconds)
+
+        stats = _bundles.get(bundle)
+        if stats is None:
+            if len(_bundles) >= MAX_BUNDLES:
+                return  # Keep memory bounded; the histograms still count it
+            stats = _bundles[bundle] = [0, 0, 0.0, 0.0]
+
+        stats[0] += 1
+        stats[1] += 1 if error else 0
+        stats[2] += seconds
+        if seconds > stats[3]:
+            stats[3] = seconds
+
+
+def slowest_apps(count = 5):
+    """
+    Gets the bundles whose Accessibility calls have taken the most time, as a
+    list of (bundle, calls, errors, total seconds, max seconds) tuples.
+    """
+    with _lock:
+        stats = [(bundle,) + tuple(s) for bundle, s in _bundles.items()]
+
+    return sorted(stats, key = lambda s: s[3], reverse = True)[:count]
+
+
+def snapshot():
+    """
+    Gets all of the metrics as a JSON-serializable dict.
+    """
+    with _lock:
+        histograms = dict((name, h.snapshot()) for name, h in _histograms.items())
+        bundles = dict((bundle, {'calls': s[0], 'errors': s[1], 'total': s[2], 'max': s[3]})
+            for bundle, s in _bundles.items())
+
+    return {
+        'time': time.time(),
+        'enabled': ENABLED,
+        'histograms': histograms,
+        'bundles': bundles,
+        'slowest': [s[0] for s in slowest_apps()],
+        'health': health.snapshot(),
+    }
+
+
+def summary():
+    """
+    Gets a one-line summary of the metrics, suitable for the log.
+    """
+    parts = []
+    with _lock:
+        for name, h in sorted(_histograms.items()):
+            if h.count:
+                parts.append('%s n=%d p50=%.1fms p99=%.1fms max=%.1fms' % (name, h.count,
+                    h.percentile(0.5) * 1000, h.percentile(0.99) * 1000, h.max * 1000))
+
+    slowest = ', '.join('%s %.0fms/%d calls' % (s[0], s[3] * 1000, s[1]) for s in slowest_apps(3))
+    unresponsive = ', '.join(sorted(bundle for bundle, b in health.snapshot().items() if b['open']))
+    return 'Metrics: %s | slowest apps: %s | not responding: %s' % ('; '.join(parts) or 'none',
+        slowest or 'none', unresponsive or 'none')
+
+
+def report(filename = STATS_FILE):
+    """
+    Logs a summary line and writes a snapshot for ``wm stats`` to read.
+    """
+    if not ENABLED:
+        return
+
+    logging.info(summary())
+    try:
+        with open(filename, 'w') as f:
+            json.dump(snapshot(), f)
+    except IOError as e:
+        logging.debug('Could not write metrics to %s: %s', filename, e)
+
+
+def read_snapshot(filename = STATS_FILE):
+    """
+    Reads the snapshot last written by :py:func:`report`, or returns ``None``
+    if there is none.
+    """
+    try:
+        with open(filename) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def format_snapshot(snapshot):
+    """
+    Formats a snapshot as a human-readable table.
+    """
+    lines = ['Metrics as of %s:' % time.strftime('%y-%m-%d %H:%M:%S', time.localtime(snapshot['time']))]
+    lines.append('  %-12s %8s %10s %10s %10s %10s' % ('operation', 'count', 'p50 (ms)', 'p90 (ms)', 'p99 (ms)', 'max (ms)'))
+    for name, h in sorted(snapshot['histograms'].items()):
+        lines.append('  %-12s %8d %10.1f %10.1f %10.1f %10.1f' % (name, h['count'],
+            h['p50'] * 1000, h['p90'] * 1000, h['p99'] * 1000, h['max'] * 1000))
+
+    lines.append('Slowest applications:')
+    lines.append('  %-40s %8s %8s %10s %10s' % ('bundle', 'calls', 'errors', 'total (ms)', 'max (ms)'))
+    for bundle in snapshot['slowest']:
+        b = snapshot['bundles'][bundle]
+        lines.append('  %-40s %8d %8d %10.1f %10.1f' % (bundle, b['calls'], b['errors'], b['total'] * 1000, b['max'] * 1000))
+
+    breakers = snapshot.get('health')
+    if breakers:
+        lines.append('Applications that stopped responding:')
+        lines.append('  %-40s %-19s %6s  %s' % ('bundle', 'state', 'trips', 'reason'))
+        for bundle, b in sorted(breakers.items()):
+            state = 'open since %s' % time.strftime('%H:%M:%S', time.localtime(b['opened'])) if b['open'] else 'closed'
+            lines.append('  %-40s %-19s %6d  %s' % (bundle, state, b['trips'], b['reason']))
+
+    return '\n'.join(lines)
+
+
+def reset():
+    """
+    Clears all recorded metrics.
+    """
+    with _lock:
+        for h in _histograms.values():
+            h.__init__()
+        _bundles.clear()
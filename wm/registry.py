@@ -0,0 +1,213 @@
+__doc__ = '''wm.registry
+
+This module provides the registry of applications and windows known to the
+window manager.
+'''
+
+import logging
+from collections import OrderedDict
+
+import log
+
+
+class WindowRegistry(object):
+    """
+    Keeps track of accessible applications and their windows. Applications are
+    keyed by PID, and windows by the identity of their
+    :py:class:`elements.AccessibleWindow` wrapper, so that adding or removing
+    either (and looking up the windows of an application) takes constant time.
+
+    Windows are kept in the order they were added, which is the order layouts
+    place them in. They are also indexed by the screen and space they have been
+    placed on with :py:meth:`place`.
+
+    The registry also tracks which applications are hidden and which windows
+    are minimized, as reported by workspace and Accessibility notifications, so
+    that the list of managed windows can be kept without asking applications.
+    """
+    def __init__(self):
+        self._apps = OrderedDict()  # pid -> AccessibleApplication
+        self._windows = OrderedDict()  # id(window) -> AccessibleWindow
+        self._by_app = dict()  # pid -> OrderedDict of windows
+        self._by_screen = dict()  # screen -> OrderedDict of windows
+        self._by_space = dict()  # space -> OrderedDict of windows
+        self._placements = dict()  # id(window) -> (screen, space)
+        self._hidden = set()  # PIDs of hidden applications
+        self._minimized = set()  # id(window) of minimized windows
+        self._managed = dict()  # (screen, space) -> cached tuple of managed windows
+
+    def __len__(self):
+        return len(self._windows)
+
+    def __contains__(self, window):
+        return id(window) in self._windows
+
+    def add_app(self, app, hidden = False):
+        """
+        Registers an application (but none of its windows).
+        """
+        self._apps[app.pid] = app
+        self._by_app.setdefault(app.pid, OrderedDict())
+        self.set_hidden(app.pid, hidden)
+
+    def remove_app(self, pid):
+        """
+        Unregisters the application with the given PID along with all of its
+        windows, returning the application (or ``None`` if it was unknown).
+        """
+        app = self._apps.pop(pid, None)
+        for window in self._by_app.pop(pid, OrderedDict()).values():
+            self._discard(window)
+        self._hidden.discard(pid)
+
+        return app
+
+    def app(self, pid):
+        return self._apps.get(pid)
+
+    def apps(self):
+        return self._apps.values()
+
+    def add_window(self, window, screen = None, space = None, minimized = False):
+        """
+        Registers a window of an application that has already been registered.
+        """
+        key = id(window)
+        if key in self._windows:
+            return
+
+        self._windows[key] = window
+        self._by_app[window._parent.pid][key] = window
+        if minimized:
+            self._minimized.add(key)
+        self.place(window, screen, space)
+        self._managed.clear()
+        logging.debug('Added window for application %s.', log.lazy(lambda: window._parent.title))
+
+    def remove_window(self, window):
+        """
+        Unregisters a window, if it was registered.
+        """
+        if id(window) not in self._windows:
+            return
+
+        self._discard(window)
+        windows = self._by_app.get(window._parent.pid)
+        if windows is not None:
+            windows.pop(id(window), None)
+        logging.debug('Removed window for application %s.', log.lazy(lambda: window._parent.title))
+
+    def place(self, window, screen = None, space = None):
+        """
+        Records the screen and space that a registered window is on.
+        """
+        key = id(window)
+        old = self._placements.get(key)
+        if old == (screen, space):
+            return
+
+        if old is not None:
+            self._index_remove(self._by_screen, old[0], key)
+            self._index_remove(self._by_space, old[1], key)
+        self._by_screen.setdefault(screen, OrderedDict())[key] = window
+        self._by_space.setdefault(space, OrderedDict())[key] = window
+        self._placements[key] = (screen, space)
+        self._managed.clear()
+
+    def placement(self, window):
+        """
+        Gets the (screen, space) a registered window has been placed on.
+        """
+        return self._placements.get(id(window), (None, None))
+
+    def windows(self, app = None, screen = None, space = None):
+        """
+        Gets the registered windows in order, optionally only those of the
+        given application (or PID), screen or space.
+        """
+        if app is not None:
+            pid = getattr(app, 'pid', app)
+            windows = self._by_app.get(pid, {}).values()
+        elif screen is not None:
+            windows = self._by_screen.get(screen, {}).values()
+        elif space is not None:
+            windows = self._by_space.get(space, {}).values()
+        else:
+            return self._windows.values()
+
+        if screen is not None and app is not None:
+            windows = [w for w in windows if self._placements[id(w)][0] == screen]
+        if space is not None and (app is not None or screen is not None):
+            windows = [w for w in windows if self._placements[id(w)][1] == space]
+
+        return windows
+
+    def set_hidden(self, pid, hidden):
+        """
+        Records whether an application is hidden, returning ``True`` if this
+        changes the set of managed windows.
+        """
+        if hidden == (pid in self._hidden):
+            return False
+
+        if hidden:
+            self._hidden.add(pid)
+        else:
+            self._hidden.discard(pid)
+        self._managed.clear()
+        return True
+
+    def set_minimized(self, window, minimized):
+        """
+        Records whether a registered window is minimized, returning ``True`` if
+        this changes the set of managed windows.
+        """
+        key = id(window)
+        if key not in self._windows or minimized == (key in self._minimized):
+            return False
+
+        if minimized:
+            self._minimized.add(key)
+        else:
+            self._minimized.discard(key)
+        self._managed.clear()
+        return True
+
+    def managed(self, screen = None, space = None):
+        """
+        Gets the registered windows that are neither minimized nor part of a
+        hidden application, in order, optionally only those on the given
+        screen and space. The result is only recomputed after the registry has
+        changed.
+        """
+        managed = self._managed.get((screen, space))
+        if managed is None:
+            windows = self._windows if screen is None else self._by_screen.get(screen, {})
+            managed = self._managed[(screen, space)] = tuple(w for key, w in windows.items()
+                if key not in self._minimized and w._parent.pid not in self._hidden and
+                (space is None or self._placements[key][1] == space))
+
+        return managed
+
+    def screens_of(self, windows):
+        """
+        Gets the set of screens that the given windows have been placed on.
+        """
+        return set(self._placements[id(w)][0] for w in windows if id(w) in self._placements)
+
+    def _discard(self, window):
+        key = id(window)
+        self._windows.pop(key, None)
+        screen, space = self._placements.pop(key, (None, None))
+        self._index_remove(self._by_screen, screen, key)
+        self._index_remove(self._by_space, space, key)
+        self._minimized.discard(key)
+        self._managed.clear()
+
+    @staticmethod
+    def _index_remove(index, value, key):
+        windows = index.get(value)
+        if windows is not None:
+            windows.pop(key, None)
+            if not windows:
+                del index[value]
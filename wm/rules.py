@@ -0,0 +1,241 @@
+__doc__ = '''wm.rules
+
+This module provides the window rules of the ``[Rules]`` section of the config
+file. Each rule is a dict of conditions and an action::
+
+    [Rules]
+    dialogs = {'subrole': 'AXDialog', 'action': 'float'}
+    helpers = {'bundle': 'com.google.Chrome.*', 'action': 'ignore'}
+    inspector = {'bundle': 'com.apple.Safari', 'title': '^Web Inspector', 'action': 'screen', 'screen': 2}
+
+A window matches a rule when it meets all of its conditions:
+
+- ``bundle``: a glob of the bundle identifier of its application.
+- ``title``: a regular expression searched for in its title.
+- ``role`` and ``subrole``: its ``AXRole`` and ``AXSubrole``.
+- ``max_size``: a (width, height) that the window is no larger than.
+
+Rules are checked in order, and the first one that matches applies:
+
+- ``ignore``: the window is left alone. Rules that only match on the bundle
+  ignore the whole application, which is then never asked for anything.
+- ``float``: the window is left where it is, out of the layout.
+- ``screen``: the window is laid out on the given display, counting from 1.
+- ``size``: the window keeps the given (width, height), centered in its tile.
+
+A :py:class:`RuleSet` is built once for a config file, with every pattern
+compiled. The rules that may apply to a bundle are then looked up once per
+bundle and remembered, so that classifying a window is a dict lookup followed
+by reads of just the attributes those rules need, which are cached.
+'''
+
+import re
+import fnmatch
+
+
+IGNORE = 'ignore'
+FLOAT = 'float'
+SCREEN = 'screen'
+SIZE = 'size'
+ACTIONS = (IGNORE, FLOAT, SCREEN, SIZE)
+
+# The window attribute each condition is checked against
+_ATTRIBUTES = {
+    'title': 'AXTitle',
+    'role': 'AXRole',
+    'subrole': 'AXSubrole',
+    'max_size': 'AXSize',
+}
+
+_KEYS = frozenset(['bundle', 'action', 'screen', 'size']) | frozenset(_ATTRIBUTES)
+
+
+def _dimensions(value, key):
+    if (not isinstance(value, tuple) or len(value) != 2 or
+            not all(isinstance(n, (int, long, float)) and n > 0 for n in value)):
+        raise ValueError('\'%s\' must be a (width, height) tuple' % key)
+    return (float(value[0]), float(value[1]))
+
+
+class Rule(object):
+    """
+    A single rule, validated and compiled from its dict in the config file.
+
+    :raises ValueError: If the dict is not a valid rule.
+    """
+    def __init__(self, name, spec):
+        if not isinstance(spec, dict):
+            raise ValueError('expected a dict of conditions and an action')
+        unknown = set(spec) - _KEYS
+        if unknown:
+            raise ValueError('unknown key \'%s\'' % sorted(unknown)[0])
+        for key in ('bundle', 'title', 'role', 'subrole', 'action'):
+            if key in spec and not isinstance(spec[key], basestring):
+                raise ValueError('\'%s\' must be a string' % key)
+
+        self.name = name
+        self.action = spec.get('action')
+        if self.action not in ACTIONS:
+            raise ValueError('the action must be one of %s' % ', '.join(ACTIONS))
+
+        self.bundle = spec['bundle'].lower() if 'bundle' in spec else None
+        self.role = spec.get('role')
+        self.subrole = spec.get('subrole')
+        self.max_size = _dimensions(spec['max_size'], 'max_size') if 'max_size' in spec else None
+        self.title = spec.get('title')
+        try:
+            self._title = None if self.title is None else re.compile(self.title)
+        except re.error as e:
+            raise ValueError('bad title pattern: %s' % e)
+
+        self.screen = spec.get('screen')
+        if (self.action == SCREEN) != (self.screen is not None):
+            raise ValueError('\'screen\' must be given with, and only with, the screen action')
+        if self.screen is not None and (not isinstance(self.screen, (int, long)) or self.screen < 1):
+            raise ValueError('\'screen\' must be a display number, counting from 1')
+
+        self.size = spec.get('size')
+        if (self.action == SIZE) != (self.size is not None):
+            raise ValueError('\'size\' must be given with, and only with, the size action')
+        if self.size is not None:
+            self.size = _dimensions(self.size, 'size')
+
+        # The window attributes needed to check the conditions
+        self.attributes = tuple(sorted(_ATTRIBUTES[key] for key in _ATTRIBUTES if key in spec))
+        self._key = (name, tuple(sorted(spec.items())))
+
+    def __eq__(self, other):
+        return isinstance(other, Rule) and self._key == other._key
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Rule(%r)' % self.name
+
+    def matches_bundle(self, bundle):
+        """
+        Checks the ``bundle`` condition against a (lowercase) bundle.
+        """
+        return self.bundle is None or fnmatch.fnmatchcase(bundle, self.bundle)
+
+    def matches(self, values):
+        """
+        Checks the conditions other than ``bundle`` against a dict of window
+        attribute values, which must include :py:attr:`attributes`.
+        """
+        if self.role is not None and values['AXRole'] != self.role:
+            return False
+        if self.subrole is not None and values['AXSubrole'] != self.subrole:
+            return False
+        if self._title is not None and (values['AXTitle'] is None or not self._title.search(values['AXTitle'])):
+            return False
+        if self.max_size is not None:
+            size = values['AXSize']
+            if size is None or size[0] > self.max_size[0] or size[1] > self.max_size[1]:
+                return False
+
+        return True
+
+    def fit(self, frame):
+        """
+        Adjusts the frame a layout gave a window to the rule: windows of fixed
+        size are centered in it, as far as they fit.
+        """
+        if self.size is None or frame is None:
+            return frame
+
+        left, top, width, height = frame
+        return (left + max(0.0, (width - self.size[0]) / 2.0), top + max(0.0, (height - self.size[1]) / 2.0),
+            self.size[0], self.size[1])
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_title']  # Compiled again when loaded
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._title = None if self.title is None else re.compile(self.title)
+
+
+class RuleSet(object):
+    """
+    An ordered set of rules, indexed by bundle: rules for a single bundle are
+    kept in a dict, and only the rules whose bundle is a glob are matched
+    against each new bundle.
+
+    :param rules: The :py:class:`Rule` objects, in order.
+    :param ignored_bundles: Bundles to ignore, before any of the rules.
+    """
+    def __init__(self, rules = (), ignored_bundles = ()):
+        ignored = [Rule('ignored_bundles', {'bundle': bundle, 'action': IGNORE}) for bundle in sorted(ignored_bundles)]
+        self.rules = tuple(ignored) + tuple(rules)
+        self._index()
+
+    def _index(self):
+        self._exact = dict()  # bundle -> [(order, rule)]
+        self._globs = []  # (order, rule) of rules whose bundle is a glob, or that have none
+        for order, rule in enumerate(self.rules):
+            if rule.bundle is not None and not any(c in rule.bundle for c in '*?['):
+                self._exact.setdefault(rule.bundle, []).append((order, rule))
+            else:
+                self._globs.append((order, rule))
+        self._bundles = dict()  # bundle -> (rules, attributes), filled on demand
+
+    def __eq__(self, other):
+        return isinstance(other, RuleSet) and self.rules == other.rules
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __len__(self):
+        return len(self.rules)
+
+    def __getstate__(self):
+        return {'rules': self.rules}
+
+    def __setstate__(self, state):
+        self.rules = state['rules']
+        self._index()
+
+    def candidates(self, bundle):
+        """
+        Gets the rules that may apply to the windows of a bundle, in order, and
+        the window attributes they need.
+        """
+        entry = self._bundles.get(bundle)
+        if entry is None:
+            key = (bundle or '').lower()
+            matching = self._exact.get(key, []) + [(order, rule) for order, rule in self._globs
+                if rule.matches_bundle(key)]
+            rules = tuple(rule for order, rule in sorted(matching))
+            attributes = tuple(sorted(set(attribute for rule in rules for attribute in rule.attributes)))
+            entry = self._bundles[bundle] = (rules, attributes)
+
+        return entry
+
+    def ignores_app(self, bundle):
+        """
+        Checks whether every window of a bundle is ignored, without looking at
+        any of them.
+        """
+        rules = self.candidates(bundle)[0]
+        return bool(rules) and rules[0].action == IGNORE and not rules[0].attributes
+
+    def classify(self, window):
+        """
+        Gets the first rule that applies to a window, or ``None``. The window is
+        only asked for the attributes the rules of its bundle need.
+        """
+        rules, attributes = self.candidates(window._parent.bundle)
+        if not rules:
+            return None
+
+        values = dict(zip(attributes, window.read(*attributes))) if attributes else dict()
+
+        for rule in rules:
+            if rule.matches(values):
+                return rule
+
+        return None
@@ -0,0 +1,99 @@
+__doc__ = '''wm.scheduler
+
+This module provides a scheduler that coalesces bursts of reflow requests into
+a single reflow, driven by a timer on the main run loop.
+'''
+
+import logging
+import threading
+from CoreFoundation import (CFAbsoluteTimeGetCurrent, CFRunLoopAddTimer, CFRunLoopGetCurrent,
+    CFRunLoopTimerCreate, CFRunLoopTimerInvalidate, CFRunLoopWakeUp, kCFRunLoopCommonModes)
+
+
+class ReflowScheduler(object):
+    """
+    Coalesces reflow requests. A request marks the layout as dirty and arms a
+    one-shot timer on the run loop the scheduler was created on; all requests
+    that arrive before the timer fires are merged into the single reflow that
+    it triggers.
+
+    Every request also bumps a generation counter, so that a reflow that is
+    still being applied can check :py:meth:`is_stale` and stop as soon as a
+    newer reflow has been requested.
+
+    Requests may be limited to a set of screens, in which case only the
+    screens named by the requests that were merged are reflowed.
+
+    :param reflow: Called as ``reflow(generation, screens)`` to perform a
+                   reflow, where ``screens`` is ``None`` for all screens.
+    :param float delay: The number of seconds to wait for further requests.
+    """
+    def __init__(self, reflow, delay = 0.05):
+        self.delay = delay
+        self.generation = 0
+        self._reflow = reflow
+        self._dirty = False
+        self._screens = None
+        self._timer = None
+        self._lock = threading.Lock()
+        self._run_loop = CFRunLoopGetCurrent()
+
+    def request(self, screens = None):
+        """
+        Requests a reflow of the given screens (or of all of them). This is
+        safe to call from any thread.
+        """
+        with self._lock:
+            self.generation += 1
+            if not self._dirty:
+                self._dirty = True
+                self._screens = None if screens is None else set(screens)
+            elif self._screens is not None:
+                if screens is None:
+                    self._screens = None
+                else:
+                    self._screens.update(screens)
+
+            if self._timer is not None:
+                return  # It will be merged into the pending reflow
+
+            self._timer = CFRunLoopTimerCreate(None, CFAbsoluteTimeGetCurrent() + self.delay, 0, 0, 0, self._fire, None)
+            CFRunLoopAddTimer(self._run_loop, self._timer, kCFRunLoopCommonModes)
+
+        CFRunLoopWakeUp(self._run_loop)
+
+    def cancel(self):
+        """
+        Drops any pending reflow.
+        """
+        with self._lock:
+            self._dirty = False
+            if self._timer is not None:
+                CFRunLoopTimerInvalidate(self._timer)
+                self._timer = None
+
+    def flush(self):
+        """
+        Performs the pending reflow, if any, immediately.
+        """
+        with self._lock:
+            if self._timer is not None:
+                CFRunLoopTimerInvalidate(self._timer)
+                self._timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            generation = self.generation
+            screens = self._screens
+
+        self._reflow(generation, screens)
+
+    def is_stale(self, generation):
+        """
+        Checks whether a reflow has been requested since the given generation.
+        """
+        return generation != self.generation
+
+    def _fire(self, timer, info):
+        logging.debug('Reflow timer fired at generation %d.', self.generation)
+        self.flush()
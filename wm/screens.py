@@ -0,0 +1,119 @@
+__doc__ = '''wm.screens
+
+This module provides a cached model of the displays attached to the system.
+'''
+
+import logging
+
+
+class Screen(object):
+    """
+    A display, as it was when the :py:class:`ScreenModel` was last refreshed.
+    Both rects are (left, top, width, height) tuples in the coordinates used by
+    the Accessibility API, i.e. with the origin at the top-left corner of the
+    main screen and y increasing downwards.
+
+    :ivar number: The display's ``NSScreenNumber``, which identifies it.
+    :ivar frame: The full rect of the display.
+    :ivar visible_frame: The rect that is not covered by the menu bar or dock.
+    """
+    def __init__(self, number, frame, visible_frame):
+        self.number = number
+        self.frame = frame
+        self.visible_frame = visible_frame
+
+    def __eq__(self, other):
+        return isinstance(other, Screen) and (self.number, self.frame, self.visible_frame) == \
+            (other.number, other.frame, other.visible_frame)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Screen(%r, %r, %r)' % (self.number, self.frame, self.visible_frame)
+
+    def contains(self, point):
+        return self.frame[0] <= point[0] < self.frame[0] + self.frame[2] and \
+            self.frame[1] <= point[1] < self.frame[1] + self.frame[3]
+
+
+def _flip(rect, main_height):
+    # Convert an NSRect (origin at the bottom-left) to a top-left origin rect
+    (x, y), (width, height) = rect
+    return (x, main_height - (y + height), width, height)
+
+
+class ScreenModel(object):
+    """
+    Caches the frame and visible frame of every display, so that layouts and
+    window placement do not need to ask AppKit for them. Call
+    :py:meth:`refresh` when the display configuration changes.
+    """
+    def __init__(self):
+        self._screens = []
+        self.refresh()
+
+    def refresh(self):
+        """
+        Re-reads the display configuration, returning ``True`` if it changed.
+        """
+        from AppKit import NSScreen
+
+        screens = []
+        ns_screens = NSScreen.screens()
+        if ns_screens:
+            main_height = ns_screens[0].frame()[1][1]  # The screen with the menu bar
+            for ns_screen in ns_screens:
+                number = ns_screen.deviceDescription()['NSScreenNumber']
+                screens.append(Screen(int(number), _flip(ns_screen.frame(), main_height),
+                    _flip(ns_screen.visibleFrame(), main_height)))
+
+        if screens == self._screens:
+            return False
+
+        self._screens = screens
+        logging.info('Screen configuration: %s', ', '.join(repr(s) for s in screens))
+        return True
+
+    @property
+    def main(self):
+        return self._screens[0] if self._screens else None
+
+    def __iter__(self):
+        return iter(self._screens)
+
+    def __len__(self):
+        return len(self._screens)
+
+    def get(self, number):
+        """
+        Gets the screen with the given number, or ``None``.
+        """
+        for screen in self._screens:
+            if screen.number == number:
+                return screen
+
+        return None
+
+    def screen_for(self, frame):
+        """
+        Gets the screen that a (left, top, width, height) frame belongs to: the
+        one containing its centre, or else the nearest one.
+        """
+        if frame is None or not self._screens:
+            return self.main
+
+        center = (frame[0] + frame[2] / 2.0, frame[1] + frame[3] / 2.0)
+        nearest = None
+        best = None
+        for screen in self._screens:
+            if screen.contains(center):
+                return screen
+
+            sx = screen.frame[0] + screen.frame[2] / 2.0
+            sy = screen.frame[1] + screen.frame[3] / 2.0
+            distance = (sx - center[0]) ** 2 + (sy - center[1]) ** 2
+            if best is None or distance < best:
+                nearest, best = screen, distance
+
+        return nearest
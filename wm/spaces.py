@@ -0,0 +1,75 @@
+__doc__ = '''wm.spaces
+
+This module tells which Space (i.e. virtual desktop) is active, and which
+windows are on screen, i.e. on the active Space, without using the
+Accessibility API.
+
+macOS has no public API for Spaces, so the active Space is identified with the
+private ``CGSGetActiveSpace`` function. When it cannot be loaded,
+:py:func:`active_space` returns ``None`` and every window is taken to be on the
+same Space.
+'''
+
+import logging
+import objc
+from AppKit import NSBundle
+from Quartz import (CGWindowListCopyWindowInfo, kCGNullWindowID, kCGWindowBounds, kCGWindowLayer,
+    kCGWindowListExcludeDesktopElements, kCGWindowListOptionOnScreenOnly, kCGWindowOwnerPID)
+
+
+_functions = None
+
+
+def _load_functions():
+    global _functions
+    if _functions is None:
+        _functions = dict()
+        try:
+            bundle = NSBundle.bundleWithIdentifier_('com.apple.CoreGraphics')
+            objc.loadBundleFunctions(bundle, _functions, [('CGSMainConnectionID', b'i'), ('CGSGetActiveSpace', b'Qi')])
+        except Exception as e:
+            logging.info('Spaces cannot be told apart, so all windows are laid out together: %s', e)
+
+    return _functions
+
+
+def active_space():
+    """
+    Gets the identifier of the active Space, or ``None`` if it is not known.
+    """
+    functions = _load_functions()
+    if 'CGSGetActiveSpace' not in functions:
+        return None
+
+    return functions['CGSGetActiveSpace'](functions['CGSMainConnectionID']())
+
+
+def rounded(frame):
+    """
+    Rounds a (left, top, width, height) frame to whole points, the way the
+    window server reports it, or returns ``None`` for no frame.
+    """
+    if frame is None:
+        return None
+
+    return tuple(int(round(n)) for n in frame)
+
+
+def visible_frames():
+    """
+    Gets the frames of the normal windows that are on screen, with a single
+    request to the window server.
+
+    :rvalue: A dict of PID -> set of :py:func:`rounded` frames.
+    """
+    frames = dict()
+    options = kCGWindowListOptionOnScreenOnly | kCGWindowListExcludeDesktopElements
+    for info in CGWindowListCopyWindowInfo(options, kCGNullWindowID) or []:
+        if info.get(kCGWindowLayer) != 0:
+            continue  # Menus, the dock, overlays...
+
+        bounds = info[kCGWindowBounds]
+        frames.setdefault(int(info[kCGWindowOwnerPID]), set()).add(
+            rounded((bounds['X'], bounds['Y'], bounds['Width'], bounds['Height'])))
+
+    return frames
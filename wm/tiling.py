@@ -0,0 +1,211 @@
+__doc__ = '''wm.tiling
+
+This module provides the geometry shared by the tiling layouts. A tiling is
+described by a tree of splits, where each node divides its rect between its
+children along one axis, in proportion to their weights::
+
+    (HORIZONTAL, (0.6, 0.4), (0, (VERTICAL, (1, 1), (1, 2))))
+
+is a master window (0) on the left, and two windows (1 and 2) stacked on the
+right. Leaves are the indices of windows in layout order.
+
+:py:func:`solve` places a tree in a rect in two linear passes: the minimum size
+of every node is computed from the minimum sizes of its windows, and space is
+then handed out from the top down without giving any node less than its
+minimum. :py:func:`tile` falls back to tiling fewer windows, and stacking the
+rest on the last tile, when not all of them fit.
+
+The builders below create the trees of the built-in tilings. Everything here is
+pure, so that the results can be memoized by the layouts.
+'''
+
+import math
+
+
+HORIZONTAL = 0  # Children side by side, sharing the width
+VERTICAL = 1  # Children on top of each other, sharing the height
+
+
+def _node_minimums(node, minimums, gutter, out):
+    # Fill ``out`` with the (width, height) minimum of every split, by id
+    if not isinstance(node, tuple):
+        return minimums[node]
+
+    axis, _, children = node
+    sizes = [_node_minimums(child, minimums, gutter, out) for child in children]
+    along = sum(size[axis] for size in sizes) + gutter * (len(children) - 1)
+    across = max(size[1 - axis] for size in sizes)
+    size = (along, across) if axis == HORIZONTAL else (across, along)
+    out[id(node)] = size
+
+    return size
+
+
+def _allocate(total, weights, minimums):
+    # Shares out ``total`` in proportion to the weights, without giving anyone
+    # less than their minimum: the most constrained are served first, and the
+    # rest share what is left
+    sizes = [0.0] * len(weights)
+    remaining, remaining_weight = float(total), float(sum(weights))
+    for i in sorted(range(len(weights)), key = lambda i: minimums[i] / max(weights[i], 1e-9), reverse = True):
+        share = remaining * weights[i] / remaining_weight if remaining_weight > 0 else 0.0
+        sizes[i] = max(minimums[i], share)
+        remaining -= sizes[i]
+        remaining_weight -= weights[i]
+
+    return sizes
+
+
+def minimum_size(node, minimums, gutter):
+    """
+    Gets the smallest (width, height) the tree can be placed in without giving
+    any window less than its minimum size.
+    """
+    return _node_minimums(node, minimums, gutter, dict())
+
+
+def solve(node, rect, minimums, gutter):
+    """
+    Places a tree in a (left, top, width, height) rect.
+
+    :param minimums: The minimum (width, height) of each window.
+    :rvalue: A list of frames, indexed like ``minimums``. Windows that are not
+             part of the tree are left as ``None``.
+    """
+    frames = [None] * len(minimums)
+    sizes = dict()
+    _node_minimums(node, minimums, gutter, sizes)
+
+    stack = [(node, rect)]
+    while stack:
+        node, (left, top, width, height) = stack.pop()
+        if not isinstance(node, tuple):
+            frames[node] = (left, top, width, height)
+            continue
+
+        axis, weights, children = node
+        total = (width if axis == HORIZONTAL else height) - gutter * (len(children) - 1)
+        child_minimums = [(sizes[id(child)] if isinstance(child, tuple) else minimums[child])[axis] for child in children]
+        offset = left if axis == HORIZONTAL else top
+        for child, size in zip(children, _allocate(total, weights, child_minimums)):
+            if axis == HORIZONTAL:
+                stack.append((child, (offset, top, size, height)))
+            else:
+                stack.append((child, (left, offset, width, size)))
+            offset += size + gutter
+
+    return frames
+
+
+def tile(build, rect, minimums, gutter):
+    """
+    Tiles as many windows as fit in a rect, and stacks the rest on top of the
+    last tile. The number that fit is found by bisection, so ``build`` is
+    called a logarithmic number of times.
+
+    :param build: Called as ``build(count)`` to get the tree for the first
+                  ``count`` windows.
+    :param minimums: The minimum (width, height) of each window, in layout
+                     order.
+    :rvalue: A list of frames, one per window.
+    """
+    count = len(minimums)
+    if count == 0:
+        return []
+
+    def fits(n):
+        width, height = minimum_size(build(n), minimums, gutter)
+        return width <= rect[2] and height <= rect[3]
+
+    tiled = count
+    if not fits(count):
+        # The largest count that fits, where a single window always "fits"
+        low, high = 1, count - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if fits(middle):
+                low = middle
+            else:
+                high = middle - 1
+        tiled = low
+
+    frames = solve(build(tiled), rect, minimums[:tiled], gutter)
+
+    # Keep every frame on the screen, even those of windows too big for it
+    frames = [(left, top, min(width, rect[0] + rect[2] - left), min(height, rect[1] + rect[3] - top))
+        for left, top, width, height in frames]
+
+    return frames + [frames[-1]] * (count - tiled)
+
+
+def bsp(count, rect, first = 0):
+    """
+    Builds a binary space partition: windows are split into two halves, along
+    the longer side of the space they share, until each has its own tile.
+    """
+    if count == 1:
+        return first
+
+    half = count - count // 2
+    axis = HORIZONTAL if rect[2] >= rect[3] else VERTICAL
+    if axis == HORIZONTAL:
+        width = rect[2] * half / count
+        a, b = (0, 0, width, rect[3]), (0, 0, rect[2] - width, rect[3])
+    else:
+        height = rect[3] * half / count
+        a, b = (0, 0, rect[2], height), (0, 0, rect[2], rect[3] - height)
+
+    return (axis, (half, count - half), (bsp(half, a, first), bsp(count - half, b, first + half)))
+
+
+def spiral(count, ratio = 0.5):
+    """
+    Builds a spiral: each window takes ``ratio`` of the space left by the ones
+    before it, turning clockwise (right, down, left, up) around the screen.
+    """
+    node = count - 1
+    for i in range(count - 2, -1, -1):
+        turn = i % 4
+        axis = HORIZONTAL if turn % 2 == 0 else VERTICAL
+        if turn < 2:
+            node = (axis, (ratio, 1 - ratio), (i, node))
+        else:
+            node = (axis, (1 - ratio, ratio), (node, i))
+
+    return node
+
+
+def grid(count, rect):
+    """
+    Builds a grid whose cells are about as wide as they are tall (for the given
+    rect), filled row by row. The cells of a last, partial row are wider.
+    """
+    width, height = max(rect[2], 0), max(rect[3], 0)
+    if height == 0:
+        columns = count  # No room at all (e.g. borders as tall as the screen)
+    else:
+        columns = max(1, min(count, int(math.ceil(math.sqrt(count * width / float(height))))))
+    rows = int(math.ceil(count / float(columns)))
+    columns = int(math.ceil(count / float(rows)))  # Don't leave a row empty
+
+    row_nodes = []
+    for row in range(rows):
+        cells = range(row * columns, min(count, (row + 1) * columns))
+        row_nodes.append(cells[0] if len(cells) == 1 else (HORIZONTAL, (1,) * len(cells), tuple(cells)))
+
+    return row_nodes[0] if rows == 1 else (VERTICAL, (1,) * rows, tuple(row_nodes))
+
+
+def master_stack(count, masters = 1, ratio = 0.5):
+    """
+    Builds a column of up to ``masters`` windows on the left, taking ``ratio``
+    of the width, with the other windows stacked in a column on the right.
+    """
+    def column(indices):
+        return indices[0] if len(indices) == 1 else (VERTICAL, (1,) * len(indices), tuple(indices))
+
+    masters = max(1, masters)
+    if count <= masters:
+        return column(range(count))
+
+    return (HORIZONTAL, (ratio, 1 - ratio), (column(range(masters)), column(range(masters, count))))
@@ -0,0 +1,148 @@
+__doc__ = '''wm.trace
+
+This module records what the window manager sees and does, so that a session
+can be replayed elsewhere (see ``benchmarks/replay.py``). When recording, each
+event is appended to the trace file as a line of JSON::
+
+    {"t": 0.0132, "k": "ax", "p": 501, "b": "com.apple.finder", "e": 4, "op": "read",
+     "f": "__getitem__", "a": ["AXPosition"], "v": [0, 22], "s": 0.0004}
+
+``t`` is the number of seconds since recording started, and ``k`` the kind of
+event:
+
+- ``workspace``: a workspace notification (``n`` is launched, terminated,
+  hidden or unhidden) for the application ``p`` with bundle ``b``.
+- ``notification``: an Accessibility notification ``n`` for an application.
+- ``ax``: an Accessibility request, a call of the method ``f`` of element
+  ``e`` that took ``s`` seconds, with its arguments ``a`` and its result ``v``
+  (or the name of the exception it raised, ``x``). Attributes are read one per
+  request. Elements are numbered in the order they are first seen,
+  and element values are written as ``{"e": number}``.
+- ``space``: the active Space changed to ``s``.
+- ``screens``: the screens ``s`` are now connected, as (number, frame,
+  visible frame) lists.
+
+Like :py:mod:`metrics`, this module only depends on the standard library, and
+costs a single check of :py:data:`ENABLED` when not recording.
+'''
+
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+
+# Whether events are being recorded; see start().
+ENABLED = False
+
+# The number of elements that are kept alive so that they keep their number
+MAX_ELEMENTS = 4096
+
+_lock = threading.Lock()
+_file = None
+_start = None
+_elements = OrderedDict()  # id(element) -> (number, element), least recently seen first
+_next_element = 1
+
+
+def start(filename):
+    """
+    Starts recording events to the given file, which is appended to. The
+    file is line buffered, so that every event is written out as it is
+    recorded, and a crash loses none of them.
+    """
+    global ENABLED, _file, _start, _next_element
+    with _lock:
+        if _file is not None:
+            _file.close()
+        _file = open(filename, 'a', 1)
+        _start = time.time()
+        _elements.clear()
+        _next_element = 1
+        ENABLED = True
+    logging.info('Recording a trace to %s.', filename)
+
+
+def stop():
+    """
+    Stops recording, and closes the trace file.
+    """
+    global ENABLED, _file
+    with _lock:
+        ENABLED = False
+        if _file is not None:
+            _file.close()
+            _file = None
+        _elements.clear()
+
+
+def _element(element):
+    # Number elements by identity, keeping the recently seen ones alive so that
+    # their ids cannot be reused by other elements
+    global _next_element
+    with _lock:
+        entry = _elements.pop(id(element), None)
+        if entry is None:
+            entry = (_next_element, element)
+            _next_element += 1
+        _elements[id(element)] = entry
+        if len(_elements) > MAX_ELEMENTS:
+            _elements.popitem(last = False)
+
+    return entry[0]
+
+
+def _encode(value):
+    if value is None or isinstance(value, (bool, int, long, float, basestring)):
+        return value
+    elif isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+
+    return {'e': _element(value)}
+
+
+def _write(event):
+    line = json.dumps(event, separators = (',', ':'))
+    with _lock:
+        if _file is not None:
+            _file.write(line + '\n')
+
+
+def record(kind, **fields):
+    """
+    Records an event of the given kind with some JSON-serializable fields.
+    """
+    if not ENABLED:
+        return
+
+    fields['t'] = round(time.time() - _start, 6)
+    fields['k'] = kind
+    _write(fields)
+
+
+def record_ax(bundle, op, func, args, seconds, result = None, error = None):
+    """
+    Records an Accessibility request, i.e. a call of ``func(*args)`` where
+    ``func`` is a method of an element.
+    """
+    if not ENABLED:
+        return
+
+    element = getattr(func, '__self__', None)
+    event = {
+        't': round(time.time() - _start - seconds, 6),
+        'k': 'ax',
+        'p': getattr(element, 'pid', None),
+        'b': bundle,
+        'e': None if element is None else _element(element),
+        'op': op,
+        'f': func.__name__,
+        'a': _encode(args),
+        's': round(seconds, 6),
+    }
+    if error is not None:
+        event['x'] = error.__class__.__name__
+    else:
+        event['v'] = _encode(result)
+    _write(event)
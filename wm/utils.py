@@ -1,3 +1,6 @@
+from collections import OrderedDict
+
+
 class SingletonMetaclass(type):
     """
     This class is intended to be used as a metatype for classes that follow the
@@ -11,3 +14,41 @@ class SingletonMetaclass(type):
         if cls._instance is None:
             cls._instance = super(SingletonMetaclass, cls).__call__(*args, **kwargs)
         return cls._instance
+
+
+class LRUCache(object):
+    """
+    A small mapping that holds at most ``maxsize`` items, discarding the least
+    recently used item when it is full. It also counts its hits and misses.
+    """
+    def __init__(self, maxsize = 128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def get(self, key, default = None):
+        try:
+            value = self._items.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self._items[key] = value  # Move it to the most recently used end
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key, value):
+        self._items.pop(key, None)
+        self._items[key] = value
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last = False)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self):
+        self._items.clear()